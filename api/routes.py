@@ -1,74 +1,432 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+from werkzeug.security import safe_join
 import os
 import json  # <-- ADICIONE ESTA LINHA
-from backend.main import WordStylerProcessor
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from backend.ai_processor import SharedAIResources
+from backend.file_manager import FileManager
 from backend.config import Config
+from backend.workspace import JobWorkspace, UploadStream, UploadTooLarge, WorkspaceQuotaExceeded
+from backend.docx_package import validate_docx_upload
+from backend.retention import output_retention
+from backend.jobs import job_manager, execute_job, JobQueueFull
+from backend.main import WordStylerProcessor
+from backend.markup import MarkupReader
+from backend.metrics import registry as metrics_registry
+from backend.scheduler import SchedulerTimeout, job_cost, llm_scheduler, tenant_of
+
+class UploadRequest(Request):
+    """Request que grava os arquivos enviados direto no workspace de um job.
+    
+    O parser multipart escreve cada bloco no UploadStream (disco + SHA-256 + limite
+    de tamanho) à medida que chega, em vez de bufferizar em um arquivo temporário
+    para depois copiar.
+    """
+    upload_workspace = None
+    
+    @property
+    def max_content_length(self):
+        # Lotes levam vários arquivos na mesma requisição
+        if self.path == '/api/batch':
+            return Config.MAX_BATCH_REQUEST_SIZE
+        return super().max_content_length
+    
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.upload_workspace is None:
+            quota = Config.JOB_DISK_QUOTA * (Config.MAX_BATCH_FILES if self.path == '/api/batch' else 1)
+            self.upload_workspace = JobWorkspace(quota_bytes=quota)
+        return self.upload_workspace.open_upload(secure_filename(filename or '') or 'upload.docx')
 
 app = Flask(__name__)
+app.request_class = UploadRequest
+# Rejeita pelo Content-Length antes de ler o corpo (e limita corpos sem Content-Length)
+app.config['MAX_CONTENT_LENGTH'] = Config.MAX_REQUEST_SIZE
 CORS(app)
 
+@app.teardown_request
+def _discard_unclaimed_upload(exc=None):
+    """Apaga uploads de requisições que não viraram job (erro de validação, limite...)"""
+    workspace = getattr(request, 'upload_workspace', None)
+    if workspace is not None:
+        workspace.cleanup(keep_output=False)
+
+@app.errorhandler(413)
+def _request_too_large(e):
+    return jsonify({'error': f"Arquivo maior que o limite de {Config.MAX_FILE_SIZE // 1024 // 1024} MB"}), 413
+
+@app.errorhandler(UploadTooLarge)
+@app.errorhandler(WorkspaceQuotaExceeded)
+def _upload_limit_exceeded(e):
+    return jsonify({'error': str(e)}), 413
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-@app.route('/api/process', methods=['POST'])
-def process_document():
-    """Endpoint principal para processar documento"""
+def _read_job_fields():
+    """Campos do formulário comuns a /api/process, /api/jobs e /api/batch"""
+    data = request.form
+    fields = {
+        'book_name': data.get('book_name'),
+        'api_key': data.get('api_key'),
+        'styles': json.loads(data.get('styles', '[]')),
+        'removal_prompts': json.loads(data.get('removal_prompts', '[]')),
+        # cProfile do job, salvo junto da saída (ignorado se ALLOW_JOB_PROFILING=false)
+        'profile': Config.ALLOW_JOB_PROFILING and data.get('profile', '').lower() == 'true',
+        # Projeto (livro) cujas revisões são reprocessadas de forma incremental
+        'project': data.get('project', '').strip() or None,
+    }
+    
+    # Reaplicar um arquivo de marcações (campo 'markup') não chama a IA: chave e estilos opcionais
+    markup = request.files.get('markup')
+    if markup and markup.filename:
+        required = [fields['book_name']]
+    else:
+        required = [fields['book_name'], fields['api_key'], fields['styles']]
+    if not all(required):
+        return None, (jsonify({'error': 'Dados incompletos'}), 400)
+    
+    return fields, None
+
+def _prepare_job():
+    """Valida a requisição e grava o upload no workspace de um novo job.
+    
+    Retorna (job, None) ou (None, resposta de erro).
+    """
     # Verifica se arquivo foi enviado
     if 'file' not in request.files:
-        return jsonify({'error': 'Nenhum arquivo enviado'}), 400
+        return None, (jsonify({'error': 'Nenhum arquivo enviado'}), 400)
     
     file = request.files['file']
     if file.filename == '':
-        return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
+        return None, (jsonify({'error': 'Nenhum arquivo selecionado'}), 400)
     
     if not allowed_file(file.filename):
-        return jsonify({'error': 'Tipo de arquivo não permitido. Use .docx'}), 400
+        return None, (jsonify({'error': 'Tipo de arquivo não permitido. Use .docx'}), 400)
     
-    # Obtém dados do formulário
-    data = request.form
-    book_name = data.get('book_name')
-    api_key = data.get('api_key')
-    styles = json.loads(data.get('styles', '[]'))
-    removal_prompts = json.loads(data.get('removal_prompts', '[]'))
+    job, error = _read_job_fields()
+    if error:
+        return None, error
     
-    if not all([book_name, api_key, styles]):
-        return jsonify({'error': 'Dados incompletos'}), 400
+    # O upload já foi gravado no workspace do job durante o parsing (UploadRequest)
+    if isinstance(file.stream, UploadStream):
+        job['workspace'] = request.upload_workspace
+        job['file_path'] = file.stream.finish()
+    else:
+        job['workspace'] = JobWorkspace()
+        try:
+            job['file_path'] = job['workspace'].save_upload(file, secure_filename(file.filename))
+        except WorkspaceQuotaExceeded as e:
+            job['workspace'].cleanup(keep_output=False)
+            return None, (jsonify({'error': str(e)}), 413)
     
-    # Salva arquivo temporariamente
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(Config.UPLOAD_DIR, filename)
-    file.save(file_path)
+    # Marcações de um job anterior (modo só aplicação); o hash do workspace continua o do .docx
+    markup = request.files.get('markup')
+    if markup and markup.filename:
+        try:
+            if isinstance(markup.stream, UploadStream):
+                job['markup_path'] = markup.stream.finish(record_hash=False)
+            else:
+                job['markup_path'] = job['workspace'].save_upload(
+                    markup, secure_filename(markup.filename) or 'markup.jsonl', record_hash=False
+                )
+        except WorkspaceQuotaExceeded as e:
+            job['workspace'].cleanup(keep_output=False)
+            return None, (jsonify({'error': str(e)}), 413)
+    
+    # Confere o diretório central do zip (e o cabeçalho das marcações) antes de enfileirar
+    try:
+        validate_docx_upload(job['file_path'], Config.MAX_UNCOMPRESSED_SIZE)
+        if job.get('markup_path'):
+            MarkupReader(job['markup_path']).close()
+    except ValueError as e:
+        job['workspace'].cleanup(keep_output=False)
+        return None, (jsonify({'error': str(e)}), 400)
+    
+    # Daqui em diante o workspace pertence ao job (não é apagado no teardown)
+    request.upload_workspace = None
+    return job, None
+
+@app.route('/api/process', methods=['POST'])
+def process_document():
+    """Endpoint síncrono: processa o documento e responde ao final (use /api/jobs para jobs longos)"""
+    job, error = _prepare_job()
+    if error:
+        return error
+    
+    # Ocupa uma vaga da mesma fila justa dos jobs assíncronos, sem prender a conexão indefinidamente
+    try:
+        with job_manager.scheduler.slot(tenant_of(job['api_key']), job_cost(os.path.getsize(job['file_path'])),
+                                        timeout=Config.PROCESS_QUEUE_TIMEOUT):
+            return jsonify(execute_job(job))
+    except SchedulerTimeout as e:
+        job['workspace'].cleanup(keep_output=False)
+        return jsonify({'error': str(e)}), 503
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/preview', methods=['POST'])
+def preview_document():
+    """Pré-visualização: classifica uma amostra e estima o custo do processamento completo"""
+    job, error = _prepare_job()
+    if error:
+        return error
+    
+    try:
+        sample_size = int(request.form.get('sample_size') or 0) or None
+    except ValueError:
+        job['workspace'].cleanup(keep_output=False)
+        return jsonify({'error': 'sample_size inválido'}), 400
     
     try:
-        # Processa documento
         processor = WordStylerProcessor()
-        result = processor.process_document(
-            file_path, book_name, api_key, styles, removal_prompts
-        )
-        
-        # Remove arquivo temporário
-        os.remove(file_path)
-        
-        return jsonify(result)
-        
+        return jsonify(processor.preview_document(
+            job['file_path'], job['api_key'], job['styles'], job['removal_prompts'], sample_size=sample_size
+        ))
     except Exception as e:
-        # Remove arquivo em caso de erro
-        if os.path.exists(file_path):
-            os.remove(file_path)
         return jsonify({'error': str(e)}), 500
+    finally:
+        job['workspace'].cleanup(keep_output=False)
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Enfileira o processamento e responde imediatamente com o id do job"""
+    job, error = _prepare_job()
+    if error:
+        return error
+    
+    job_id = job['workspace'].job_id
+    try:
+        job_manager.submit(job_id, lambda progress: execute_job(job, progress), tenant=tenant_of(job['api_key']),
+                           cost=job_cost(os.path.getsize(job['file_path'])))
+    except JobQueueFull as e:
+        job['workspace'].cleanup(keep_output=False)
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events'
+    }), 202
+
+def _prepare_batch():
+    """Valida um lote e separa cada arquivo em um job próprio.
+    
+    Retorna (lote, None) ou (None, resposta de erro).
+    """
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        return None, (jsonify({'error': 'Nenhum arquivo enviado'}), 400)
+    
+    if len(files) > Config.MAX_BATCH_FILES:
+        return None, (jsonify({'error': f'No máximo {Config.MAX_BATCH_FILES} arquivos por lote'}), 400)
+    
+    invalid = [f.filename for f in files if not allowed_file(f.filename)]
+    if invalid:
+        return None, (jsonify({'error': f'Tipo de arquivo não permitido: {", ".join(invalid)}. Use .docx'}), 400)
+    
+    fields, error = _read_job_fields()
+    if error:
+        return None, error
+    
+    if 'markup' in request.files:
+        error = 'Marcações salvas só podem ser reaplicadas em /api/process ou /api/jobs'
+        return None, (jsonify({'error': error}), 400)
+    
+    # O workspace da requisição vira o do lote (recebe o ZIP combinado);
+    # cada arquivo passa para o workspace do seu próprio job
+    batch = dict(fields, workspace=request.upload_workspace, jobs=[])
+    folders = set()
+    job_workspaces = []
+    
+    def discard_job_workspaces():
+        for job_workspace in job_workspaces:
+            job_workspace.cleanup(keep_output=False)
+    
+    try:
+        for file in files:
+            job_workspace = JobWorkspace()
+            job_workspaces.append(job_workspace)
+            job_path = job_workspace.adopt_upload(file.stream)
+            
+            # Pasta do arquivo no ZIP combinado (e nome do livro do job), sem repetição
+            stem = os.path.splitext(secure_filename(file.filename))[0] or 'documento'
+            folder, counter = stem, 1
+            while folder in folders:
+                counter += 1
+                folder = f"{stem}_{counter}"
+            folders.add(folder)
+            
+            # Cada arquivo do lote é um projeto próprio dentro do projeto do lote
+            project = f"{fields['project']}/{folder}" if fields['project'] else None
+            batch['jobs'].append(dict(fields, book_name=folder, filename=file.filename, project=project,
+                                      workspace=job_workspace, file_path=job_path))
+            
+            try:
+                validate_docx_upload(job_path, Config.MAX_UNCOMPRESSED_SIZE)
+            except ValueError as e:
+                discard_job_workspaces()
+                return None, (jsonify({'error': f'{file.filename}: {e}'}), 400)
+    except Exception:
+        # Ex.: cota de disco excedida no meio do lote (respondida pelo errorhandler):
+        # nenhum workspace de arquivo já criado fica para trás
+        discard_job_workspaces()
+        raise
+    
+    request.upload_workspace = None
+    return batch, None
+
+def _execute_batch(batch, progress):
+    """Processa os arquivos do lote em paralelo e gera o ZIP combinado"""
+    start_time = time.time()
+    jobs = batch['jobs']
+    workspace = batch['workspace']
+    
+    workers = max(1, min(Config.BATCH_FILE_WORKERS, len(jobs)))
+    shared_ai = SharedAIResources(pool_size=workers * max(Config.AI_SECTION_WORKERS, 1))
+    results = [None] * len(jobs)
+    
+    progress.update('processing', 0, f'0/{len(jobs)} arquivos')
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch') as executor:
+        futures = {executor.submit(execute_job, job, None, shared_ai): i for i, job in enumerate(jobs)}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = {'success': False, 'error': str(e)}
+            progress.update('processing', 90 * done // len(jobs), f'{done}/{len(jobs)} arquivos')
+    
+    # ZIP combinado: cada arquivo na sua pasta, entradas copiadas dos ZIPs individuais
+    archives = [
+        (job['book_name'], os.path.join(Config.OUTPUT_DIR, result['zip_file']))
+        for job, result in zip(jobs, results) if result.get('success')
+    ]
+    
+    zip_file = None
+    if archives:
+        progress.update('saving', 92, 'Gerando ZIP combinado')
+        file_manager = FileManager(batch['book_name'], workspace)
+        zip_file = os.path.relpath(file_manager.write_combined_zip(archives), Config.OUTPUT_DIR)
+    
+    workspace.cleanup(keep_output=bool(archives))
+    if archives:
+        output_retention.register(workspace.job_id, workspace.output_dir)
+    
+    processing_time = time.time() - start_time
+    return {
+        'success': bool(archives),
+        'error': None if archives else 'Nenhum arquivo do lote foi processado com sucesso',
+        'processing_time': f"{int(processing_time // 60)}m {int(processing_time % 60)}s",
+        'zip_file': zip_file,
+        'files': [
+            {
+                'filename': job['filename'],
+                'success': result.get('success', False),
+                'error': result.get('error'),
+                'zip_file': result.get('zip_file'),
+                'cache': result.get('cache'),
+                'stats': result.get('stats'),
+            }
+            for job, result in zip(jobs, results)
+        ],
+        'stats': {
+            'total_files': len(jobs),
+            'succeeded': len(archives),
+            'failed': len(jobs) - len(archives),
+            'classification_cache_hits': shared_ai.classification_hits,
+        }
+    }
+
+@app.route('/api/batch', methods=['POST'])
+def create_batch():
+    """Enfileira um lote de arquivos com a mesma configuração de estilos (campo 'files')"""
+    batch, error = _prepare_batch()
+    if error:
+        return error
+    
+    job_id = batch['workspace'].job_id
+    try:
+        # Lotes são trabalho em massa: peso menor, usam a capacidade que os jobs interativos deixam livre
+        size = sum(os.path.getsize(job['file_path']) for job in batch['jobs'])
+        job_manager.submit(job_id, lambda progress: _execute_batch(batch, progress), tenant=tenant_of(batch['api_key']),
+                           cost=job_cost(size), weight=Config.BULK_WEIGHT)
+    except JobQueueFull as e:
+        batch['workspace'].cleanup(keep_output=False)
+        for job in batch['jobs']:
+            job['workspace'].cleanup(keep_output=False)
+        return jsonify({'error': str(e)}), 503
+    
+    return jsonify({
+        'job_id': job_id,
+        'files': len(batch['jobs']),
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/jobs/{job_id}/events'
+    }), 202
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status, etapa, progresso e (ao final) resultado do job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    
+    return jsonify(job.snapshot())
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Progresso do job via Server-Sent Events (termina com o evento 'result')"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    
+    # Reconexões do EventSource retomam do último evento recebido
+    try:
+        start = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        start = 0
+    
+    def stream():
+        position = start
+        for event in job.iter_events(start):
+            if event is None:
+                yield ': keep-alive\n\n'
+                continue
+            yield f"id: {position}\nevent: progress\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+            position += 1
+        yield f"event: result\ndata: {json.dumps(job.snapshot(), ensure_ascii=False, default=str)}\n\n"
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/download/<path:filename>', methods=['GET'])
 def download_file(filename):
     """Endpoint para download de arquivos"""
-    file_path = os.path.join(Config.OUTPUT_DIR, filename)
+    # safe_join impede sair de OUTPUT_DIR (os caminhos agora incluem a pasta do job)
+    file_path = safe_join(Config.OUTPUT_DIR, filename)
     
-    if not os.path.exists(file_path):
+    if file_path is None or not os.path.isfile(file_path):
         return jsonify({'error': 'Arquivo não encontrado'}), 404
     
+    # Download conta como acesso para o despejo LRU da retenção
+    output_retention.touch(filename)
+    
     return send_file(file_path, as_attachment=True)
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Métricas do processo no formato texto do Prometheus"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/scheduler', methods=['GET'])
+def scheduler_status():
+    """Filas justas de jobs e de chamadas à IA: profundidade e espera por inquilino (hash da chave)"""
+    return jsonify({
+        'jobs': job_manager.scheduler.snapshot(),
+        'llm': llm_scheduler.snapshot(),
+    })
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Verifica se a API está funcionando"""
@@ -79,4 +437,5 @@ def health_check():
 
 if __name__ == '__main__':
     Config.create_directories()
+    output_retention.start_sweeper()
     app.run(debug=True, port=5000)
\ No newline at end of file
@@ -1,18 +1,207 @@
 import json
+import threading
 import time
 import requests
-from typing import List, Dict
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict
 from backend.config import Config
+from backend.metrics import BATCH_FAILURES, BATCH_RETRIES, CACHE_REQUESTS, LLM_ERRORS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from backend.scheduler import llm_scheduler, tenant_of
+
+# Parágrafos por chamada na primeira passada e na segunda (não marcados, com contexto)
+BATCH_SIZE = 150
+FOCUSED_BATCH_SIZE = 20
+# Pausa entre chamadas (segundos) para respeitar rate limits
+BATCH_PAUSE = 0.5
+# Textos mais curtos (títulos, "CAPA", "Fim") dependem do contexto e não entram no cache do lote
+CLASSIFICATION_MIN_CHARS = 40
+
+class SharedAIResources:
+    """Recursos reaproveitados pelos AIProcessor de um mesmo lote de documentos.
+    
+    - uma sessão HTTP (conexões keep-alive) para todas as chamadas à API;
+    - o prompt de sistema, montado uma vez por configuração de estilos/remoções;
+    - um cache de classificação: os marcadores de estilo de parágrafos longos
+      (``CLASSIFICATION_MIN_CHARS``) completam, em outro arquivo do lote, um
+      parágrafo de mesmo texto (e tipo/estilo/imagem) que a IA deixou sem estilo.
+      Os lotes vão inteiros para a IA, que vê o contexto de cada arquivo; marcadores
+      de remoção (início/fim de trecho) dependem desse contexto e nunca são reaproveitados.
+    
+    Lotes são trabalho em massa: suas chamadas à IA entram na fila justa com
+    ``weight`` (padrão ``BULK_WEIGHT``), abaixo dos jobs interativos.
+    """
+    
+    def __init__(self, pool_size: int = 10, weight: float = None):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        self.prompts = {}
+        self.classifications = {}
+        self.classification_hits = 0
+        self.weight = Config.BULK_WEIGHT if weight is None else weight
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _classification_key(prompt_key: str, para: Dict):
+        text = para.get('text', '').strip()
+        if len(text) < CLASSIFICATION_MIN_CHARS:
+            return None
+        return (prompt_key, para['type'], para.get('style'), bool(para.get('has_image')), text)
+    
+    def lookup(self, prompt_key: str, para: Dict) -> List[str]:
+        key = self._classification_key(prompt_key, para)
+        if key is None:
+            return None
+        with self._lock:
+            markers = self.classifications.get(key)
+            if markers:
+                self.classification_hits += 1
+        CACHE_REQUESTS.inc(cache='classification', outcome='hit' if markers else 'miss')
+        return markers
+    
+    def store(self, prompt_key: str, results: List[Dict], removal_markers: List[str]):
+        with self._lock:
+            for para in results:
+                key = self._classification_key(prompt_key, para)
+                if key is None:
+                    continue
+                markers = [m for m in para.get('markers') or [] if m not in removal_markers]
+                if markers:
+                    self.classifications.setdefault(key, markers)
+
 
 class AIProcessor:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, shared: SharedAIResources = None):
         self.api_key = api_key
         self.model = "gpt-4.1"  # Mantendo GPT-4.1 com sua capacidade total
-        self.api_url = "https://api.openai.com/v1/chat/completions"
+        self.api_url = Config.OPENAI_API_URL
+        # Em lote, sessão HTTP, prompts e classificações são compartilhados entre documentos
+        self.shared = shared
+        self.http = shared.session if shared else requests
+        self._prompt_cache = shared.prompts if shared else {}
+        # Posição das chamadas na fila justa entre chaves de API
+        self.tenant = tenant_of(api_key)
+        self.weight = shared.weight if shared else 1.0
+        # Tempo acumulado (todas as threads) em rede e na interpretação do JSON, e tokens usados
+        self._timings = {'network': 0.0, 'json_parse': 0.0}
+        self._tokens = {'prompt': 0, 'completion': 0}
+        self._timings_lock = threading.Lock()
         print(f"AIProcessor inicializado com modelo: {self.model}")
         
-    def process_document(self, paragraphs: List[Dict], styles: List[Dict], removal_prompts: List[Dict]) -> Dict:
-        """Processa documento com IA para identificar estilos"""
+    def process_document(self, paragraphs: List[Dict], styles: List[Dict], removal_prompts: List[Dict],
+                         sections: List[Dict] = None, on_progress: Callable[[int, int], None] = None) -> Dict:
+        """Processa documento com IA para identificar estilos.
+        
+        Se ``sections`` for informado (ex.: um item por simulado), os lotes são
+        alinhados às seções e cada seção é processada em paralelo, com o seu próprio
+        contexto na segunda passada.
+        
+        ``on_progress(processados, total)`` é chamado após cada lote da primeira passada.
+        """
+        self._begin(styles, removal_prompts, len(paragraphs), on_progress)
+        processing_stats = self._new_stats(len(paragraphs))
+        
+        print(f"Iniciando processamento de {len(paragraphs)} parágrafos...")
+        
+        if sections and len(sections) > 1:
+            marked_content = self._process_sections(paragraphs, sections, styles, removal_prompts, processing_stats)
+        else:
+            marked_content = self._process_sequence(paragraphs, styles, removal_prompts, processing_stats)
+        
+        # Calcula estatísticas finais
+        processing_stats['marked'] = sum(1 for p in marked_content if p.get('markers') and len(p['markers']) > 0)
+        processing_stats['unmarked'] = processing_stats['total_paragraphs'] - processing_stats['marked']
+        processing_stats['timings'] = {f'{name}_seconds': round(seconds, 4) for name, seconds in self._timings.items()}
+        processing_stats['tokens'] = dict(self._tokens)
+        unmarked_paragraphs = [p for p in marked_content if not p.get('markers') or len(p['markers']) == 0]
+        
+        print(f"\nProcessamento concluído:")
+        print(f"  - {processing_stats['marked']} parágrafos marcados")
+        print(f"  - {processing_stats['unmarked']} parágrafos sem marcação")
+        if processing_stats['failed_batches'] > 0:
+            print(f"  - {processing_stats['failed_batches']} batches falharam")
+        
+        # Log de exemplo dos não marcados para debug
+        if unmarked_paragraphs and len(unmarked_paragraphs) <= 10:
+            print("\nExemplos de parágrafos NÃO marcados:")
+            for p in unmarked_paragraphs[:5]:
+                print(f"  - P{p['index']}: {p['text'][:60]}...")
+        
+        return {
+            'marked_content': marked_content,
+            'stats': processing_stats
+        }
+    
+    def process_revision(self, paragraphs: List[Dict], plan: Dict, styles: List[Dict], removal_prompts: List[Dict],
+                         on_progress: Callable[[int, int], None] = None) -> Dict:
+        """Processa uma nova revisão a partir do alinhamento com a anterior (RevisionStore.plan).
+
+        Parágrafos inalterados recebem os marcadores da revisão anterior; só os
+        alterados vão para a IA, junto com os vizinhos de ``plan['context']``, cujas
+        marcações continuam as reaproveitadas. Os parágrafos enviados formam uma única
+        sequência (sem lotes por seção: costumam ser poucos).
+        """
+        changed = set(plan['changed'])
+        send = sorted(changed.union(plan['context']))
+        self._begin(styles, removal_prompts, len(send), on_progress)
+        processing_stats = self._new_stats(len(paragraphs))
+
+        print(f"Revisão incremental: {len(changed)} de {len(paragraphs)} parágrafos alterados "
+              f"(+{len(send) - len(changed)} de contexto), {len(plan['reused'])} reaproveitados")
+
+        for pos, markers in plan['reused'].items():
+            paragraphs[pos]['markers'] = list(markers)
+
+        if changed:
+            # Cópias: a IA marca os vizinhos de contexto, mas eles mantêm a marcação anterior
+            classified = self._process_sequence([dict(paragraphs[pos]) for pos in send], styles,
+                                                removal_prompts, processing_stats)
+            by_index = {para['index']: para for para in classified}
+            for pos in changed:
+                paragraphs[pos] = by_index.get(paragraphs[pos]['index'], paragraphs[pos])
+
+        processing_stats['processed'] = len(paragraphs)
+        processing_stats['marked'] = sum(1 for p in paragraphs if p.get('markers'))
+        processing_stats['unmarked'] = processing_stats['total_paragraphs'] - processing_stats['marked']
+        processing_stats['reused'] = len(plan['reused'])
+        processing_stats['classified'] = len(changed)
+        processing_stats['context'] = len(send) - len(changed)
+        processing_stats['revision'] = plan['revision'] + 1
+        processing_stats['timings'] = {f'{name}_seconds': round(seconds, 4) for name, seconds in self._timings.items()}
+        processing_stats['tokens'] = dict(self._tokens)
+
+        print(f"✓ Revisão processada: {processing_stats['marked']} marcados, "
+              f"{processing_stats['api_calls']} chamadas à API")
+
+        return {
+            'marked_content': paragraphs,
+            'stats': processing_stats
+        }
+
+    def classify_sample(self, sample: List[Dict], styles: List[Dict], removal_prompts: List[Dict]) -> Dict:
+        """Classifica uma amostra em uma única chamada, sem novas tentativas nem segunda passada.
+        
+        Usado na pré-visualização: devolve as marcações e o que a chamada custou
+        (segundos, tokens e tamanho dos prompts) para estimar o processamento completo.
+        """
+        self._begin(styles, removal_prompts, len(sample))
+        start = time.perf_counter()
+        marked_content = self._process_batch(sample, styles, removal_prompts)
+        
+        return {
+            'marked_content': marked_content,
+            'seconds': time.perf_counter() - start,
+            'tokens': dict(self._tokens),
+            'system_prompt_chars': len(self._get_system_prompt(styles, removal_prompts)),
+            'user_prompt_chars': len(self._build_user_prompt(sample)),
+        }
+    
+    def _begin(self, styles: List[Dict], removal_prompts: List[Dict], total: int,
+               on_progress: Callable[[int, int], None] = None):
+        """Prepara o processador para um documento (ou amostra)"""
         # Salva estilos e marcadores de remoção para validação posterior
         self.styles = styles
         self.removal_markers = []
@@ -20,27 +209,84 @@ class AIProcessor:
             self.removal_markers.append(removal['startMarker'])
             self.removal_markers.append(removal['endMarker'])
         
-        marked_content = []
-        processing_stats = {
-            'total_paragraphs': len(paragraphs),
+        self._on_progress = on_progress
+        self._progress_done = 0
+        self._progress_total = total
+        self._progress_lock = threading.Lock()
+        self._prompt_key = json.dumps([styles, removal_prompts], sort_keys=True, ensure_ascii=False)
+        self._timings = {name: 0.0 for name in self._timings}
+        self._tokens = {name: 0 for name in self._tokens}
+    
+    def _report_progress(self, processed: int):
+        """Acumula parágrafos processados (de todas as seções) e avisa o callback"""
+        if not self._on_progress:
+            return
+        
+        with self._progress_lock:
+            self._progress_done = min(self._progress_done + processed, self._progress_total)
+            done = self._progress_done
+        self._on_progress(done, self._progress_total)
+    
+    def _add_timing(self, name: str, seconds: float):
+        with self._timings_lock:
+            self._timings[name] += seconds
+    
+    def _add_tokens(self, prompt_tokens: int, completion_tokens: int):
+        with self._timings_lock:
+            self._tokens['prompt'] += prompt_tokens
+            self._tokens['completion'] += completion_tokens
+    
+    def _new_stats(self, total_paragraphs: int) -> Dict:
+        return {
+            'total_paragraphs': total_paragraphs,
             'processed': 0,
             'marked': 0,
             'unmarked': 0,
             'api_calls': 0,
             'failed_batches': 0  # Contador de batches que falharam
         }
-        
-        print(f"Iniciando processamento de {len(paragraphs)} parágrafos...")
+    
+    def _process_sections(self, paragraphs: List[Dict], sections: List[Dict], styles: List[Dict],
+                          removal_prompts: List[Dict], processing_stats: Dict) -> List[Dict]:
+        """Processa cada seção como uma sequência independente, em paralelo"""
+        workers = max(1, min(Config.AI_SECTION_WORKERS, len(sections)))
+        print(f"Processando {len(sections)} seções em paralelo ({workers} workers)...")
+        
+        section_stats = [self._new_stats(section['end'] - section['start']) for section in sections]
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(
+                    self._process_sequence,
+                    paragraphs[section['start']:section['end']],
+                    styles, removal_prompts, stats,
+                    f"[{section['title'][:30]}] "
+                )
+                for section, stats in zip(sections, section_stats)
+            ]
+            # Mantém a ordem original do documento
+            marked_content = []
+            for future in futures:
+                marked_content.extend(future.result())
+        
+        for stats in section_stats:
+            for key in ('processed', 'api_calls', 'failed_batches'):
+                processing_stats[key] += stats[key]
+        processing_stats['sections'] = len(sections)
+        
+        return marked_content
+    
+    def _process_sequence(self, paragraphs: List[Dict], styles: List[Dict], removal_prompts: List[Dict],
+                          processing_stats: Dict, label: str = '') -> List[Dict]:
+        """Marca uma sequência de parágrafos em lotes, com segunda passada nos não marcados"""
+        marked_content = []
         
         # Processa em lotes maiores - GPT-4.1 aguenta muito mais
-        batch_size = 150  # Voltando para 150 como solicitado
-        
-        # Segunda passada para parágrafos não marcados
-        unmarked_paragraphs = []
+        batch_size = BATCH_SIZE
         
         for i in range(0, len(paragraphs), batch_size):
             batch = paragraphs[i:i + batch_size]
-            print(f"Processando batch {i//batch_size + 1} de {(len(paragraphs) + batch_size - 1)//batch_size}")
+            print(f"{label}Processando batch {i//batch_size + 1} de {(len(paragraphs) + batch_size - 1)//batch_size}")
             
             # Tenta processar o batch com retry
             batch_results = None
@@ -49,16 +295,17 @@ class AIProcessor:
             
             while batch_results is None and retry_count <= max_retries:
                 if retry_count > 0:
-                    print(f"  Tentativa {retry_count + 1} de {max_retries + 1}...")
+                    BATCH_RETRIES.inc()
+                    print(f"{label}  Tentativa {retry_count + 1} de {max_retries + 1}...")
                     time.sleep(1)  # Espera antes de retry
                 
-                batch_results = self._process_batch(batch, styles, removal_prompts)
+                batch_results = self._classify_batch(batch, styles, removal_prompts)
                 
                 # Se falhou e ainda tem retries, reduz o batch
                 if batch_results is None and retry_count < max_retries:
                     # Reduz o batch pela metade
                     if len(batch) > 10:
-                        print(f"  Reduzindo tamanho do batch de {len(batch)} para {len(batch)//2}")
+                        print(f"{label}  Reduzindo tamanho do batch de {len(batch)} para {len(batch)//2}")
                         batch = batch[:len(batch)//2]
                     retry_count += 1
                 else:
@@ -66,70 +313,117 @@ class AIProcessor:
             
             # Se todas as tentativas falharam, usa batch sem marcações
             if batch_results is None:
-                print(f"  AVISO: Batch {i//batch_size + 1} falhou após {max_retries + 1} tentativas. Continuando sem marcações.")
+                print(f"{label}  AVISO: Batch {i//batch_size + 1} falhou após {max_retries + 1} tentativas. Continuando sem marcações.")
                 batch_results = batch  # Retorna o batch original sem marcações
                 processing_stats['failed_batches'] += 1
+                BATCH_FAILURES.inc()
             
             marked_content.extend(batch_results)
             processing_stats['processed'] += len(batch_results)
+            self._report_progress(len(batch_results))
             processing_stats['api_calls'] += retry_count
             
             # Pequena pausa para respeitar rate limits
-            time.sleep(0.5)
-        
-        # Calcula estatísticas finais
-        processing_stats['marked'] = sum(1 for p in marked_content if p.get('markers') and len(p['markers']) > 0)
-        processing_stats['unmarked'] = processing_stats['total_paragraphs'] - processing_stats['marked']
+            time.sleep(BATCH_PAUSE)
         
         # Coleta parágrafos não marcados para segunda tentativa
         unmarked_paragraphs = [p for p in marked_content if not p.get('markers') or len(p['markers']) == 0]
         
         if unmarked_paragraphs and len(unmarked_paragraphs) > 10:
-            print(f"\n⚠️ {len(unmarked_paragraphs)} parágrafos sem marcação. Fazendo segunda passada...")
+            print(f"\n{label}⚠️ {len(unmarked_paragraphs)} parágrafos sem marcação. Fazendo segunda passada...")
+            
+            # Posição de cada parágrafo por índice (contexto e atualização em O(1))
+            position_by_index = {p['index']: j for j, p in enumerate(marked_content)}
             
             # Segunda tentativa focada nos não marcados
-            for i in range(0, len(unmarked_paragraphs), 20):
-                batch = unmarked_paragraphs[i:i + 20]
-                print(f"  Reprocessando batch {i//20 + 1} de {(len(unmarked_paragraphs) + 19)//20}")
+            for i in range(0, len(unmarked_paragraphs), FOCUSED_BATCH_SIZE):
+                batch = unmarked_paragraphs[i:i + FOCUSED_BATCH_SIZE]
+                print(f"{label}  Reprocessando batch {i//FOCUSED_BATCH_SIZE + 1} de "
+                      f"{(len(unmarked_paragraphs) + FOCUSED_BATCH_SIZE - 1)//FOCUSED_BATCH_SIZE}")
                 
                 # Passa o conteúdo completo para análise contextual
-                batch_results = self._process_batch_focused(batch, styles, removal_prompts, marked_content)
+                batch_results = self._process_batch_focused(batch, styles, removal_prompts, marked_content,
+                                                            position_by_index)
+                processing_stats['api_calls'] += 1
                 
                 # Atualiza os resultados originais
                 for updated_para in batch_results:
                     if updated_para.get('markers'):
-                        # Encontra e atualiza no marked_content original
-                        for j, original in enumerate(marked_content):
-                            if original['index'] == updated_para['index']:
-                                marked_content[j] = updated_para
-                                break
+                        j = position_by_index.get(updated_para['index'])
+                        if j is not None:
+                            marked_content[j] = updated_para
                 
-                time.sleep(0.5)
-            
-            # Recalcula estatísticas
-            processing_stats['marked'] = sum(1 for p in marked_content if p.get('markers') and len(p['markers']) > 0)
-            processing_stats['unmarked'] = processing_stats['total_paragraphs'] - processing_stats['marked']
+                time.sleep(BATCH_PAUSE)
         
-        print(f"\nProcessamento concluído:")
-        print(f"  - {processing_stats['marked']} parágrafos marcados")
-        print(f"  - {processing_stats['unmarked']} parágrafos sem marcação")
-        if processing_stats['failed_batches'] > 0:
-            print(f"  - {processing_stats['failed_batches']} batches falharam")
+        return marked_content
+    
+    def _classify_batch(self, batch: List[Dict], styles: List[Dict], removal_prompts: List[Dict]) -> List[Dict]:
+        """Processa um lote inteiro e completa com o cache do lote os parágrafos que ficaram sem estilo"""
+        if self._process_batch(batch, styles, removal_prompts) is None:
+            return None
+        if not self.shared:
+            return batch
         
-        # Log de exemplo dos não marcados para debug
-        if unmarked_paragraphs and len(unmarked_paragraphs) <= 10:
-            print("\nExemplos de parágrafos NÃO marcados:")
-            for p in unmarked_paragraphs[:5]:
-                print(f"  - P{p['index']}: {p['text'][:60]}...")
+        removal_markers = set(self.removal_markers)
+        self.shared.store(self._prompt_key, batch, removal_markers)
+        for para in batch:
+            current = para.get('markers') or []
+            if any(m not in removal_markers for m in current):
+                continue
+            markers = self.shared.lookup(self._prompt_key, para)
+            if markers:
+                para['markers'] = current + markers
         
-        return {
-            'marked_content': marked_content,
-            'stats': processing_stats
-        }
+        return batch
+    
+    def _get_system_prompt(self, styles: List[Dict], removal_prompts: List[Dict]) -> str:
+        """Prompt de sistema montado uma vez por configuração (e por lote, se compartilhado)"""
+        key = json.dumps([styles, removal_prompts], sort_keys=True, ensure_ascii=False)
+        prompt = self._prompt_cache.get(key)
+        if prompt is None:
+            prompt = self._prompt_cache.setdefault(key, self._build_system_prompt(styles, removal_prompts))
+        return prompt
+    
+    def _post_completion(self, headers: Dict, data: Dict, kind: str, timeout: float):
+        """Faz a chamada à API registrando latência, status e tokens consumidos.
+        
+        A chamada espera vaga no ``llm_scheduler`` (limite por chave e fila justa);
+        a latência registrada não inclui essa espera.
+        """
+        with llm_scheduler.slot(self.tenant, weight=self.weight):
+            start = time.perf_counter()
+            try:
+                response = self.http.post(self.api_url, headers=headers, json=data, timeout=timeout)
+            except requests.exceptions.Timeout:
+                elapsed = time.perf_counter() - start
+                self._add_timing('network', elapsed)
+                LLM_REQUEST_SECONDS.observe(elapsed, kind=kind, status='timeout')
+                LLM_ERRORS.inc(reason='timeout')
+                raise
+            except requests.exceptions.RequestException:
+                elapsed = time.perf_counter() - start
+                self._add_timing('network', elapsed)
+                LLM_REQUEST_SECONDS.observe(elapsed, kind=kind, status='error')
+                LLM_ERRORS.inc(reason='request')
+                raise
+        
+        elapsed = time.perf_counter() - start
+        self._add_timing('network', elapsed)
+        LLM_REQUEST_SECONDS.observe(elapsed, kind=kind, status=str(response.status_code))
+        if response.status_code == 200:
+            try:
+                usage = response.json().get('usage') or {}
+            except ValueError:
+                usage = {}
+            LLM_TOKENS.inc(usage.get('prompt_tokens', 0), type='prompt')
+            LLM_TOKENS.inc(usage.get('completion_tokens', 0), type='completion')
+            self._add_tokens(usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        
+        return response
     
     def _process_batch(self, batch: List[Dict], styles: List[Dict], removal_prompts: List[Dict]) -> List[Dict]:
         """Processa um lote de parágrafos usando a API"""
-        system_prompt = self._build_system_prompt(styles, removal_prompts)
+        system_prompt = self._get_system_prompt(styles, removal_prompts)
         user_prompt = self._build_user_prompt(batch)
         
         headers = {
@@ -149,61 +443,21 @@ class AIProcessor:
         
         try:
             # Faz a requisição para a API
-            response = requests.post(
-                self.api_url, 
-                headers=headers, 
-                json=data,
-                timeout=45  # Aumentado timeout
-            )
+            response = self._post_completion(headers, data, 'batch', timeout=45)  # Aumentado timeout
             
             # Verifica se houve erro HTTP
             if response.status_code != 200:
+                LLM_ERRORS.inc(reason='http_status')
                 print(f"  Erro na API: Status {response.status_code}")
                 print(f"  Resposta: {response.text[:200]}...")
                 return None  # Retorna None para indicar falha
             
-            # Extrai o conteúdo da resposta
-            result_data = response.json()
-            content = result_data['choices'][0]['message']['content']
-            
-            # Tenta extrair e corrigir JSON da resposta
+            # Extrai e interpreta o JSON da resposta (tempo contabilizado à parte da rede)
+            parse_start = time.perf_counter()
             try:
-                # Remove possível texto antes/depois do JSON
-                json_start = content.find('{')
-                json_end = content.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    content = content[json_start:json_end]
-                
-                # Tenta corrigir JSON truncado
-                content = self._fix_truncated_json(content)
-                
-                # Parseia a resposta
-                result = json.loads(content)
-                return self._merge_results(batch, result)
-                
-            except json.JSONDecodeError as e:
-                print(f"  Erro ao parsear JSON: {e}")
-                print(f"  Conteúdo recebido (primeiros 500 chars): {content[:500]}")
-                print(f"  Conteúdo recebido (últimos 200 chars): {content[-200:]}")
-                print(f"  Tamanho total da resposta: {len(content)} caracteres")
-                print(f"  Tentando correção automática...")
-                
-                # Verifica se o marcador está incorreto
-                if '[[G' in content and ']]' not in content[content.find('[[G'):]:
-                    print("  Detectado marcador incompleto - possível erro na IA")
-                
-                # Tenta uma correção mais agressiva
-                fixed_content = self._aggressive_json_fix(content)
-                if fixed_content:
-                    try:
-                        result = json.loads(fixed_content)
-                        print("  ✓ JSON corrigido com sucesso!")
-                        return self._merge_results(batch, result)
-                    except:
-                        pass
-                
-                print(f"  Falha na correção do JSON")
-                return None
+                return self._parse_batch_response(batch, response)
+            finally:
+                self._add_timing('json_parse', time.perf_counter() - parse_start)
                 
         except requests.exceptions.Timeout:
             print("  Timeout na requisição à API")
@@ -215,6 +469,51 @@ class AIProcessor:
             print(f"  Erro inesperado: {type(e).__name__}: {str(e)}")
             return None
     
+    def _parse_batch_response(self, batch: List[Dict], response) -> List[Dict]:
+        """Extrai o JSON da resposta (corrigindo truncamentos) e aplica as marcações ao lote"""
+        result_data = response.json()
+        content = result_data['choices'][0]['message']['content']
+        
+        # Tenta extrair e corrigir JSON da resposta
+        try:
+            # Remove possível texto antes/depois do JSON
+            json_start = content.find('{')
+            json_end = content.rfind('}') + 1
+            if json_start >= 0 and json_end > json_start:
+                content = content[json_start:json_end]
+            
+            # Tenta corrigir JSON truncado
+            content = self._fix_truncated_json(content)
+            
+            # Parseia a resposta
+            result = json.loads(content)
+            return self._merge_results(batch, result)
+            
+        except json.JSONDecodeError as e:
+            print(f"  Erro ao parsear JSON: {e}")
+            print(f"  Conteúdo recebido (primeiros 500 chars): {content[:500]}")
+            print(f"  Conteúdo recebido (últimos 200 chars): {content[-200:]}")
+            print(f"  Tamanho total da resposta: {len(content)} caracteres")
+            print(f"  Tentando correção automática...")
+            
+            # Verifica se o marcador está incorreto
+            if '[[G' in content and ']]' not in content[content.find('[[G'):]:
+                print("  Detectado marcador incompleto - possível erro na IA")
+            
+            # Tenta uma correção mais agressiva
+            fixed_content = self._aggressive_json_fix(content)
+            if fixed_content:
+                try:
+                    result = json.loads(fixed_content)
+                    print("  ✓ JSON corrigido com sucesso!")
+                    return self._merge_results(batch, result)
+                except:
+                    pass
+            
+            print(f"  Falha na correção do JSON")
+            LLM_ERRORS.inc(reason='invalid_json')
+            return None
+    
     def _fix_truncated_json(self, content: str) -> str:
         """Tenta corrigir JSON truncado"""
         # Remove espaços extras
@@ -290,7 +589,8 @@ class AIProcessor:
         
         return None
     
-    def _process_batch_focused(self, batch: List[Dict], styles: List[Dict], removal_prompts: List[Dict], full_content: List[Dict]) -> List[Dict]:
+    def _process_batch_focused(self, batch: List[Dict], styles: List[Dict], removal_prompts: List[Dict], full_content: List[Dict],
+                               position_by_index: Dict[int, int] = None) -> List[Dict]:
         """Processa batch com foco especial em parágrafos não marcados, usando contexto"""
         system_prompt = """Você DEVE marcar TODOS os parágrafos abaixo. Analise cuidadosamente cada um.
 
@@ -322,15 +622,22 @@ ESTILOS DISPONÍVEIS:
             next_context = "FIM DO DOCUMENTO"
             
             # Encontra parágrafos vizinhos
-            for p in full_content:
-                if p['index'] == index - 1:
-                    prev_text = p['text'][:100] if p['text'] else ""
-                    prev_markers = p.get('markers', [])
-                    prev_context = f"{prev_text} [Marcado como: {prev_markers[0] if prev_markers else 'SEM MARCAÇÃO'}]"
-                elif p['index'] == index + 1:
-                    next_text = p['text'][:100] if p['text'] else ""
-                    next_markers = p.get('markers', [])
-                    next_context = f"{next_text} [Marcado como: {next_markers[0] if next_markers else 'SEM MARCAÇÃO'}]"
+            if position_by_index is None:
+                position_by_index = {p['index']: j for j, p in enumerate(full_content)}
+            
+            prev_pos = position_by_index.get(index - 1)
+            if prev_pos is not None:
+                p = full_content[prev_pos]
+                prev_text = p['text'][:100] if p['text'] else ""
+                prev_markers = p.get('markers', [])
+                prev_context = f"{prev_text} [Marcado como: {prev_markers[0] if prev_markers else 'SEM MARCAÇÃO'}]"
+            
+            next_pos = position_by_index.get(index + 1)
+            if next_pos is not None:
+                p = full_content[next_pos]
+                next_text = p['text'][:100] if p['text'] else ""
+                next_markers = p.get('markers', [])
+                next_context = f"{next_text} [Marcado como: {next_markers[0] if next_markers else 'SEM MARCAÇÃO'}]"
             
             user_prompt += f"\n--- CONTEXTO DO PARÁGRAFO {index} ---\n"
             user_prompt += f"ANTERIOR: {prev_context}\n"
@@ -356,12 +663,7 @@ ESTILOS DISPONÍVEIS:
         }
         
         try:
-            response = requests.post(
-                self.api_url, 
-                headers=headers, 
-                json=data,
-                timeout=45
-            )
+            response = self._post_completion(headers, data, 'focused', timeout=45)
             
             if response.status_code == 200:
                 result_data = response.json()
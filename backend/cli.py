@@ -0,0 +1,147 @@
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, List
+from werkzeug.utils import secure_filename
+from backend.config import Config
+from backend.ai_processor import SharedAIResources
+from backend.docx_package import validate_docx_upload
+from backend.jobs import execute_job
+from backend.result_cache import result_cache
+from backend.workspace import JobWorkspace
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def collect_inputs(patterns: List[str]) -> List[str]:
+    """Expande diretórios (busca recursiva por .docx) e globs em uma lista ordenada de arquivos"""
+    inputs = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, '**', '*.docx'), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        # Ignora arquivos de bloqueio do Word (~$arquivo.docx)
+        inputs.extend(m for m in matches if m.endswith('.docx') and not os.path.basename(m).startswith('~$'))
+
+    return sorted(set(os.path.abspath(path) for path in inputs))
+
+
+def load_style_config(path: str) -> Dict:
+    """Lê o JSON de configuração: {"styles": [...], "removal_prompts": [...]} ou só a lista de estilos"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    if isinstance(config, list):
+        config = {'styles': config}
+    if not config.get('styles'):
+        raise ValueError(f"Nenhum estilo definido em {path}")
+
+    return {'styles': config['styles'], 'removal_prompts': config.get('removal_prompts', [])}
+
+
+class BatchRunner:
+    """Processa arquivos locais com o mesmo pipeline e caches do servidor, sem HTTP.
+
+    Cada arquivo vira um job (workspace, cache de resultados, retenção) executado por
+    ``execute_job``; os arquivos rodam em paralelo compartilhando os recursos de IA.
+    Em uma nova execução, arquivos cujo resultado ainda está no cache (mesmo conteúdo
+    e mesma configuração, com o ZIP ainda em disco) são pulados. Cada arquivo gera
+    uma linha no resumo JSONL assim que termina. Com ``project``, cada arquivo é uma
+    revisão de ``<project>/<nome do arquivo>`` (reprocessamento incremental).
+    """
+
+    def __init__(self, api_key: str, styles: List[Dict], removal_prompts: List[Dict],
+                 workers: int = 1, force: bool = False, summary_path: str = None, project: str = None):
+        self.api_key = api_key
+        self.styles = styles
+        self.removal_prompts = removal_prompts
+        self.workers = max(1, workers)
+        self.force = force
+        self.project = project
+        self.summary_path = summary_path or os.path.join(
+            Config.OUTPUT_DIR, f"cli_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"
+        )
+        self.shared_ai = SharedAIResources(pool_size=self.workers * max(Config.AI_SECTION_WORKERS, 1))
+
+    def run(self, inputs: List[str]) -> List[Dict]:
+        print(f"Processando {len(inputs)} arquivos ({self.workers} em paralelo)")
+        print(f"Resumo: {self.summary_path}")
+
+        records = []
+        os.makedirs(os.path.dirname(os.path.abspath(self.summary_path)), exist_ok=True)
+        with open(self.summary_path, 'a', encoding='utf-8') as summary, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='cli') as executor:
+            futures = [executor.submit(self._process_file, path) for path in inputs]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                summary.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                summary.flush()
+
+                mark = {'processed': '✓', 'skipped': '✓', 'failed': '✗'}[record['status']]
+                print(f"{mark} [{len(records)}/{len(inputs)}] {record['input']} - "
+                      f"{record['status']} ({record['seconds']:.1f}s)")
+
+        return records
+
+    def _process_file(self, path: str) -> Dict:
+        start = time.time()
+        record = {'input': path, 'status': 'failed', 'zip_file': None, 'error': None, 'seconds': 0}
+        book_name = os.path.splitext(secure_filename(os.path.basename(path)))[0] or 'documento'
+
+        try:
+            validate_docx_upload(path, Config.MAX_UNCOMPRESSED_SIZE)
+            sha256 = _file_sha256(path)
+            record['sha256'] = sha256
+
+            # Retomada: resultado já existente para o mesmo conteúdo e configuração
+            project = f"{self.project}/{book_name}" if self.project else None
+            cached = None
+            if not self.force:
+                cached = result_cache.get(result_cache.make_key(
+                    sha256, book_name, self.styles, self.removal_prompts, self.api_key, project
+                ))
+
+            if cached is not None:
+                record.update(status='skipped', zip_file=_absolute_output(cached['zip_file']))
+            else:
+                workspace = JobWorkspace()
+                workspace.upload_sha256 = sha256
+                result = execute_job({
+                    'file_path': path,
+                    'book_name': book_name,
+                    'api_key': self.api_key,
+                    'styles': self.styles,
+                    'removal_prompts': self.removal_prompts,
+                    'workspace': workspace,
+                    'project': project,
+                    'force': self.force,
+                }, shared_ai=self.shared_ai)
+
+                if result.get('success'):
+                    record.update(status='processed', zip_file=_absolute_output(result['zip_file']),
+                                  cache=result.get('cache'), stats=result.get('stats'))
+                else:
+                    record['error'] = result.get('error')
+        except Exception as e:
+            record['error'] = str(e)
+
+        record['seconds'] = round(time.time() - start, 3)
+        return record
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _absolute_output(relative_path: str) -> str:
+    return os.path.join(Config.OUTPUT_DIR, relative_path)
@@ -12,18 +12,102 @@ class Config:
     UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
     OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
     TEMP_DIR = os.path.join(BASE_DIR, 'temp')
+    CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+    STYLE_CACHE_DIR = os.path.join(CACHE_DIR, 'styles')
+    RESULT_CACHE_DIR = os.path.join(CACHE_DIR, 'results')
+    REVISION_CACHE_DIR = os.path.join(CACHE_DIR, 'revisions')
     
     # File settings
     MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+    # Corpo da requisição: arquivo + campos do formulário (estilos, prompts...)
+    MAX_REQUEST_SIZE = MAX_FILE_SIZE + 2 * 1024 * 1024
+    # Conteúdo descomprimido máximo de um .docx (proteção contra zip bombs)
+    MAX_UNCOMPRESSED_SIZE = 20 * MAX_FILE_SIZE
+    # Cota de disco por job (upload + saída), em MB; 0 desativa
+    JOB_DISK_QUOTA = int(os.getenv('JOB_DISK_QUOTA_MB', '500')) * 1024 * 1024
     ALLOWED_EXTENSIONS = {'docx'}
     
     # OpenAI settings
+    # Endpoint de chat completions (aponte para benchmarks/mock_llm.py em testes locais)
+    OPENAI_API_URL = os.getenv('OPENAI_API_URL', 'https://api.openai.com/v1/chat/completions')
     GPT_MODEL = "gpt-4.1"
+    # Preço em US$ por milhão de tokens (estimativa de custo da pré-visualização)
+    AI_PRICE_INPUT_PER_MTOK = float(os.getenv('AI_PRICE_INPUT_PER_MTOK', '2.00'))
+    AI_PRICE_OUTPUT_PER_MTOK = float(os.getenv('AI_PRICE_OUTPUT_PER_MTOK', '8.00'))
+    # Parágrafos classificados na pré-visualização (/api/preview), em uma única chamada
+    PREVIEW_SAMPLE_SIZE = int(os.getenv('PREVIEW_SAMPLE_SIZE', '120'))
     MAX_TOKENS_PER_REQUEST = 4000
     TEMPERATURE = 0.3
     
+    # Style output settings
+    # 'document': reabre o pacote inteiro pelo python-docx
+    # 'package': reescreve só document.xml/styles.xml e copia o resto do zip byte a byte
+    STYLE_OUTPUT_MODE = os.getenv('STYLE_OUTPUT_MODE', 'document')
+    
+    # Split settings
+    # Gera também questões/gabaritos por simulado (clonagem de intervalos do corpo)
+    SPLIT_SIMULADOS = os.getenv('SPLIT_SIMULADOS', 'false').lower() == 'true'
+    # Processos para gerar os documentos separados (0 = um por núcleo, 1 = sequencial)
+    SPLIT_WORKERS = int(os.getenv('SPLIT_WORKERS', '0'))
+    
+    # Windowed pipeline settings
+    # 'full': documento inteiro em memória; 'windowed': leitura, IA e escrita em janelas
+    # (memória limitada à janela, gera só o documento completo); 'auto': em janelas
+    # quando o document.xml descomprimido passa de WINDOWED_AUTO_MB
+    PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'full')
+    WINDOWED_AUTO_MB = float(os.getenv('WINDOWED_AUTO_MB', '40'))
+    WINDOW_PARAGRAPHS = int(os.getenv('WINDOW_PARAGRAPHS', '600'))  # elementos por janela
+    
+    # Output settings
+    # O ZIP é o resultado entregue; 'true' grava também a árvore de pastas descompactada
+    # (download individual de cada arquivo), com o dobro de escrita em disco
+    KEEP_OUTPUT_TREE = os.getenv('KEEP_OUTPUT_TREE', 'false').lower() == 'true'
+    
+    # Retention settings (0 desativa cada limite)
+    RETENTION_INDEX = os.path.join(CACHE_DIR, 'outputs.sqlite3')
+    RETENTION_MAX_BYTES = int(os.getenv('RETENTION_MAX_MB', '5000')) * 1024 * 1024
+    RETENTION_MAX_AGE = float(os.getenv('RETENTION_MAX_AGE_HOURS', '72')) * 3600
+    RETENTION_SWEEP_INTERVAL = float(os.getenv('RETENTION_SWEEP_INTERVAL', '300'))  # segundos
+    # Modelos de estilo em disco (cache/styles), apagados pelo mesmo varredor
+    STYLE_CACHE_MAX_FILES = int(os.getenv('STYLE_CACHE_MAX_FILES', '500'))
+    STYLE_CACHE_MAX_AGE = float(os.getenv('STYLE_CACHE_MAX_AGE_DAYS', '30')) * 86400
+    # Reaproveita o resultado de reenvios idênticos (mesmo arquivo, estilos e remoções)
+    RESULT_CACHE = os.getenv('RESULT_CACHE', 'true').lower() == 'true'
+    # Guarda a classificação da última revisão de cada projeto (campo 'project'); uma
+    # nova revisão só manda à IA os parágrafos inseridos ou alterados
+    INCREMENTAL_REVISIONS = os.getenv('INCREMENTAL_REVISIONS', 'true').lower() == 'true'
+    
+    # Job settings (/api/jobs)
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))  # jobs processados ao mesmo tempo
+    JOB_QUEUE_LIMIT = int(os.getenv('JOB_QUEUE_LIMIT', '20'))  # jobs pendentes aceitos (0 = sem limite)
+    JOB_TTL = 3600  # segundos que um job terminado fica consultável
+    MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', '50'))  # arquivos por lote (/api/batch)
+    MAX_BATCH_REQUEST_SIZE = MAX_BATCH_FILES * MAX_FILE_SIZE + 2 * 1024 * 1024
+    BATCH_FILE_WORKERS = int(os.getenv('BATCH_FILE_WORKERS', '4'))  # arquivos de um lote em paralelo
+    
+    # Scheduling settings (fila justa entre chaves de API)
+    JOB_TENANT_LIMIT = int(os.getenv('JOB_TENANT_LIMIT', '1'))  # jobs da mesma chave ao mesmo tempo (0 = sem limite)
+    LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '16'))  # chamadas à IA simultâneas no processo
+    LLM_TENANT_LIMIT = int(os.getenv('LLM_TENANT_LIMIT', '8'))  # chamadas simultâneas por chave (0 = sem limite)
+    BULK_WEIGHT = float(os.getenv('BULK_WEIGHT', '0.25'))  # peso de lotes e CLI frente aos jobs interativos (1)
+    PROCESS_QUEUE_TIMEOUT = float(os.getenv('PROCESS_QUEUE_TIMEOUT', '30'))  # espera máx. de /api/process (s)
+    SCHEDULER_METRIC_TENANTS = int(os.getenv('SCHEDULER_METRIC_TENANTS', '20'))  # chaves com label próprio
+    
+    # AI batching settings
+    # Monta os lotes da IA dentro de cada simulado (nenhum lote atravessa um título)
+    SECTION_AWARE_BATCHING = os.getenv('SECTION_AWARE_BATCHING', 'false').lower() == 'true'
+    # Seções processadas em paralelo quando SECTION_AWARE_BATCHING está ativo
+    AI_SECTION_WORKERS = int(os.getenv('AI_SECTION_WORKERS', '4'))
+    
+    # Tracing settings (os tempos por etapa são sempre registrados em details['trace'])
+    # Pico de memória por etapa via tracemalloc (deixa o processamento bem mais lento)
+    TRACE_MEMORY = os.getenv('TRACE_MEMORY', 'false').lower() == 'true'
+    # Permite que o job peça um cProfile (campo 'profile=true'), salvo junto da saída
+    ALLOW_JOB_PROFILING = os.getenv('ALLOW_JOB_PROFILING', 'true').lower() == 'true'
+    
     @staticmethod
     def create_directories():
         """Cria diretórios necessários se não existirem"""
-        for directory in [Config.UPLOAD_DIR, Config.OUTPUT_DIR, Config.TEMP_DIR]:
+        for directory in [Config.UPLOAD_DIR, Config.OUTPUT_DIR, Config.TEMP_DIR,
+                          Config.STYLE_CACHE_DIR]:
             os.makedirs(directory, exist_ok=True)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
 from docx.shared import Pt, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 import os
@@ -13,98 +14,21 @@ class DocumentReader:
         """Lê todos os parágrafos e elementos do documento incluindo imagens"""
         elements = []
         element_index = 0
+        style_names, default_style = self.paragraph_style_names(self.document.styles)
         
         # Primeiro, processa parágrafos normais
         for i, para in enumerate(self.document.paragraphs):
-            # Verifica se o parágrafo contém imagem inline
-            has_inline_image = False
-            for run in para.runs:
-                if run._element.xpath('.//w:drawing') or run._element.xpath('.//w:pict'):
-                    has_inline_image = True
-                    print(f"  Imagem inline detectada no parágrafo {i}")
-                    break
-            
-            # Detecção detalhada de listas
-            is_list_item = False
-            list_type = None
-            list_char = None
-            
-            # Verifica se é um item de lista formatado pelo Word
-            if para._element.xpath('.//w:numPr'):
-                is_list_item = True
-                
-                # Tenta identificar o tipo baseado no texto
-                text_start = para.text.strip()[:10] if para.text else ""
-                
-                # Detecta tipo de marcador
-                if text_start:
-                    # Lista com letras (a), b), A), B)
-                    if re.match(r'^[a-zA-Z][\)\.]\s', text_start):
-                        list_type = 'letter'
-                        list_char = text_start[0]
-                    # Lista numerada 1. 2. 1) 2)
-                    elif re.match(r'^\d+[\)\.]\s', text_start):
-                        list_type = 'number'
-                    # Bullets (•, -, *, etc)
-                    else:
-                        list_type = 'bullet'
-                        # Tenta identificar o caractere do bullet
-                        if para._element.xpath('.//w:lvlText'):
-                            list_char = 'bullet'
-            
-            # Verifica também manualmente se parece uma lista (caso não esteja formatada)
-            elif para.text:
-                text_start = para.text.strip()
-                # Padrões manuais de lista
-                if re.match(r'^[a-eA-E][\)\.]\s', text_start):
-                    is_list_item = True
-                    list_type = 'letter'
-                    list_char = text_start[0].upper()
-                elif re.match(r'^\d+[\)\.]\s', text_start):
-                    is_list_item = True
-                    list_type = 'number'
-                elif text_start.startswith(('• ', '- ', '* ', '→ ', '▪ ')):
-                    is_list_item = True
-                    list_type = 'bullet'
-                    list_char = text_start[0]
-            
             # SEMPRE adiciona o parágrafo, mesmo se vazio
-            elements.append({
-                'index': element_index,
-                'type': 'paragraph',
-                'text': para.text,  # Pode ser vazio
-                'original_para_index': i,
-                'style': para.style.name if para.style else 'Normal',
-                'runs': self._extract_runs(para),
-                'has_image': has_inline_image,
-                'is_image_paragraph': has_inline_image and not para.text.strip(),
-                'is_list_item': is_list_item,  # Se é item de lista
-                'list_type': list_type,  # Tipo: 'bullet', 'number', 'letter'
-                'list_char': list_char,  # Caractere usado (A, B, 1, 2, •, etc)
-                'markers': []
-            })
+            style_id = para._p.style
+            style_name = style_names.get(style_id, default_style) if style_id else default_style
+            elements.append(self.describe_paragraph(para, i, element_index, style_name))
             element_index += 1
         
         # Processa tabelas
         for i, table in enumerate(self.document.tables):
-            table_text = []
-            for row in table.rows:
-                row_text = []
-                for cell in row.cells:
-                    if cell.text.strip():
-                        row_text.append(cell.text.strip())
-                if row_text:
-                    table_text.append(' | '.join(row_text))
-            
-            if table_text:
-                elements.append({
-                    'index': element_index,
-                    'type': 'table',
-                    'text': '\n'.join(table_text),
-                    'original_element': table._element,
-                    'style': 'Table',
-                    'markers': []
-                })
+            element = self.describe_table(table, element_index)
+            if element:
+                elements.append(element)
                 element_index += 1
         
         print(f"\nTotal de elementos lidos: {len(elements)}")
@@ -125,7 +49,113 @@ class DocumentReader:
         
         return elements
     
-    def _extract_runs(self, paragraph):
+    @staticmethod
+    def paragraph_style_names(styles):
+        """(styleId -> nome, nome do estilo padrão) dos estilos de parágrafo.
+        
+        Resolve os nomes como ``para.style.name`` (id ausente ou de outro tipo cai no
+        padrão), mas sem o python-docx procurar o estilo padrão a cada parágrafo.
+        """
+        names = {style.style_id: style.name for style in styles
+                 if style.style_id and style.type == WD_STYLE_TYPE.PARAGRAPH}
+        default = styles.default(WD_STYLE_TYPE.PARAGRAPH)
+        return names, default.name if default is not None else 'Normal'
+    
+    @staticmethod
+    def describe_paragraph(para, para_index: int, element_index: int, style_name: str) -> dict:
+        """Elemento lido de um parágrafo do corpo (texto, estilo, runs, imagem e lista)"""
+        # Verifica se o parágrafo contém imagem inline
+        has_inline_image = False
+        for run in para.runs:
+            if run._element.xpath('.//w:drawing') or run._element.xpath('.//w:pict'):
+                has_inline_image = True
+                print(f"  Imagem inline detectada no parágrafo {para_index}")
+                break
+        
+        # Detecção detalhada de listas
+        is_list_item = False
+        list_type = None
+        list_char = None
+        
+        # Verifica se é um item de lista formatado pelo Word
+        if para._element.xpath('.//w:numPr'):
+            is_list_item = True
+        
+            # Tenta identificar o tipo baseado no texto
+            text_start = para.text.strip()[:10] if para.text else ""
+        
+            # Detecta tipo de marcador
+            if text_start:
+                # Lista com letras (a), b), A), B)
+                if re.match(r'^[a-zA-Z][\)\.]\s', text_start):
+                    list_type = 'letter'
+                    list_char = text_start[0]
+                # Lista numerada 1. 2. 1) 2)
+                elif re.match(r'^\d+[\)\.]\s', text_start):
+                    list_type = 'number'
+                # Bullets (•, -, *, etc)
+                else:
+                    list_type = 'bullet'
+                    # Tenta identificar o caractere do bullet
+                    if para._element.xpath('.//w:lvlText'):
+                        list_char = 'bullet'
+        
+        # Verifica também manualmente se parece uma lista (caso não esteja formatada)
+        elif para.text:
+            text_start = para.text.strip()
+            # Padrões manuais de lista
+            if re.match(r'^[a-eA-E][\)\.]\s', text_start):
+                is_list_item = True
+                list_type = 'letter'
+                list_char = text_start[0].upper()
+            elif re.match(r'^\d+[\)\.]\s', text_start):
+                is_list_item = True
+                list_type = 'number'
+            elif text_start.startswith(('• ', '- ', '* ', '→ ', '▪ ')):
+                is_list_item = True
+                list_type = 'bullet'
+                list_char = text_start[0]
+        
+        return {
+            'index': element_index,
+            'type': 'paragraph',
+            'text': para.text,  # Pode ser vazio
+            'original_para_index': para_index,
+            'style': style_name,
+            'runs': DocumentReader._extract_runs(para),
+            'has_image': has_inline_image,
+            'is_image_paragraph': has_inline_image and not para.text.strip(),
+            'is_list_item': is_list_item,  # Se é item de lista
+            'list_type': list_type,  # Tipo: 'bullet', 'number', 'letter'
+            'list_char': list_char,  # Caractere usado (A, B, 1, 2, •, etc)
+            'markers': []
+        }
+    
+    @staticmethod
+    def describe_table(table, element_index: int) -> dict:
+        """Elemento lido de uma tabela (texto das células por linha); None se vazia"""
+        table_text = []
+        for row in table.rows:
+            row_text = []
+            for cell in row.cells:
+                if cell.text.strip():
+                    row_text.append(cell.text.strip())
+            if row_text:
+                table_text.append(' | '.join(row_text))
+        
+        if table_text:
+            return {
+                'index': element_index,
+                'type': 'table',
+                'text': '\n'.join(table_text),
+                'original_element': table._element,
+                'style': 'Table',
+                'markers': []
+            }
+        return None
+    
+    @staticmethod
+    def _extract_runs(paragraph):
         """Extrai informações de formatação dos runs"""
         runs = []
         for run in paragraph.runs:
@@ -161,16 +191,14 @@ class DocumentReader:
         paragraph_count = 0
         image_count = 0
         table_count = 0
+        # Parágrafo de cada elemento do corpo, montado uma vez (e não uma busca por elemento)
+        paragraphs = {p._element: p for p in self.document.paragraphs}
         
         for element in self.document.element.body:
             if element.tag.endswith('p'):
                 paragraph_count += 1
                 # Verifica se tem imagem
-                para = None
-                for p in self.document.paragraphs:
-                    if p._element == element:
-                        para = p
-                        break
+                para = paragraphs.get(element)
                 if para:
                     for run in para.runs:
                         if run._element.xpath('.//w:drawing') or run._element.xpath('.//w:pict'):
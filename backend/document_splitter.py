@@ -1,10 +1,131 @@
 from docx import Document
+from docx.enum.style import WD_STYLE_TYPE
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.parts.image import ImagePart
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from lxml import etree
 from typing import List, Dict, Tuple
+import io
+import multiprocessing
+import os
+import posixpath
 import re
+import time
+from backend.docx_package import SerializedDocument
+
+W_P = qn('w:p')
+W_SECTPR = qn('w:sectPr')
+# Atributos r:embed, r:id, r:link... guardam ids de relacionamento da parte
+R_ATTR_PREFIX = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+# Partes do pacote copiadas da origem para cada documento gerado
+SHARED_PART_RELTYPES = [RT.STYLES, RT.NUMBERING, RT.THEME]
+
+# Palavras que identificam um estilo de gabarito pelo nome
+ANSWER_STYLE_WORDS = ('gabarito', 'resposta', 'answer')
+
+# Padrões de gabarito no início do texto, combinados em uma única regex
+GABARITO_TEXT_PATTERN = re.compile(
+    r'^(?:[a-h]\d+\s*[–\-]|resposta:|gabarito:|alternativa correta:)'
+)
+
+# Os processos da divisão são criados a partir de threads (jobs do servidor):
+# fork copiaria locks de outras threads, então usa forkserver (spawn onde não há)
+SPLIT_MP_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+)
+
+
+class AnswerKeyClassifier:
+    """Classificador de gabarito compilado uma vez por job a partir dos estilos.
+    
+    Guarda o conjunto de marcadores de gabarito e uma única regex com todas as
+    palavras-chave dos prompts de gabarito, de modo que cada parágrafo é analisado
+    em uma passada pelo texto (mesma regra de ``_text_matches_prompt``).
+    """
+    
+    def __init__(self, styles: List[Dict]):
+        # marcador -> gabarito; o primeiro estilo com o marcador decide
+        self.answer_markers = set()
+        seen_markers = set()
+        for style in styles:
+            marker = style.get('marker')
+            if marker in seen_markers:
+                continue
+            seen_markers.add(marker)
+            if self.is_answer_name(style.get('name', '')):
+                self.answer_markers.add(marker)
+        
+        # Regras dos prompts: (multiplicidade de cada palavra-chave, mínimo de acertos)
+        self._prompt_rules = []
+        for style in styles:
+            if not self.is_answer_name(style.get('name', '')):
+                continue
+            keywords = re.findall(r'\b\w+\b', style.get('prompt', '').lower())
+            counts = {}
+            for keyword in keywords:
+                counts[keyword] = counts.get(keyword, 0) + 1
+            self._prompt_rules.append((counts, min(2, len(keywords) // 2)))
+        
+        self._always_matches = any(threshold <= 0 for _, threshold in self._prompt_rules)
+        
+        all_keywords = sorted({k for counts, _ in self._prompt_rules for k in counts},
+                              key=len, reverse=True)
+        self._keyword_pattern = None
+        self._implied_keywords = {}
+        if all_keywords:
+            # Lookahead: testa todas as posições, preferindo a palavra mais longa
+            self._keyword_pattern = re.compile(
+                '(?=(' + '|'.join(re.escape(k) for k in all_keywords) + '))'
+            )
+            # Palavras que são prefixo de outra são encontradas junto com ela
+            self._implied_keywords = {
+                keyword: {k for k in all_keywords if keyword.startswith(k)}
+                for keyword in all_keywords
+            }
+        
+        self._style_name_cache = {}
+    
+    @staticmethod
+    def is_answer_name(name: str) -> bool:
+        name = name.lower()
+        return any(word in name for word in ANSWER_STYLE_WORDS)
+    
+    def has_answer_marker(self, markers: List[str]) -> bool:
+        return any(marker in self.answer_markers for marker in markers)
+    
+    def style_is_answer(self, style_name: str) -> bool:
+        """Nome de estilo do Word indica gabarito? (com cache por nome)"""
+        result = self._style_name_cache.get(style_name)
+        if result is None:
+            result = self.is_answer_name(style_name)
+            self._style_name_cache[style_name] = result
+        return result
+    
+    def text_matches(self, text_lower: str) -> bool:
+        """Equivale a testar _text_matches_prompt contra cada prompt de gabarito"""
+        if not self._prompt_rules:
+            return False
+        if self._always_matches:
+            return True
+        
+        found = set()
+        for match in self._keyword_pattern.finditer(text_lower):
+            found |= self._implied_keywords[match.group(1)]
+        
+        for counts, threshold in self._prompt_rules:
+            matches = sum(count for keyword, count in counts.items() if keyword in found)
+            if matches >= threshold:
+                return True
+        return False
 
 class DocumentSplitter:
     def __init__(self):
         self.simulado_pattern = re.compile(r'Simulado\s+(\d+)', re.IGNORECASE)
+        # Tempo de geração (s) de cada documento separado do último job
+        self.document_timings = {}
         
     def split_simulados(self, document: Document) -> List[Dict]:
         """Divide o documento em simulados individuais com precisão melhorada"""
@@ -14,9 +135,12 @@ class DocumentSplitter:
         current_content = []
         current_start = 0
         
+        # document.paragraphs recria a lista inteira a cada acesso: lê uma única vez
+        paragraphs = document.paragraphs
+        
         # Primeira passada: identifica todos os títulos de simulado
         simulado_positions = []
-        for i, para in enumerate(document.paragraphs):
+        for i, para in enumerate(paragraphs):
             text = para.text.strip()
             
             # Verifica se é título de simulado (mais preciso)
@@ -34,12 +158,10 @@ class DocumentSplitter:
         # Segunda passada: coleta o conteúdo de cada simulado
         for idx, sim_pos in enumerate(simulado_positions):
             start_idx = sim_pos['index']
-            end_idx = simulado_positions[idx + 1]['index'] if idx + 1 < len(simulado_positions) else len(document.paragraphs)
+            end_idx = simulado_positions[idx + 1]['index'] if idx + 1 < len(simulado_positions) else len(paragraphs)
             
             # Coleta parágrafos do simulado
-            content = []
-            for i in range(start_idx, end_idx):
-                content.append(document.paragraphs[i])
+            content = paragraphs[start_idx:end_idx]
             
             simulados.append({
                 'number': sim_pos['number'],
@@ -55,15 +177,62 @@ class DocumentSplitter:
         print(f"\nTotal de simulados encontrados: {len(simulados)}")
         total_paragraphs = sum(s['paragraph_count'] for s in simulados)
         print(f"Total de parágrafos em simulados: {total_paragraphs}")
-        print(f"Total de parágrafos no documento: {len(document.paragraphs)}")
+        print(f"Total de parágrafos no documento: {len(paragraphs)}")
         
-        if total_paragraphs < len(document.paragraphs):
-            print(f"AVISO: {len(document.paragraphs) - total_paragraphs} parágrafos não atribuídos a nenhum simulado")
+        if total_paragraphs < len(paragraphs):
+            print(f"AVISO: {len(paragraphs) - total_paragraphs} parágrafos não atribuídos a nenhum simulado")
         
         return simulados
     
+    def find_sections(self, paragraphs: List[Dict]) -> List[Dict]:
+        """Detecta as seções (simulados) nos elementos lidos pelo DocumentReader.
+        
+        Retorna intervalos semiabertos [start, end) de posições da lista de elementos.
+        O conteúdo antes do primeiro título vira uma seção de abertura. Sem títulos,
+        o documento inteiro é uma única seção. O DocumentReader lista as tabelas depois
+        de todos os parágrafos, sem a posição delas no corpo: com títulos, elas formam
+        uma seção própria no fim, em vez de cair todas na última seção.
+        """
+        sections = []
+        body_end = next((pos for pos, elem in enumerate(paragraphs) if elem.get('type') == 'table'),
+                        len(paragraphs))
+        
+        for pos, elem in enumerate(paragraphs[:body_end]):
+            if elem.get('type') != 'paragraph':
+                continue
+            
+            text = elem.get('text', '').strip()
+            first_run = elem['runs'][0] if elem.get('runs') else {}
+            if not self._looks_like_simulado_title(text, elem.get('style'),
+                                                   first_run.get('bold'), first_run.get('font_size')):
+                continue
+            
+            match = self.simulado_pattern.search(text)
+            if sections:
+                sections[-1]['end'] = pos
+            elif pos > 0:
+                sections.append({'number': None, 'title': 'Abertura', 'start': 0, 'end': pos})
+            sections.append({'number': int(match.group(1)), 'title': text, 'start': pos, 'end': body_end})
+        
+        if not sections:
+            sections.append({'number': None, 'title': 'Documento', 'start': 0, 'end': len(paragraphs)})
+        elif body_end < len(paragraphs):
+            sections.append({'number': None, 'title': 'Tabelas', 'start': body_end, 'end': len(paragraphs)})
+        
+        return sections
+    
     def _is_simulado_title(self, text: str, paragraph) -> bool:
         """Verifica se o parágrafo é realmente um título de simulado"""
+        first_run = paragraph.runs[0] if paragraph.runs else None
+        return self._looks_like_simulado_title(
+            text,
+            paragraph.style.name if paragraph.style else None,
+            first_run.bold if first_run else None,
+            first_run.font.size.pt if first_run and first_run.font.size else None
+        )
+    
+    def _looks_like_simulado_title(self, text: str, style_name: str, first_run_bold, first_run_size) -> bool:
+        """Regras de título de simulado sobre texto, estilo e formatação do primeiro run"""
         # Verifica o padrão de texto
         if not self.simulado_pattern.search(text):
             return False
@@ -73,16 +242,14 @@ class DocumentSplitter:
             return False
         
         # Verifica o estilo (títulos geralmente têm estilos específicos)
-        if paragraph.style and paragraph.style.name:
-            style_name = paragraph.style.name.lower()
+        if style_name:
+            style_name = style_name.lower()
             if any(h in style_name for h in ['heading', 'título', 'title']):
                 return True
         
         # Verifica formatação (negrito, tamanho maior)
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            if first_run.bold or (first_run.font.size and first_run.font.size.pt > 12):
-                return True
+        if first_run_bold or (first_run_size and first_run_size > 12):
+            return True
         
         # Se tem apenas o padrão "Simulado X" ou similar, provavelmente é título
         if len(text.split()) <= 10:
@@ -95,214 +262,370 @@ class DocumentSplitter:
                                           simulado_info: Dict,
                                           styles: List[Dict]) -> Tuple[List, List]:
         """Separa questões de gabaritos usando as marcações da IA e estilos definidos"""
+        flags = self._classify_answer_paragraphs(simulado_content, marked_content, simulado_info, styles)
+        
+        questions_content = [para for para, is_gabarito in zip(simulado_content, flags) if not is_gabarito]
+        answers_content = [para for para, is_gabarito in zip(simulado_content, flags) if is_gabarito]
+        
+        return questions_content, answers_content
+    
+    def _classify_answer_paragraphs(self, simulado_content: List, 
+                                    marked_content: List[Dict], 
+                                    simulado_info: Dict,
+                                    styles: List[Dict],
+                                    classifier: AnswerKeyClassifier = None) -> List[bool]:
+        """Marca, para cada parágrafo do simulado, se ele pertence ao gabarito"""
         print(f"\n  Separando Simulado {simulado_info['number']} usando marcações...")
         
-        questions_content = []
-        answers_content = []
+        if classifier is None:
+            classifier = AnswerKeyClassifier(styles)
+        
+        flags = []
         
         # Mapeia os parágrafos originais para as marcações
         start_idx = simulado_info['start_index']
-        end_idx = simulado_info['end_index']
         
-        gabarito_count = 0
-        question_count = 0
+        # style_id -> nome do estilo, resolvido uma vez por documento
+        style_names = self._style_names_by_id(simulado_content[0]) if simulado_content else {}
         
         for i, para in enumerate(simulado_content):
-            # Encontra a marcação correspondente
-            global_idx = start_idx + i
-            
             # Busca nas marcações
-            marked_para = None
-            if global_idx < len(marked_content):
-                marked_para = marked_content[global_idx]
-            
-            is_gabarito = False
+            global_idx = start_idx + i
+            markers = marked_content[global_idx].get('markers') if global_idx < len(marked_content) else None
             
             # Verifica marcações da IA primeiro
-            if marked_para and marked_para.get('markers'):
-                markers = marked_para['markers']
-                # Verifica se tem marcador de gabarito baseado nos estilos definidos
-                for marker in markers:
-                    style_info = next((s for s in styles if s.get('marker') == marker), None)
-                    if style_info:
-                        style_name = style_info.get('name', '').lower()
-                        if any(word in style_name for word in ['gabarito', 'resposta', 'answer']):
-                            is_gabarito = True
-                            break
+            is_gabarito = bool(markers) and classifier.has_answer_marker(markers)
             
             # Fallback: verifica pelo estilo original se não tem marcação
-            if not is_gabarito and para.style and para.style.name:
-                style_name_lower = para.style.name.lower()
-                if 'gabarito' in style_name_lower or 'answer' in style_name_lower or 'resposta' in style_name_lower:
-                    is_gabarito = True
+            if not is_gabarito:
+                style_name = style_names.get(para._p.style, style_names.get(None))
+                is_gabarito = bool(style_name) and classifier.style_is_answer(style_name)
             
-            # Fallback final: análise de conteúdo baseada nos estilos definidos
+            # Fallback final: análise de conteúdo baseada nos prompts dos estilos de gabarito
             if not is_gabarito:
-                text_lower = para.text.lower().strip()
-                
-                # Busca nos prompts dos estilos definidos se algum indica gabarito
-                for style in styles:
-                    style_name = style.get('name', '').lower()
-                    style_prompt = style.get('prompt', '').lower()
-                    
-                    if any(word in style_name for word in ['gabarito', 'resposta', 'answer']):
-                        # Verifica se o texto atual corresponde ao prompt deste estilo
-                        if self._text_matches_prompt(text_lower, style_prompt):
-                            is_gabarito = True
-                            break
+                is_gabarito = classifier.text_matches(para.text.lower().strip())
             
-            # Adiciona ao grupo apropriado
-            if is_gabarito:
-                answers_content.append(para)
-                gabarito_count += 1
-            else:
-                questions_content.append(para)
-                question_count += 1
+            flags.append(is_gabarito)
         
+        gabarito_count = flags.count(True)
+        question_count = len(flags) - gabarito_count
         print(f"    - Questões: {question_count} parágrafos")
         print(f"    - Gabaritos: {gabarito_count} parágrafos")
         print(f"    - Total: {question_count + gabarito_count} parágrafos")
         
-        return questions_content, answers_content
+        return flags
+    
+    def _style_names_by_id(self, paragraph) -> Dict:
+        """Mapa style_id -> nome dos estilos de parágrafo (None = estilo padrão)"""
+        names = {}
+        for style in paragraph.part.styles:
+            if style.type != WD_STYLE_TYPE.PARAGRAPH:
+                continue
+            names[style.style_id] = style.name
+            if style.element.default:
+                names[None] = style.name
+        return names
     
     def create_split_documents(self, simulados: List[Dict], document: Document, 
                               marked_content: List[Dict], styles: List[Dict]) -> Dict[str, Document]:
-        """Cria documentos separados usando as marcações da IA e estilos definidos"""
+        """Cria documentos separados clonando intervalos contíguos do corpo do documento"""
+        plans = self.plan_split_documents(simulados, document, marked_content, styles)
+        return self._build_planned_documents(plans, document)
+    
+    def create_split_documents_parallel(self, simulados: List[Dict], document: Document,
+                                        marked_content: List[Dict], styles: List[Dict],
+                                        workers: int = None) -> Dict[str, SerializedDocument]:
+        """Gera os documentos separados em um pool de processos.
+        
+        Cada worker recebe os bytes do documento de origem uma única vez (no
+        inicializador) e depois só os intervalos de elementos de cada saída; o
+        resultado volta já serializado como .docx.
+        """
+        plans = self.plan_split_documents(simulados, document, marked_content, styles)
+        workers = min(workers or os.cpu_count() or 1, len(plans))
+        
+        if workers <= 1:
+            documents = self._build_planned_documents(plans, document)
+            return {name: SerializedDocument.from_document(doc) for name, doc in documents.items()}
+        
+        print(f"\n=== CRIANDO DOCUMENTOS SEPARADOS ({workers} processos) ===")
+        source = io.BytesIO()
+        document.save(source)
+        
+        documents = {}
+        self.document_timings = {}
+        
+        with ProcessPoolExecutor(max_workers=workers, mp_context=SPLIT_MP_CONTEXT,
+                                 initializer=_init_split_worker, initargs=(source.getvalue(),)) as executor:
+            futures = [
+                executor.submit(_build_split_document, plan['name'], plan['ranges'], plan['title'])
+                for plan in plans
+            ]
+            for plan, future in zip(plans, futures):
+                name, blob, seconds = future.result()
+                documents[name] = SerializedDocument(blob)
+                self.document_timings[name] = seconds
+                print(f"  ✓ {plan['title']}: {plan['paragraphs']} parágrafos ({seconds:.2f}s)")
+        
+        return documents
+    
+    def _build_planned_documents(self, plans: List[Dict], document: Document) -> Dict[str, Document]:
+        """Gera sequencialmente os documentos planejados, medindo o tempo de cada um"""
         print("\n=== CRIANDO DOCUMENTOS SEPARADOS ===")
         documents = {}
+        self.document_timings = {}
+        
+        elements, _ = self._body_layout(document)
+        
+        for plan in plans:
+            start_time = time.perf_counter()
+            documents[plan['name']] = self._clone_ranges_to_document(
+                document, elements, plan['ranges'], plan['title']
+            )
+            self.document_timings[plan['name']] = round(time.perf_counter() - start_time, 3)
+            print(f"  ✓ {plan['title']}: {plan['paragraphs']} parágrafos")
+        
+        return documents
+    
+    def plan_split_documents(self, simulados: List[Dict], document: Document,
+                             marked_content: List[Dict], styles: List[Dict]) -> List[Dict]:
+        """Calcula, para cada documento de saída, os intervalos do corpo que ele contém"""
+        plans = []
+        classifier = AnswerKeyClassifier(styles)
+        
+        elements, para_positions = self._body_layout(document)
         
         for simulado in simulados:
             sim_num = simulado['number']
             print(f"\nProcessando Simulado {sim_num}...")
             
             # Separa usando marcações da IA e estilos
-            questions_content, answers_content = self.separate_questions_answers_enhanced(
+            flags = self._classify_answer_paragraphs(
                 simulado['content'], 
                 marked_content,
                 simulado,
-                styles
+                styles,
+                classifier
             )
             
-            # Cria documento de questões
-            if questions_content:
-                questions_doc = self._create_document_from_paragraphs(
-                    questions_content, 
-                    document,
-                    f"Simulado {sim_num} - Questões"
-                )
-                documents[f'simulado_{sim_num}_questoes'] = questions_doc
-                print(f"  ✓ Documento de questões criado: {len(questions_content)} parágrafos")
+            # O simulado vai do seu título até o título seguinte (tabelas incluídas)
+            start_pos = para_positions[simulado['start_index']]
+            next_index = simulado['end_index'] + 1
+            end_pos = para_positions[next_index] if next_index < len(para_positions) else len(elements)
             
-            # Cria documento de gabaritos
-            if answers_content:
-                answers_doc = self._create_document_from_paragraphs(
-                    answers_content, 
-                    document,
-                    f"Simulado {sim_num} - Gabarito"
-                )
-                documents[f'simulado_{sim_num}_gabarito'] = answers_doc
-                print(f"  ✓ Documento de gabarito criado: {len(answers_content)} parágrafos")
-        
-        return documents
+            ranges = self._ranges_by_label(
+                elements, para_positions, simulado['start_index'], start_pos, end_pos, flags
+            )
+            
+            # Documento de questões
+            if ranges[False]:
+                plans.append({
+                    'name': f'simulado_{sim_num}_questoes',
+                    'title': f"Simulado {sim_num} - Questões",
+                    'ranges': ranges[False],
+                    'paragraphs': flags.count(False)
+                })
+            
+            # Documento de gabaritos
+            if ranges[True]:
+                plans.append({
+                    'name': f'simulado_{sim_num}_gabarito',
+                    'title': f"Simulado {sim_num} - Gabarito",
+                    'ranges': ranges[True],
+                    'paragraphs': flags.count(True)
+                })
+        
+        return plans
     
     def create_complete_documents(self, document: Document, marked_content: List[Dict]) -> Dict[str, Document]:
         """Cria documento completo e separados (questões/gabaritos) do documento inteiro"""
         print("\n=== CRIANDO DOCUMENTOS COMPLETOS ===")
         documents = {}
         
+        elements, para_positions = self._body_layout(document)
+        
         # 1. Documento completo estilizado
         print("\nCriando documento completo...")
-        complete_doc = Document()
-        self._copy_styles(document, complete_doc)
-        
-        para_count = 0
-        for para in document.paragraphs:
-            if para.text.strip() or self._has_image(para):
-                self._copy_paragraph_to_document(complete_doc, para)
-                para_count += 1
+        documents['completo'] = self._clone_ranges_to_document(document, elements, [(0, len(elements))])
+        print(f"  ✓ Documento completo: {len(para_positions)} parágrafos")
         
-        documents['completo'] = complete_doc
-        print(f"  ✓ Documento completo: {para_count} parágrafos")
-        
-        # 2. Documento só com questões (todo o documento)
+        # 2. Documentos de questões e gabaritos (todo o documento)
         print("\nCriando documento de todas as questões...")
-        all_questions_doc = Document()
-        all_answers_doc = Document()
-        self._copy_styles(document, all_questions_doc)
-        self._copy_styles(document, all_answers_doc)
-        
-        questions_count = 0
-        answers_count = 0
-        
-        for i, para in enumerate(document.paragraphs):
+        flags = []
+        for i, p in enumerate(document.element.body.p_lst):
+            is_gabarito = False
+            
+            # Se não tem marcação, vai para as questões por padrão
             if i < len(marked_content):
-                marked = marked_content[i]
-                markers = marked.get('markers', [])
-                
-                # Verifica se é gabarito
-                is_gabarito = any('GABARITO' in m for m in markers)
-                
-                if not is_gabarito:
-                    # Também verifica padrões de gabarito no texto
-                    text_lower = para.text.lower().strip()
-                    gabarito_patterns = [
-                        r'^[a-h]\d+\s*[–\-]',
-                        r'^resposta:',
-                        r'^gabarito:',
-                        r'^alternativa correta:'
-                    ]
-                    for pattern in gabarito_patterns:
-                        if re.search(pattern, text_lower):
-                            is_gabarito = True
-                            break
+                markers = marked_content[i].get('markers', [])
                 
-                if is_gabarito:
-                    self._copy_paragraph_to_document(all_answers_doc, para)
-                    answers_count += 1
-                else:
-                    self._copy_paragraph_to_document(all_questions_doc, para)
-                    questions_count += 1
-            else:
-                # Se não tem marcação, adiciona às questões por padrão
-                self._copy_paragraph_to_document(all_questions_doc, para)
-                questions_count += 1
+                # Verifica se é gabarito (marcador ou padrões no texto)
+                is_gabarito = (any('GABARITO' in m for m in markers)
+                               or GABARITO_TEXT_PATTERN.match(p.text.lower().strip()) is not None)
+            
+            flags.append(is_gabarito)
         
-        documents['todas_questoes'] = all_questions_doc
-        documents['todos_gabaritos'] = all_answers_doc
+        ranges = self._ranges_by_label(elements, para_positions, 0, 0, len(elements), flags)
+        documents['todas_questoes'] = self._clone_ranges_to_document(document, elements, ranges[False])
+        documents['todos_gabaritos'] = self._clone_ranges_to_document(document, elements, ranges[True])
         
-        print(f"  ✓ Documento de questões: {questions_count} parágrafos")
-        print(f"  ✓ Documento de gabaritos: {answers_count} parágrafos")
+        print(f"  ✓ Documento de questões: {flags.count(False)} parágrafos")
+        print(f"  ✓ Documento de gabaritos: {flags.count(True)} parágrafos")
         
         return documents
     
-    def _create_document_from_paragraphs(self, paragraphs: List, source_doc: Document, 
-                                       title: str = None) -> Document:
-        """Cria um novo documento a partir de uma lista de parágrafos"""
-        new_doc = Document()
+    def _body_layout(self, document: Document) -> Tuple[List, List[int]]:
+        """Retorna os elementos do corpo (sem o sectPr final) e a posição de cada parágrafo"""
+        elements = []
+        para_positions = []
+        
+        for element in document.element.body.iterchildren():
+            if element.tag == W_SECTPR:
+                continue
+            if element.tag == W_P:
+                para_positions.append(len(elements))
+            elements.append(element)
+        
+        return elements, para_positions
+    
+    def _ranges_by_label(self, elements: List, para_positions: List[int], first_para: int,
+                         start_pos: int, end_pos: int, flags: List[bool]) -> Dict[bool, List[Tuple[int, int]]]:
+        """Agrupa elements[start_pos:end_pos] em intervalos contíguos por rótulo.
+        
+        Parágrafos usam o rótulo de flags; tabelas e outros elementos herdam o rótulo
+        do parágrafo anterior. Os intervalos são semiabertos: (início, fim).
+        """
+        ranges = {False: [], True: []}
+        para_idx = first_para
+        label = False
+        run_start = start_pos
+        run_label = None
+        
+        for pos in range(start_pos, end_pos):
+            if para_idx < len(para_positions) and para_positions[para_idx] == pos:
+                flag_idx = para_idx - first_para
+                label = flags[flag_idx] if flag_idx < len(flags) else False
+                para_idx += 1
+            
+            if label != run_label:
+                if run_label is not None:
+                    ranges[run_label].append((run_start, pos))
+                run_start = pos
+                run_label = label
+        
+        if run_label is not None:
+            ranges[run_label].append((run_start, end_pos))
+        
+        return ranges
+    
+    def _clone_ranges_to_document(self, source_doc: Document, elements: List,
+                                  ranges: List[Tuple[int, int]], title: str = None) -> Document:
+        """Cria um novo documento com cópias profundas dos intervalos do corpo da origem.
         
-        # Copia estilos
-        self._copy_styles(source_doc, new_doc)
+        Estilos, numeração e tema da origem são copiados inteiros; imagens e demais
+        relacionamentos referenciados pelos elementos são recriados no novo pacote.
+        """
+        new_doc = Document()
+        self._copy_shared_parts(source_doc, new_doc)
+        
+        rel_map = {}
+        part_map = {}
+        body = new_doc.element.body
+        
+        # Usa as propriedades de seção (página, margens) da origem
+        source_sect_pr = source_doc.element.body.sectPr
+        sect_pr = body.sectPr
+        if source_sect_pr is not None:
+            new_sect_pr = deepcopy(source_sect_pr)
+            self._remap_relationships(new_sect_pr, source_doc.part, new_doc.part, rel_map, part_map)
+            if sect_pr is not None:
+                sect_pr.addprevious(new_sect_pr)
+                body.remove(sect_pr)
+            else:
+                body.append(new_sect_pr)
+            sect_pr = new_sect_pr
         
         # Adiciona título se fornecido
         if title:
             title_para = new_doc.add_paragraph(title)
-            if 'Heading 1' in [s.name for s in new_doc.styles]:
+            if 'Heading 1' in new_doc.styles:
                 title_para.style = 'Heading 1'
             new_doc.add_paragraph()  # Linha em branco
         
-        # Copia parágrafos
-        for para in paragraphs:
-            if para.text.strip() or self._has_image(para):
-                self._copy_paragraph_to_document(new_doc, para)
+        for start, end in ranges:
+            for element in elements[start:end]:
+                clone = deepcopy(element)
+                self._remap_relationships(clone, source_doc.part, new_doc.part, rel_map, part_map)
+                if sect_pr is not None:
+                    sect_pr.addprevious(clone)
+                else:
+                    body.append(clone)
         
         return new_doc
     
-    def _has_image(self, paragraph) -> bool:
-        """Verifica se o parágrafo contém imagem"""
-        for run in paragraph.runs:
-            if run._element.xpath('.//w:drawing') or run._element.xpath('.//w:pict'):
-                return True
-        return False
+    def _copy_shared_parts(self, source_doc: Document, target_doc: Document):
+        """Substitui estilos, numeração e tema do documento novo pelos da origem"""
+        for reltype in SHARED_PART_RELTYPES:
+            try:
+                source_part = source_doc.part.part_related_by(reltype)
+            except KeyError:
+                continue
+            
+            try:
+                if reltype == RT.NUMBERING:
+                    target_part = target_doc.part.numbering_part
+                else:
+                    target_part = target_doc.part.part_related_by(reltype)
+            except KeyError:
+                continue
+            
+            if hasattr(target_part, '_element'):
+                if hasattr(source_part, '_element'):
+                    target_part._element = deepcopy(source_part._element)
+                else:
+                    target_part._element = etree.fromstring(source_part.blob, target_part._element.getroottree().parser)
+            else:
+                target_part._blob = source_part.blob
+    
+    def _remap_relationships(self, root, source_part, target_part, rel_map: Dict, part_map: Dict):
+        """Reescreve os r:embed/r:id/r:link de root para relacionamentos do pacote de destino"""
+        for element in root.iter(tag=etree.Element):
+            rel_attrs = [(attr, value) for attr, value in element.attrib.items()
+                         if attr.startswith(R_ATTR_PREFIX)]
+            
+            for attr, source_rId in rel_attrs:
+                if source_rId not in rel_map:
+                    rel_map[source_rId] = self._import_relationship(
+                        source_part, target_part, source_rId, part_map
+                    )
+                
+                target_rId = rel_map[source_rId]
+                if target_rId is not None:
+                    element.set(attr, target_rId)
+    
+    def _import_relationship(self, source_part, target_part, rId: str, part_map: Dict):
+        """Recria no destino o relacionamento rId da origem e retorna o novo rId"""
+        rel = source_part.rels.get(rId)
+        if rel is None:
+            return None
+        
+        if rel.is_external:
+            return target_part.relate_to(rel.target_ref, rel.reltype, is_external=True)
+        
+        source_target = rel.target_part
+        if rel.reltype != RT.IMAGE:
+            # Demais partes (gráficos, cabeçalhos...) são compartilhadas, somente leitura
+            return target_part.relate_to(source_target, rel.reltype)
+        
+        # Imagens ganham uma parte própria em word/media do novo pacote
+        image_part = part_map.get(source_target)
+        if image_part is None:
+            ext = posixpath.splitext(source_target.partname)[1]
+            partname = target_part.package.next_partname(f'/word/media/image%d{ext}')
+            image_part = ImagePart(partname, source_target.content_type, source_target.blob)
+            part_map[source_target] = image_part
+        
+        return target_part.relate_to(image_part, RT.IMAGE)
     
     def _text_matches_prompt(self, text: str, prompt: str) -> bool:
         """Verifica se o texto corresponde ao prompt definido pelo usuário"""
@@ -314,97 +637,29 @@ class DocumentSplitter:
         
         # Retorna True se tem correspondência significativa
         return matches >= min(2, len(keywords) // 2)
+
+
+# Estado de cada processo do pool de divisão (inicializado uma vez por worker)
+_worker_state = {}
+
+
+def _init_split_worker(source_bytes: bytes):
+    """Abre o documento de origem uma única vez por processo"""
+    document = Document(io.BytesIO(source_bytes))
+    splitter = DocumentSplitter()
+    elements, _ = splitter._body_layout(document)
+    _worker_state.update(document=document, elements=elements, splitter=splitter)
+
+
+def _build_split_document(name: str, ranges: List[Tuple[int, int]], title: str) -> Tuple[str, bytes, float]:
+    """Clona os intervalos no worker e devolve o .docx serializado e o tempo gasto"""
+    start_time = time.perf_counter()
     
-    def _copy_styles(self, source_doc: Document, target_doc: Document):
-        """Copia estilos de um documento para outro com tratamento melhorado"""
-        copied_styles = set()
-        
-        for style in source_doc.styles:
-            try:
-                if hasattr(style, 'name') and style.name not in copied_styles:
-                    # Pula estilos built-in que já existem
-                    if style.builtin:
-                        continue
-                    
-                    # Tenta adicionar o estilo
-                    try:
-                        target_style = target_doc.styles.add_style(
-                            style.name, 
-                            style.type
-                        )
-                        
-                        # Copia propriedades
-                        target_style.hidden = style.hidden
-                        target_style.quick_style = style.quick_style
-                        
-                        if hasattr(style, 'priority'):
-                            target_style.priority = style.priority
-                        
-                        # Copia formatação
-                        if hasattr(style, 'font'):
-                            if style.font.color and style.font.color.rgb:
-                                target_style.font.color.rgb = style.font.color.rgb
-                            if style.font.size:
-                                target_style.font.size = style.font.size
-                            target_style.font.bold = style.font.bold
-                            target_style.font.italic = style.font.italic
-                        
-                        copied_styles.add(style.name)
-                        
-                    except ValueError:
-                        # Estilo já existe
-                        pass
-                        
-            except Exception as e:
-                # Ignora erros individuais
-                pass
+    splitter = _worker_state['splitter']
+    document = splitter._clone_ranges_to_document(
+        _worker_state['document'], _worker_state['elements'], ranges, title
+    )
+    output = io.BytesIO()
+    document.save(output)
     
-    def _copy_paragraph_to_document(self, target_doc: Document, source_para):
-        """Copia um parágrafo mantendo toda formatação e conteúdo"""
-        # Cria novo parágrafo
-        new_para = target_doc.add_paragraph()
-        
-        # Copia o estilo
-        try:
-            if source_para.style:
-                new_para.style = source_para.style.name
-        except:
-            pass
-        
-        # Copia runs com formatação e imagens
-        for run in source_para.runs:
-            new_run = new_para.add_run(run.text)
-            
-            # Copia formatação do texto
-            if run.bold is not None:
-                new_run.bold = run.bold
-            if run.italic is not None:
-                new_run.italic = run.italic
-            if run.underline is not None:
-                new_run.underline = run.underline
-            if run.font.size:
-                new_run.font.size = run.font.size
-            if run.font.color and run.font.color.rgb:
-                new_run.font.color.rgb = run.font.color.rgb
-            
-            # Copia imagens se existirem
-            if run._element.xpath('.//w:drawing') or run._element.xpath('.//w:pict'):
-                # Copia o elemento XML da imagem diretamente
-                for child in run._element:
-                    new_run._element.append(child)
-        
-        # Copia formatação do parágrafo
-        if source_para.paragraph_format.alignment:
-            new_para.paragraph_format.alignment = source_para.paragraph_format.alignment
-        if source_para.paragraph_format.left_indent:
-            new_para.paragraph_format.left_indent = source_para.paragraph_format.left_indent
-        if source_para.paragraph_format.right_indent:
-            new_para.paragraph_format.right_indent = source_para.paragraph_format.right_indent
-        if source_para.paragraph_format.first_line_indent:
-            new_para.paragraph_format.first_line_indent = source_para.paragraph_format.first_line_indent
-        if source_para.paragraph_format.space_before:
-            new_para.paragraph_format.space_before = source_para.paragraph_format.space_before
-        if source_para.paragraph_format.space_after:
-            new_para.paragraph_format.space_after = source_para.paragraph_format.space_after
-        if source_para.paragraph_format.line_spacing:
-            new_para.paragraph_format.line_spacing = source_para.paragraph_format.line_spacing
\ No newline at end of file
+    return name, output.getvalue(), round(time.perf_counter() - start_time, 3)
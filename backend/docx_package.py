@@ -0,0 +1,379 @@
+import io
+import posixpath
+import shutil
+import struct
+import zipfile
+from typing import Callable, Iterator, Tuple
+from lxml import etree
+from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup
+from docx.opc.oxml import serialize_part_xml
+from docx.styles.styles import Styles
+
+RT_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+RT_STYLES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles'
+PKG_RELS_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+COPY_CHUNK_SIZE = 1024 * 1024
+# Bits de flag_bits: tamanhos em descritor após os dados, nome em UTF-8
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+# Bytes de document.xml entregues ao parser incremental por vez
+XML_CHUNK_SIZE = 256 * 1024
+XML_DECLARATION = b"<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n"
+W_BODY = qn('w:body')
+
+
+class DocxPackage:
+    """Pacote .docx com apenas document.xml e styles.xml carregados em memória.
+
+    Expõe ``element`` e ``styles`` como um ``Document`` do python-docx, de modo que o
+    ``StyleApplier`` trabalhe igual nos dois modos. Ao salvar, só essas duas partes são
+    reescritas; todas as outras entradas do zip (imagens em ``word/media``, temas,
+    fontes...) são copiadas byte a byte com a compressão original.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+        with zipfile.ZipFile(file_path) as zf:
+            self.document_part_name = self.find_document_part(zf)
+            self.styles_part_name = self.find_styles_part(zf, self.document_part_name)
+
+            self.element = parse_xml(zf.read(self.document_part_name))
+            self.styles = Styles(parse_xml(zf.read(self.styles_part_name)))
+
+    @staticmethod
+    def find_document_part(zf: zipfile.ZipFile) -> str:
+        """Localiza a parte principal do documento pelo _rels/.rels do pacote"""
+        rels = parse_xml(zf.read('_rels/.rels'))
+        for rel in rels.iter(f'{PKG_RELS_NS}Relationship'):
+            if rel.get('Type') == RT_OFFICE_DOCUMENT:
+                return rel.get('Target').lstrip('/')
+        raise ValueError("Arquivo .docx sem parte principal (officeDocument)")
+
+    @staticmethod
+    def find_styles_part(zf: zipfile.ZipFile, document_part: str) -> str:
+        """Localiza styles.xml pelas relações da parte principal"""
+        base_dir, filename = posixpath.split(document_part)
+        rels_name = posixpath.join(base_dir, '_rels', f'{filename}.rels')
+
+        rels = parse_xml(zf.read(rels_name))
+        for rel in rels.iter(f'{PKG_RELS_NS}Relationship'):
+            if rel.get('Type') == RT_STYLES:
+                target = rel.get('Target')
+                if target.startswith('/'):
+                    return target.lstrip('/')
+                return posixpath.normpath(posixpath.join(base_dir, target))
+        raise ValueError("Arquivo .docx sem styles.xml - use o modo 'document'")
+
+    def save(self, target):
+        """Salva o pacote em um caminho ou stream, reescrevendo só as partes alteradas"""
+        modified_parts = {
+            self.document_part_name: serialize_part_xml(self.element),
+            self.styles_part_name: serialize_part_xml(self.styles.element),
+        }
+
+        with zipfile.ZipFile(self.file_path) as src, zipfile.ZipFile(target, 'w') as dst:
+            for info in src.infolist():
+                if info.filename in modified_parts:
+                    new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    new_info.compress_type = zipfile.ZIP_DEFLATED
+                    new_info.external_attr = info.external_attr
+                    dst.writestr(new_info, modified_parts[info.filename])
+                else:
+                    _copy_entry(src, info, dst)
+
+    def as_document(self) -> Document:
+        """Reabre o pacote (já com as alterações) como Document do python-docx"""
+        stream = io.BytesIO()
+        self.save(stream)
+        stream.seek(0)
+        return Document(stream)
+
+
+class BodyStream:
+    """Leitura e reescrita de document.xml elemento a elemento, sem carregar o corpo inteiro.
+
+    O XML é lido em blocos por um parser incremental (com as classes do python-docx,
+    então os elementos são CT_P, CT_Tbl...). Cada filho direto de <w:body> é entregue
+    quando termina e descartado quando o próximo é pedido, de modo que a memória fica
+    limitada ao maior elemento, não ao documento.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        with zipfile.ZipFile(file_path) as zf:
+            self.document_part_name = DocxPackage.find_document_part(zf)
+            self.styles_part_name = DocxPackage.find_styles_part(zf, self.document_part_name)
+            self.xml_size = zf.getinfo(self.document_part_name).file_size
+        # Bytes (descomprimidos) de document.xml já lidos: progresso da leitura
+        self.bytes_read = 0
+
+    def read_styles(self) -> Styles:
+        with zipfile.ZipFile(self.file_path) as zf:
+            return Styles(parse_xml(zf.read(self.styles_part_name)))
+
+    def read_part(self, part_name: str):
+        """Outra parte do pacote (pequena) já interpretada, ou None se não existir"""
+        with zipfile.ZipFile(self.file_path) as zf:
+            if part_name not in zf.NameToInfo:
+                return None
+            return parse_xml(zf.read(part_name))
+
+    def iter_elements(self) -> Iterator:
+        """Filhos diretos de <w:body> (parágrafos, tabelas e o sectPr final), em ordem"""
+        for event, element in self._parse():
+            if event == 'child':
+                yield element
+
+    def rewrite(self, target: str, transform: Callable, styles_element=None):
+        """Grava uma cópia do pacote passando cada filho do corpo por ``transform``.
+
+        ``transform(elemento)`` pode alterar o elemento; retornando False ele não é
+        gravado. Com ``styles_element``, styles.xml é substituído. As demais entradas
+        do zip são copiadas em blocos, sem passar pelo python-docx.
+        """
+        with zipfile.ZipFile(self.file_path) as src, zipfile.ZipFile(target, 'w') as dst:
+            for info in src.infolist():
+                if info.filename == self.document_part_name:
+                    new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    new_info.compress_type = zipfile.ZIP_DEFLATED
+                    new_info.external_attr = info.external_attr
+                    with dst.open(new_info, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT // 2) as out:
+                        self._write_document(out, transform)
+                elif info.filename == self.styles_part_name and styles_element is not None:
+                    new_info = zipfile.ZipInfo(info.filename, date_time=info.date_time)
+                    new_info.compress_type = zipfile.ZIP_DEFLATED
+                    new_info.external_attr = info.external_attr
+                    dst.writestr(new_info, serialize_part_xml(styles_element))
+                else:
+                    _copy_entry(src, info, dst)
+
+    def _write_document(self, out, transform: Callable):
+        out.write(XML_DECLARATION)
+        # Declarações de namespace da raiz, que lxml repetiria em cada elemento serializado
+        inherited = ()
+        for event, element in self._parse():
+            if event == 'root':
+                inherited = [_xmlns_declaration(prefix, uri) for prefix, uri in element.nsmap.items()]
+                out.write(_start_tag(element, ()))
+            elif event == 'body':
+                out.write(_start_tag(element, inherited))
+            elif event == 'child':
+                if transform(element) is not False:
+                    out.write(_serialize(element, inherited))
+            elif event == 'other':
+                out.write(_serialize(element, inherited))
+            else:
+                out.write(_end_tag(element))
+
+    def _parse(self) -> Iterator[Tuple[str, object]]:
+        """Eventos da leitura incremental de document.xml.
+
+        ('root', e) e ('body', e) no início de <w:document> e <w:body>; ('child', e) ao
+        fim de cada filho direto do corpo; ('other', e) ao fim de um filho da raiz fora
+        do corpo (ex.: <w:background>); ('end', e) ao fim do corpo e da raiz.
+        """
+        parser = etree.XMLPullParser(events=('start', 'end'), huge_tree=True)
+        parser.set_element_class_lookup(element_class_lookup)
+        self.bytes_read = 0
+        depth = 0
+        body = None
+
+        with zipfile.ZipFile(self.file_path) as zf, zf.open(self.document_part_name) as xml:
+            while True:
+                chunk = xml.read(XML_CHUNK_SIZE)
+                if chunk:
+                    parser.feed(chunk)
+                    self.bytes_read += len(chunk)
+                else:
+                    parser.close()
+
+                for event, element in parser.read_events():
+                    if event == 'start':
+                        if depth == 0:
+                            yield 'root', element
+                        elif depth == 1 and element.tag == W_BODY and body is None:
+                            body = element
+                            yield 'body', element
+                        depth += 1
+                        continue
+
+                    depth -= 1
+                    if depth == 2 and body is not None and element.getparent() is body:
+                        yield 'child', element
+                        # Libera o elemento e os irmãos anteriores já entregues
+                        element.clear()
+                        while element.getprevious() is not None:
+                            del body[0]
+                    elif depth == 1:
+                        if element is body:
+                            yield 'end', element
+                        else:
+                            yield 'other', element
+                            element.clear()
+                    elif depth == 0:
+                        yield 'end', element
+
+                if not chunk:
+                    break
+
+
+class DocxFile:
+    """Documento .docx já gravado em disco (ex.: saída do modo em janelas).
+
+    Tem o mesmo ``save`` de um Document; o FileManager copia o arquivo para o ZIP
+    sem carregá-lo em memória.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def save(self, target):
+        if isinstance(target, str):
+            shutil.copyfile(self.path, target)
+        else:
+            with open(self.path, 'rb') as f:
+                shutil.copyfileobj(f, target, COPY_CHUNK_SIZE)
+
+
+class SerializedDocument:
+    """Documento .docx já serializado (ex.: gerado em outro processo).
+
+    Tem o mesmo ``save`` de um Document, para ser gravado pelo FileManager.
+    """
+
+    def __init__(self, blob: bytes):
+        self.blob = blob
+
+    @classmethod
+    def from_document(cls, document) -> 'SerializedDocument':
+        output = io.BytesIO()
+        document.save(output)
+        return cls(output.getvalue())
+
+    def save(self, target):
+        if isinstance(target, str):
+            with open(target, 'wb') as f:
+                f.write(self.blob)
+        else:
+            target.write(self.blob)
+
+
+def validate_docx_upload(file_path: str, max_uncompressed: int = None):
+    """Confere o diretório central do zip antes de enfileirar o processamento.
+
+    Lê apenas o diretório central (sem descomprimir nada) e rejeita arquivos que não
+    são zip, que não têm as partes de um .docx ou cujo conteúdo descomprimido
+    passaria de ``max_uncompressed`` (proteção contra zip bombs).
+    """
+    try:
+        with zipfile.ZipFile(file_path) as zf:
+            infos = zf.infolist()
+    except (zipfile.BadZipFile, OSError) as e:
+        raise ValueError(f"Arquivo .docx inválido ou corrompido: {e}")
+
+    names = {info.filename for info in infos}
+    if '[Content_Types].xml' not in names or '_rels/.rels' not in names:
+        raise ValueError("Arquivo .docx inválido: pacote sem [Content_Types].xml ou _rels/.rels")
+
+    total = sum(info.file_size for info in infos)
+    if max_uncompressed and total > max_uncompressed:
+        raise ValueError(
+            f"Arquivo .docx grande demais descomprimido ({total / 1024 / 1024:.0f} MB)"
+        )
+
+
+def _xmlns_declaration(prefix: str, uri: str) -> bytes:
+    name = f'xmlns:{prefix}' if prefix else 'xmlns'
+    return f' {name}="{uri}"'.encode('utf-8')
+
+
+def _strip_declarations(xml: bytes, declarations) -> bytes:
+    """Remove da tag de abertura as declarações de namespace já feitas na raiz"""
+    end = xml.index(b'>')
+    head = xml[:end]
+    for declaration in declarations:
+        head = head.replace(declaration, b'', 1)
+    return head + xml[end:]
+
+
+def _serialize(element, inherited) -> bytes:
+    return _strip_declarations(
+        etree.tostring(element, encoding='UTF-8', xml_declaration=False, with_tail=False), inherited
+    )
+
+
+def _start_tag(element, inherited) -> bytes:
+    """Tag de abertura de um elemento (nome, namespaces e atributos), sem os filhos"""
+    shallow = etree.Element(element.tag, attrib=dict(element.attrib), nsmap=element.nsmap)
+    xml = _serialize(shallow, inherited)
+    return xml[:-2] + b'>'
+
+
+def _end_tag(element) -> bytes:
+    name = etree.QName(element).localname
+    if element.prefix:
+        name = f'{element.prefix}:{name}'
+    return f'</{name}>'.encode('utf-8')
+
+
+def _copy_entry(src: zipfile.ZipFile, info: zipfile.ZipInfo, dst: zipfile.ZipFile, arcname: str = None):
+    """Copia uma entrada de zip para outro (opcionalmente renomeada) sem recomprimir.
+
+    Os bytes comprimidos são lidos logo após o cabeçalho local da entrada
+    (``header_offset``, ``compress_size``) e gravados em blocos sob um cabeçalho
+    novo com o CRC e os tamanhos originais, como faz o ``writestr`` do zipfile.
+    """
+    if dst._writing:
+        raise ValueError("Não é possível copiar uma entrada com outra ainda aberta para escrita")
+
+    new_info = zipfile.ZipInfo(arcname if arcname is not None else info.filename, date_time=info.date_time)
+    new_info.compress_type = info.compress_type
+    new_info.external_attr = info.external_attr
+    new_info.comment = info.comment
+    new_info.create_system = info.create_system
+    # Sem descritor de dados (os tamanhos já vão no cabeçalho); UTF-8 é recalculado pelo nome
+    new_info.flag_bits = info.flag_bits & ~(_FLAG_DATA_DESCRIPTOR | _FLAG_UTF8)
+    new_info.CRC = info.CRC
+    new_info.compress_size = info.compress_size
+    new_info.file_size = info.file_size
+    zip64 = max(info.file_size, info.compress_size) > zipfile.ZIP64_LIMIT
+
+    with src._lock, dst._lock:
+        src.fp.seek(info.header_offset)
+        header = struct.unpack(zipfile.structFileHeader, src.fp.read(zipfile.sizeFileHeader))
+        if header[zipfile._FH_SIGNATURE] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Cabeçalho local inválido em {info.filename}")
+        data_offset = (info.header_offset + zipfile.sizeFileHeader
+                       + header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH])
+
+        if dst._seekable:
+            dst.fp.seek(dst.start_dir)
+        new_info.header_offset = dst.fp.tell()
+        dst._writecheck(new_info)
+        dst._didModify = True
+        dst.fp.write(new_info.FileHeader(zip64))
+
+        src.fp.seek(data_offset)
+        remaining = info.compress_size
+        while remaining:
+            chunk = src.fp.read(min(COPY_CHUNK_SIZE, remaining))
+            if not chunk:
+                raise zipfile.BadZipFile(f"Entrada truncada: {info.filename}")
+            dst.fp.write(chunk)
+            remaining -= len(chunk)
+
+        dst.filelist.append(new_info)
+        dst.NameToInfo[new_info.filename] = new_info
+        dst.start_dir = dst.fp.tell()
+
+
+def copy_zip_entries(src_path: str, dst: zipfile.ZipFile, prefix: str = ''):
+    """Copia todas as entradas de um zip para outro sob ``prefix``, em blocos"""
+    with zipfile.ZipFile(src_path) as src:
+        for info in src.infolist():
+            _copy_entry(src, info, dst, prefix + info.filename)
@@ -1,15 +1,63 @@
 import os
 import shutil
+import time
+import zipfile
 from datetime import datetime
-from typing import Dict, List
+from typing import Callable, Dict, List, Tuple
 from docx import Document
 from backend.config import Config
+from backend.workspace import JobWorkspace
+from backend.docx_package import copy_zip_entries
+from backend.metrics import BYTES_PROCESSED
+
+
+class _CountingWriter:
+    """Stream de escrita que conta os bytes gravados e cobra a cota a cada bloco.
+
+    Com ``mirror``, os mesmos bytes também vão para um segundo arquivo (a árvore de pastas).
+    Depois de uma falha, gravações seguintes são descartadas: o zip interno do documento,
+    abandonado no meio, ainda tenta gravar o diretório central quando é coletado.
+    """
+    
+    def __init__(self, target, charge: Callable[[int], None], mirror=None):
+        self.target = target
+        self.charge = charge
+        self.mirror = mirror
+        self.size = 0
+        self.failed = False
+    
+    def write(self, data) -> int:
+        nbytes = len(data)
+        if self.failed:
+            return nbytes
+        try:
+            # Cobrada antes de gravar: a cota falha sem escrever o bloco
+            self.charge(nbytes * 2 if self.mirror else nbytes)
+            self.target.write(data)
+        except Exception:
+            self.failed = True
+            raise
+        if self.mirror:
+            self.mirror.write(data)
+        self.size += nbytes
+        return nbytes
+    
+    def flush(self):
+        if self.failed:
+            return
+        self.target.flush()
+        if self.mirror:
+            self.mirror.flush()
+
 
 class FileManager:
-    def __init__(self, book_name: str):
+    def __init__(self, book_name: str, workspace: JobWorkspace = None):
         self.book_name = self._sanitize_filename(book_name)
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         self.output_dir = None
+        # Com workspace, a saída vai para a pasta do job e conta na cota de disco
+        self.workspace = workspace
+        self.output_root = workspace.output_dir if workspace else Config.OUTPUT_DIR
         
     def _sanitize_filename(self, filename: str) -> str:
         """Remove caracteres inválidos do nome do arquivo"""
@@ -22,7 +70,7 @@ class FileManager:
         """Cria estrutura de pastas para os arquivos de saída"""
         # Cria pasta principal com nome do livro e timestamp
         folder_name = f"{self.book_name}_{self.timestamp}"
-        self.output_dir = os.path.join(Config.OUTPUT_DIR, folder_name)
+        self.output_dir = os.path.join(self.output_root, folder_name)
         
         # Cria diretórios
         os.makedirs(self.output_dir, exist_ok=True)
@@ -40,14 +88,7 @@ class FileManager:
         
         for doc_name, document in documents.items():
             # Determina o subdiretório apropriado
-            if 'completo' in doc_name:
-                subdir = 'completo'
-            elif 'questoes' in doc_name:
-                subdir = 'questoes'
-            elif 'gabarito' in doc_name:
-                subdir = 'gabaritos'
-            else:
-                subdir = ''
+            subdir = self._get_subdir(doc_name)
             
             # Cria caminho completo
             filename = f"{self.book_name}_{doc_name}.docx"
@@ -55,21 +96,161 @@ class FileManager:
             
             # Salva documento
             document.save(file_path)
+            size = os.path.getsize(file_path)
+            self._charge(size)
             
             # Adiciona informações do arquivo salvo
             saved_files.append({
                 'name': filename,
                 'path': file_path,
-                'size': self._get_file_size(file_path),
+                'size': self._format_size(size),
                 'type': subdir or 'other'
             })
         
         return saved_files
     
+    def write_zip_archive(self, documents: Dict[str, Document], keep_tree: bool = False,
+                          attachments: Dict[str, str] = None) -> Tuple[List[Dict], str]:
+        """Serializa os documentos direto no ZIP final, sem reler arquivos do disco.
+        
+        Cada documento é salvo uma única vez, em streaming, direto na entrada do ZIP;
+        o tamanho e a cota são contados à medida que os bytes são gravados.
+        Documentos já gravados em disco (DocxFile) são copiados do arquivo. Com
+        keep_tree=True, os mesmos bytes também são gravados na árvore de pastas
+        (necessária para o download individual de arquivos). ``attachments`` (sufixo ->
+        caminho) entram na raiz como ``<livro><sufixo>`` (ex.: o arquivo de marcações).
+        """
+        folder_name = f"{self.book_name}_{self.timestamp}"
+        zip_path = os.path.join(self.output_root, f"{folder_name}.zip")
+        tmp_path = f"{zip_path}.tmp"
+        saved_files = []
+        
+        if keep_tree:
+            self.create_output_structure()
+        
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as zf:
+                # Mesmas pastas que o make_archive geraria, mesmo se vazias
+                for subdir in ['completo', 'questoes', 'gabaritos']:
+                    zf.writestr(f"{subdir}/", b'')
+                
+                for doc_name, document in documents.items():
+                    subdir = self._get_subdir(doc_name)
+                    filename = f"{self.book_name}_{doc_name}.docx"
+                    arcname = f"{subdir}/{filename}" if subdir else filename
+                    
+                    file_path = os.path.join(self.output_dir, subdir, filename) if keep_tree else None
+                    
+                    # Documento já gravado em disco (modo em janelas): copiado sem passar pela memória
+                    source_path = getattr(document, 'path', None)
+                    if source_path:
+                        size = os.path.getsize(source_path)
+                        self._charge(size * 2 if keep_tree else size)
+                        # .docx já é um zip comprimido: armazenar sem recomprimir
+                        zf.write(source_path, arcname, compress_type=zipfile.ZIP_STORED)
+                        if keep_tree:
+                            shutil.copyfile(source_path, file_path)
+                    else:
+                        size = self._stream_document(zf, arcname, document, file_path)
+                    BYTES_PROCESSED.inc(size, direction='out')
+                    
+                    if keep_tree:
+                        # Caminho relativo a OUTPUT_DIR, como esperado por /api/download
+                        file_path = os.path.relpath(file_path, Config.OUTPUT_DIR)
+                    
+                    saved_files.append({
+                        'name': filename,
+                        'path': file_path,
+                        'size': self._format_size(size),
+                        'type': subdir or 'other'
+                    })
+                
+                for suffix, source_path in (attachments or {}).items():
+                    filename = f"{self.book_name}{suffix}"
+                    size = os.path.getsize(source_path)
+                    self._charge(size)
+                    zf.write(source_path, filename, compress_type=zipfile.ZIP_DEFLATED)
+                    
+                    file_path = None
+                    if keep_tree:
+                        self._charge(size)
+                        file_path = os.path.join(self.output_dir, filename)
+                        shutil.copyfile(source_path, file_path)
+                        file_path = os.path.relpath(file_path, Config.OUTPUT_DIR)
+                    
+                    saved_files.append({
+                        'name': filename,
+                        'path': file_path,
+                        'size': self._format_size(size),
+                        'type': 'other'
+                    })
+            
+            os.replace(tmp_path, zip_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        return saved_files, zip_path
+    
+    def write_combined_zip(self, archives: List[Tuple[str, str]]) -> str:
+        """Junta ZIPs já gerados em um só, cada um sob sua pasta (entradas copiadas em blocos).
+        
+        ``archives`` é uma lista de (pasta no zip combinado, caminho do zip de origem).
+        """
+        zip_path = os.path.join(self.output_root, f"{self.book_name}_{self.timestamp}.zip")
+        tmp_path = f"{zip_path}.tmp"
+        
+        try:
+            with zipfile.ZipFile(tmp_path, 'w') as zf:
+                for folder, source_zip in archives:
+                    self._charge(os.path.getsize(source_zip))
+                    copy_zip_entries(source_zip, zf, f"{folder}/")
+            os.replace(tmp_path, zip_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        return zip_path
+    
+    def _charge(self, nbytes: int):
+        if self.workspace:
+            self.workspace.charge(nbytes)
+    
+    def _get_subdir(self, doc_name: str) -> str:
+        """Subpasta de saída a partir do nome do documento"""
+        if 'completo' in doc_name:
+            return 'completo'
+        elif 'questoes' in doc_name:
+            return 'questoes'
+        elif 'gabarito' in doc_name:
+            return 'gabaritos'
+        return ''
+    
+    def _stream_document(self, zf: zipfile.ZipFile, arcname: str, document, mirror_path: str = None) -> int:
+        """Salva o documento direto em uma entrada do ZIP (e em mirror_path); retorna o tamanho"""
+        info = zipfile.ZipInfo(arcname, date_time=time.localtime(time.time())[:6])
+        # .docx já é um zip comprimido: armazenar sem recomprimir
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o600 << 16
+        
+        with zf.open(info, 'w') as entry:
+            if mirror_path:
+                with open(mirror_path, 'wb') as mirror:
+                    writer = _CountingWriter(entry, self._charge, mirror)
+                    document.save(writer)
+            else:
+                writer = _CountingWriter(entry, self._charge)
+                document.save(writer)
+        return writer.size
+    
     def _get_file_size(self, file_path: str) -> str:
         """Retorna o tamanho do arquivo formatado"""
-        size = os.path.getsize(file_path)
-        
+        return self._format_size(os.path.getsize(file_path))
+    
+    def _format_size(self, size: float) -> str:
+        """Formata um tamanho em bytes"""
         for unit in ['B', 'KB', 'MB', 'GB']:
             if size < 1024.0:
                 return f"{size:.1f} {unit}"
@@ -79,16 +260,16 @@ class FileManager:
     
     def create_zip_archive(self) -> str:
         """Cria arquivo ZIP com todos os documentos"""
-        zip_path = os.path.join(Config.OUTPUT_DIR, f"{self.book_name}_{self.timestamp}")
+        zip_path = os.path.join(self.output_root, f"{self.book_name}_{self.timestamp}")
         shutil.make_archive(zip_path, 'zip', self.output_dir)
         
         return f"{zip_path}.zip"
     
     def cleanup_temp_files(self):
-        """Remove arquivos temporários"""
-        if os.path.exists(Config.TEMP_DIR):
-            shutil.rmtree(Config.TEMP_DIR)
-            os.makedirs(Config.TEMP_DIR, exist_ok=True)
+        """Remove arquivos temporários do job (nunca os de outros jobs)"""
+        if self.workspace and os.path.exists(self.workspace.temp_dir):
+            shutil.rmtree(self.workspace.temp_dir)
+            os.makedirs(self.workspace.temp_dir, exist_ok=True)
     
     def get_output_summary(self, saved_files: List[Dict]) -> Dict:
         """Retorna resumo dos arquivos gerados"""
@@ -0,0 +1,244 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List
+from backend.config import Config
+from backend.main import ProgressMonitor, WordStylerProcessor
+from backend.ai_processor import SharedAIResources
+from backend.result_cache import result_cache, RESULT_COMPUTED
+from backend.retention import output_retention
+from backend.tracing import PipelineTracer
+from backend.metrics import JOBS_FINISHED, JOBS_IN_FLIGHT
+from backend.scheduler import ANONYMOUS_TENANT, FairScheduler
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+
+# Threads à espera de vaga quando a fila não tem limite (acima disso, ordem de chegada)
+UNBOUNDED_QUEUE_THREADS = 64
+
+
+class JobQueueFull(Exception):
+    """Fila de jobs no limite configurado"""
+
+
+class Job:
+    """Estado de um job assíncrono e histórico dos eventos de progresso"""
+
+    def __init__(self, job_id: str, tenant: str = ANONYMOUS_TENANT):
+        self.job_id = job_id
+        self.tenant = tenant
+        self.status = JOB_QUEUED
+        self.stage = 'queued'
+        self.progress = 0
+        self.details = ''
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.events: List[Dict] = []
+        self._changed = threading.Condition()
+
+    def snapshot(self) -> Dict:
+        with self._changed:
+            return {
+                'job_id': self.job_id,
+                'tenant': self.tenant,
+                'status': self.status,
+                'stage': self.stage,
+                'progress': self.progress,
+                'details': self.details,
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+            }
+
+    def publish(self, **changes):
+        """Atualiza o estado e registra um evento para os assinantes (SSE)"""
+        with self._changed:
+            for name, value in changes.items():
+                setattr(self, name, value)
+            self.events.append({
+                'status': self.status,
+                'stage': self.stage,
+                'progress': self.progress,
+                'details': self.details,
+            })
+            self._changed.notify_all()
+
+    def iter_events(self, start: int = 0, timeout: float = 15) -> Iterator[Dict]:
+        """Gera os eventos a partir de ``start``; ``None`` sinaliza inatividade (keep-alive)"""
+        position = start
+        while True:
+            with self._changed:
+                if position >= len(self.events) and self.status not in FINISHED_STATES:
+                    self._changed.wait(timeout)
+                pending = self.events[position:]
+                finished = self.status in FINISHED_STATES
+
+            if not pending:
+                if finished:
+                    return
+                yield None
+                continue
+
+            for event in pending:
+                yield event
+            position += len(pending)
+
+
+class JobManager:
+    """Executa jobs em um pool limitado de threads, fora da thread da requisição.
+
+    Cada job recebe um ProgressMonitor ligado ao próprio estado, de modo que as
+    etapas do pipeline e os lotes da IA aparecem em ``/api/jobs/<id>`` e no stream
+    de eventos. Jobs terminados ficam em memória por ``JOB_TTL`` segundos.
+
+    A ordem de execução não é a de chegada: cada job espera sua vaga em uma fila
+    justa (``FairScheduler``) entre chaves de API, com no máximo ``JOB_TENANT_LIMIT``
+    jobs por chave, prioridade para jobs pequenos e peso menor para lotes.
+    """
+
+    def __init__(self, workers: int = None, queue_limit: int = None):
+        self.workers = workers or Config.JOB_WORKERS
+        self.queue_limit = Config.JOB_QUEUE_LIMIT if queue_limit is None else queue_limit
+        self.scheduler = FairScheduler('jobs', self.workers, Config.JOB_TENANT_LIMIT)
+        # Uma thread por job pendente: as que ainda não têm vaga ficam paradas no escalonador
+        threads = max(self.queue_limit, self.workers) if self.queue_limit else self.workers + UNBOUNDED_QUEUE_THREADS
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str, run_fn: Callable[[ProgressMonitor], Dict], tenant: str = ANONYMOUS_TENANT,
+               cost: float = 1.0, weight: float = 1.0) -> Job:
+        """Enfileira ``run_fn(progress)``; o dicionário retornado vira o resultado do job.
+
+        ``tenant``, ``cost`` e ``weight`` definem a posição do job na fila justa
+        (ver ``backend.scheduler``).
+        """
+        with self._lock:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if job.status not in FINISHED_STATES)
+            if self.queue_limit and pending >= self.queue_limit:
+                raise JobQueueFull(f"Fila cheia ({pending} jobs pendentes). Tente novamente em instantes.")
+
+            job = Job(job_id, tenant)
+            self._jobs[job_id] = job
+
+        job.publish(details='Aguardando na fila')
+        JOBS_IN_FLIGHT.inc(state=JOB_QUEUED)
+        self._executor.submit(self._run, job, run_fn, cost, weight)
+        return job
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, run_fn: Callable[[ProgressMonitor], Dict], cost: float, weight: float):
+        with self.scheduler.slot(job.tenant, cost, weight):
+            JOBS_IN_FLIGHT.dec(state=JOB_QUEUED)
+            JOBS_IN_FLIGHT.inc(state=JOB_RUNNING)
+            try:
+                self._execute(job, run_fn)
+            finally:
+                JOBS_IN_FLIGHT.dec(state=JOB_RUNNING)
+                JOBS_FINISHED.inc(status=job.status)
+
+    def _execute(self, job: Job, run_fn: Callable[[ProgressMonitor], Dict]):
+        job.publish(status=JOB_RUNNING, started_at=time.time(), stage='starting', details='Iniciando')
+
+        progress = ProgressMonitor(
+            callback=lambda update: job.publish(
+                stage=update['step'], progress=update['progress'], details=update['details']
+            )
+        )
+
+        try:
+            result = run_fn(progress)
+        except Exception as e:
+            traceback.print_exc()
+            job.publish(status=JOB_FAILED, error=str(e), finished_at=time.time(), stage='failed', details=str(e))
+            return
+
+        if result.get('success'):
+            job.publish(status=JOB_DONE, result=result, finished_at=time.time(),
+                        stage='done', progress=100, details='Processamento concluído!')
+        else:
+            job.publish(status=JOB_FAILED, result=result, error=result.get('error'),
+                        finished_at=time.time(), stage='failed', details=result.get('error', ''))
+
+    def _prune(self):
+        """Esquece jobs terminados há mais de JOB_TTL segundos"""
+        cutoff = time.time() - Config.JOB_TTL
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.status in FINISHED_STATES and job.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+def execute_job(job: Dict, progress: ProgressMonitor = None, shared_ai: SharedAIResources = None) -> Dict:
+    """Roda o pipeline de um job preparado e limpa seu workspace.
+
+    ``job`` traz file_path, book_name, api_key, styles, removal_prompts e workspace
+    (e, opcionalmente, ``profile``, ``project``, ``markup_path`` e ``force``). Usado pelo
+    servidor (/api/process, /api/jobs, /api/batch) e pela CLI.
+    """
+    workspace = job['workspace']
+    profile = job.get('profile', False)
+
+    def run_pipeline():
+        processor = WordStylerProcessor()
+        result = processor.process_document(
+            job['file_path'], job['book_name'], job['api_key'], job['styles'], job['removal_prompts'],
+            workspace=workspace, progress=progress, shared_ai=shared_ai,
+            tracer=PipelineTracer(memory=Config.TRACE_MEMORY, profile=profile),
+            project=job.get('project'), markup=job.get('markup_path')
+        )
+        if result.get('success'):
+            output_retention.register(workspace.job_id, workspace.output_dir)
+        return result
+
+    try:
+        # Processa documento (ou reaproveita o resultado de um envio idêntico);
+        # com profiling o pipeline sempre roda, senão não haveria o que medir.
+        # Reaplicar marcações já é rápido e depende do arquivo enviado: fora do cache
+        use_cache = Config.RESULT_CACHE and not profile and not job.get('markup_path')
+        cache_key = None
+        if use_cache:
+            cache_key = result_cache.make_key(
+                workspace.upload_sha256, job['book_name'], job['styles'], job['removal_prompts'],
+                job['api_key'], job.get('project')
+            )
+
+        if use_cache and not job.get('force'):
+            result, origin = result_cache.get_or_run(cache_key, run_pipeline)
+        else:
+            result, origin = run_pipeline(), RESULT_COMPUTED
+            # Com ``force`` o pipeline roda de novo e o resultado novo substitui o do cache
+            if use_cache and result.get('success'):
+                result_cache.put(cache_key, result)
+    except Exception:
+        # Remove tudo do job em caso de erro
+        workspace.cleanup(keep_output=False)
+        raise
+
+    # Remove upload e temporários (a saída só é mantida se este job a gerou com sucesso)
+    workspace.cleanup(keep_output=origin == RESULT_COMPUTED and result.get('success', False))
+
+    if origin != RESULT_COMPUTED:
+        output_retention.touch(result['zip_file'])
+        result = dict(result, cache=origin)
+
+    return result
+
+
+# Gerenciador compartilhado pelo servidor
+job_manager = JobManager()
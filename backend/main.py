@@ -1,32 +1,81 @@
 import os
 import time
+import uuid
+import zipfile
 from typing import Dict, List
 from backend.config import Config
 from backend.document_reader import DocumentReader
-from backend.ai_processor import AIProcessor
+from backend.ai_processor import AIProcessor, BATCH_SIZE, SharedAIResources
 from backend.style_applier import StyleApplier
 from backend.document_splitter import DocumentSplitter
 from backend.file_manager import FileManager
+from backend.docx_package import DocxFile, DocxPackage
+from backend.workspace import JobWorkspace
+from backend.tracing import PipelineTracer
+from backend.preview import estimate_full_run, select_preview_sample, summarize_coverage
+from backend.revisions import revision_store
+from backend.markup import MARKUP_SUFFIX, MarkupReader, MarkupWriter
+from backend.windowed import MarkerSpool, WindowedReader
+from backend.metrics import BYTES_PROCESSED, PIPELINE_FAILURES, PIPELINE_SECONDS, STAGE_SECONDS
+
+# Faixa da barra de progresso ocupada pela etapa de IA (a mais demorada)
+AI_PROGRESS_START = 5
+AI_PROGRESS_END = 60
+# Elementos do fim de uma janela repetidos no início da seguinte (só como contexto para a IA)
+WINDOW_CONTEXT = 5
 
 class WordStylerProcessor:
     def __init__(self):
         Config.create_directories()
         
     def process_document(self, file_path: str, book_name: str, api_key: str, 
-                        styles: List[Dict], removal_prompts: List[Dict]) -> Dict:
-        """Processa documento completo com fluxo otimizado"""
+                        styles: List[Dict], removal_prompts: List[Dict],
+                        workspace: JobWorkspace = None, progress: 'ProgressMonitor' = None,
+                        shared_ai: SharedAIResources = None, tracer: PipelineTracer = None,
+                        project: str = None, markup: str = None) -> Dict:
+        """Processa documento completo com fluxo otimizado.
+        
+        Com ``workspace``, a saída e os temporários ficam nas pastas do job.
+        Com ``progress``, cada etapa (e cada lote da IA) é reportada ao monitor.
+        Com ``shared_ai``, a IA reaproveita sessão, prompts e classificações do lote.
+        Os tempos de cada etapa vão para ``details['trace']``; um ``tracer`` com
+        ``profile`` grava também o cProfile do job ao lado do ZIP.
+        Com ``project`` (e INCREMENTAL_REVISIONS), a classificação fica guardada como
+        revisão do projeto e uma nova revisão só manda à IA o que mudou.
+        As marcações vão para ``<livro>.markup.jsonl`` junto da saída; com ``markup``
+        (esse arquivo, de um job anterior) elas são reaplicadas sem chamar a IA, com os
+        estilos e o layout de saída atuais (``styles`` vazio usa os do arquivo).
+        """
+        if self._use_windowed(file_path):
+            return self.process_windowed(file_path, book_name, api_key, styles, removal_prompts,
+                                         workspace=workspace, progress=progress, shared_ai=shared_ai, tracer=tracer,
+                                         markup=markup)
+        
         start_time = time.time()
+        progress = progress or ProgressMonitor()
+        tracer = tracer or PipelineTracer(memory=Config.TRACE_MEMORY)
+        progress.tracer = tracer
+        markup_writer = None
         
         try:
+            BYTES_PROCESSED.inc(os.path.getsize(file_path), direction='in')
+            markup_reader = MarkupReader(markup) if markup else None
+            if markup_reader:
+                styles, removal_prompts = self._markup_config(markup_reader, styles, removal_prompts)
+            
             print("\n" + "="*60)
             print("INICIANDO PROCESSAMENTO DO DOCUMENTO")
             print("="*60)
             
             # 1. Lê o documento
             print("\n[1/7] Lendo documento...")
-            reader = DocumentReader(file_path)
-            paragraphs = reader.read_paragraphs()
-            doc_info = reader.get_document_info()
+            progress.update('reading', 2, 'Lendo documento')
+            with tracer.span('open_reader'):
+                reader = DocumentReader(file_path)
+            with tracer.span('read_paragraphs'):
+                paragraphs = reader.read_paragraphs()
+            with tracer.span('document_info'):
+                doc_info = reader.get_document_info()
             
             print(f"✓ Documento lido com sucesso:")
             print(f"  - Total de elementos: {len(paragraphs)}")
@@ -34,13 +83,48 @@ class WordStylerProcessor:
             print(f"  - Imagens: {doc_info['total_images']}")
             print(f"  - Tabelas: {doc_info['total_tables']}")
             
-            # 2. Processa com IA (com contexto melhorado)
-            print("\n[2/7] Processando com IA...")
-            ai_processor = AIProcessor(api_key)
-            ai_results = ai_processor.process_document(paragraphs, styles, removal_prompts)
+            # 2. Processa com IA (com contexto melhorado), ou reaplica as marcações de um job anterior
+            if markup_reader:
+                print("\n[2/7] Aplicando marcações salvas (sem IA)...")
+                progress.update('ai_processing', AI_PROGRESS_START, 'Aplicando marcações salvas')
+                with tracer.span('apply_markup'):
+                    markup_reader.assign(paragraphs)
+                    markup_reader.finish(doc_info['total_paragraphs'])
+                ai_results = {'marked_content': paragraphs, 'stats': self._markup_stats(paragraphs, markup_reader)}
+                print(f"✓ Marcações aplicadas ({markup_reader.applied} parágrafos, nenhuma chamada à IA):")
+            else:
+                print("\n[2/7] Processando com IA...")
+                progress.update('ai_processing', AI_PROGRESS_START, 'Processando com IA')
+                plan = None
+                if project and Config.INCREMENTAL_REVISIONS:
+                    plan = revision_store.plan(project, styles, removal_prompts, paragraphs)
+                    if plan:
+                        print(f"  - Revisão anterior de '{project}' ({plan['revision']}): "
+                              f"{len(plan['changed'])} elementos alterados")
+                
+                sections = None
+                if Config.SECTION_AWARE_BATCHING and not plan:
+                    sections = DocumentSplitter().find_sections(paragraphs)
+                    print(f"  - Seções detectadas: {len(sections)}")
+                    for section in sections:
+                        print(f"    • {section['title'][:50]} ({section['end'] - section['start']} elementos)")
+                
+                ai_processor = AIProcessor(api_key, shared=shared_ai)
+                on_ai_progress = lambda done, total: progress.update(
+                    'ai_processing',
+                    AI_PROGRESS_START + (AI_PROGRESS_END - AI_PROGRESS_START) * done // max(total, 1),
+                    f'{done}/{total} parágrafos'
+                )
+                if plan:
+                    ai_results = ai_processor.process_revision(paragraphs, plan, styles, removal_prompts,
+                                                               on_progress=on_ai_progress)
+                else:
+                    ai_results = ai_processor.process_document(paragraphs, styles, removal_prompts,
+                                                               sections=sections, on_progress=on_ai_progress)
+                for name, seconds in ai_results['stats'].get('timings', {}).items():
+                    tracer.record(name, seconds)
+                print(f"✓ Processamento com IA concluído:")
             marked_content = ai_results['marked_content']
-            
-            print(f"✓ Processamento com IA concluído:")
             print(f"  - Elementos marcados: {ai_results['stats']['marked']}")
             print(f"  - Elementos sem marcação: {ai_results['stats'].get('unmarked', 0)}")  # CORRIGIDO: usa .get() com valor padrão
             print(f"  - Taxa de marcação: {(ai_results['stats']['marked']/ai_results['stats']['total_paragraphs']*100):.1f}%")
@@ -49,45 +133,85 @@ class WordStylerProcessor:
             if ai_results['stats']['marked'] == 0:
                 raise Exception("ERRO CRÍTICO: Nenhum elemento foi marcado pela IA!")
             
+            # Lotes que falharam ficariam sem marcação também nas próximas revisões
+            if (project and Config.INCREMENTAL_REVISIONS and not markup_reader
+                    and not ai_results['stats']['failed_batches']):
+                revision = revision_store.save(project, styles, removal_prompts, marked_content)
+                if revision:
+                    print(f"✓ Revisão {revision} de '{project}' salva")
+            
+            # Marcações ao lado da saída: reaplicáveis sem IA com outros estilos ou layout
+            with tracer.span('write_markup'):
+                markup_writer = self._markup_writer(styles, removal_prompts, workspace, markup_reader)
+                markup_writer.write(marked_content)
+                markup_writer.close()
+            
             # 3. Aplica estilos (com garantia de aplicação)
             print("\n[3/7] Aplicando estilos...")
-            style_applier = StyleApplier(file_path)
-            style_applier.register_styles(styles)
-            styled_doc = style_applier.apply_styles(marked_content)
+            progress.update('styling', 65, 'Aplicando estilos')
+            with tracer.span('open_style_applier'):
+                style_applier = StyleApplier(file_path, output_mode=Config.STYLE_OUTPUT_MODE)
+            with tracer.span('register_styles'):
+                style_applier.register_styles(styles)
+            with tracer.span('apply_styles'):
+                styled_doc = style_applier.apply_styles(marked_content)
             
             # 4. Remove conteúdo marcado (com rastreamento completo)
             print("\n[4/7] Removendo conteúdo marcado...")
+            progress.update('removing', 72, 'Removendo conteúdo marcado')
             clean_doc = style_applier.remove_marked_content(
                 styled_doc, marked_content, removal_prompts
             )
             
-            # 5. Divide em simulados (PULAR - não queremos mais dividir)
-            print("\n[5/7] Pulando divisão em simulados...")
-            simulados = []  # Lista vazia - não divide mais
-            
-            print("✓ Divisão desabilitada - documento único será gerado")
+            # 5. Divide em simulados (opcional)
+            simulados = []
+            if Config.SPLIT_SIMULADOS:
+                print("\n[5/7] Dividindo em simulados...")
+                progress.update('splitting', 78, 'Dividindo em simulados')
+                split_source = clean_doc.as_document() if isinstance(clean_doc, DocxPackage) else clean_doc
+                splitter = DocumentSplitter()
+                simulados = splitter.split_simulados(split_source)
+                print(f"✓ {len(simulados)} simulados encontrados")
+            else:
+                print("\n[5/7] Pulando divisão em simulados...")
+                progress.update('splitting', 78, 'Divisão desabilitada')
+                print("✓ Divisão desabilitada - documento único será gerado")
             
             # 6. Cria documentos finais
             print("\n[6/7] Criando documento final...")
+            progress.update('building', 82, 'Criando documentos finais')
             documents = {}
             
-            # Apenas o documento completo estilizado
+            # Documento completo estilizado
             documents['completo'] = clean_doc
             print("  ✓ Documento único criado")
             
-            # NÃO cria mais documentos separados
+            # Questões e gabaritos por simulado
+            if simulados:
+                split_marked = style_applier.align_marked_content(marked_content)
+                documents.update(splitter.create_split_documents_parallel(
+                    simulados, split_source, split_marked, styles,
+                    workers=Config.SPLIT_WORKERS
+                ))
+                print(f"  ✓ {len(documents) - 1} documentos por simulado criados")
             
             # 7. Salva arquivos
             print("\n[7/7] Salvando arquivos...")
-            file_manager = FileManager(book_name)
-            output_dir = file_manager.create_output_structure()
-            saved_files = file_manager.save_documents(documents)
+            progress.update('saving', 92, 'Salvando arquivos')
+            file_manager = FileManager(book_name, workspace)
+            saved_files, zip_path = file_manager.write_zip_archive(documents, keep_tree=Config.KEEP_OUTPUT_TREE,
+                                                                   attachments={MARKUP_SUFFIX: markup_writer.path})
+            output_dir = file_manager.output_dir
             
-            print(f"✓ Arquivos salvos em: {output_dir}")
-            print(f"  - Total de arquivos: {len(saved_files)}")
+            # Encerra o trace (e o profiler) antes de gravar o perfil ao lado do ZIP
+            trace = tracer.finish()
+            profile_path = tracer.save_profile(os.path.dirname(zip_path), os.path.splitext(os.path.basename(zip_path))[0])
+            if profile_path:
+                print(f"✓ Perfil salvo: {os.path.basename(profile_path)}")
             
-            # Cria arquivo ZIP
-            zip_path = file_manager.create_zip_archive()
+            if output_dir:
+                print(f"✓ Arquivos salvos em: {output_dir}")
+            print(f"  - Total de arquivos: {len(saved_files)}")
             print(f"✓ Arquivo ZIP criado: {os.path.basename(zip_path)}")
             
             # Limpa arquivos temporários
@@ -101,6 +225,9 @@ class WordStylerProcessor:
             print("="*60)
             print(f"Tempo total: {int(processing_time // 60)}m {int(processing_time % 60)}s")
             
+            progress.complete()
+            PIPELINE_SECONDS.observe(processing_time, status='success')
+            
             # Prepara resposta detalhada
             return {
                 'success': True,
@@ -110,39 +237,356 @@ class WordStylerProcessor:
                     'questions_processed': ai_results['stats']['marked'],
                     'api_calls': ai_results['stats']['api_calls'],
                     'removal_count': len(removal_prompts),
-                    'styles_applied': len(styles)
+                    'styles_applied': len(styles),
+                    'simulados': len(simulados)
                 },
                 'files': saved_files,
                 'output_directory': output_dir,
-                'zip_file': os.path.basename(zip_path),
+                'zip_file': os.path.relpath(zip_path, Config.OUTPUT_DIR),
+                'profile_file': os.path.relpath(profile_path, Config.OUTPUT_DIR) if profile_path else None,
                 'details': {
                     'document_info': doc_info,
-                    'ai_stats': ai_results['stats']
+                    'ai_stats': ai_results['stats'],
+                    'split_timings': splitter.document_timings if simulados else {},
+                    'pipeline': 'apply_only' if markup_reader else 'full',
+                    'trace': trace
                 }
             }
             
         except Exception as e:
-            processing_time = time.time() - start_time
-            error_msg = str(e)
+            return self._failure_result(e, start_time, progress, tracer)
+        
+        finally:
+            if markup_writer is not None:
+                markup_writer.discard()
+    
+    def process_windowed(self, file_path: str, book_name: str, api_key: str,
+                         styles: List[Dict], removal_prompts: List[Dict],
+                         workspace: JobWorkspace = None, progress: 'ProgressMonitor' = None,
+                         shared_ai: SharedAIResources = None, tracer: PipelineTracer = None,
+                         markup: str = None) -> Dict:
+        """Processa o documento em janelas, com memória limitada ao tamanho da janela.
+        
+        Primeira passada: o corpo é lido em janelas de WINDOW_PARAGRAPHS elementos e
+        cada janela (precedida dos últimos elementos da anterior, só como contexto) vai
+        para a IA; os marcadores vão para um arquivo temporário. Segunda passada: o
+        document.xml é relido e gravado elemento a elemento no .docx de saída, com
+        estilos e remoções aplicados. Gera só o documento completo. Com ``markup``, as
+        janelas recebem as marcações do arquivo em vez de irem para a IA.
+        """
+        start_time = time.time()
+        progress = progress or ProgressMonitor()
+        tracer = tracer or PipelineTracer(memory=Config.TRACE_MEMORY)
+        progress.tracer = tracer
+        temp_dir = workspace.temp_dir if workspace else Config.TEMP_DIR
+        spool = None
+        markup_writer = None
+        output_path = os.path.join(temp_dir, f"windowed_{uuid.uuid4().hex}.docx")
+        
+        try:
+            BYTES_PROCESSED.inc(os.path.getsize(file_path), direction='in')
+            markup_reader = MarkupReader(markup) if markup else None
+            if markup_reader:
+                styles, removal_prompts = self._markup_config(markup_reader, styles, removal_prompts)
             
             print("\n" + "="*60)
-            print("ERRO NO PROCESSAMENTO!")
+            print("INICIANDO PROCESSAMENTO DO DOCUMENTO (EM JANELAS)")
             print("="*60)
-            print(f"Erro: {error_msg}")
-            print(f"Tempo decorrido: {int(processing_time)}s")
+            if Config.SPLIT_SIMULADOS:
+                print("⚠️ Divisão em simulados indisponível em janelas: só o documento completo será gerado")
+            
+            # 1. Lê e classifica janela a janela
+            print(f"\n[1/3] Lendo e processando com IA em janelas de {Config.WINDOW_PARAGRAPHS} elementos...")
+            progress.update('ai_processing', AI_PROGRESS_START, 'Processando com IA em janelas')
+            with tracer.span('open_windowed_reader'):
+                reader = WindowedReader(file_path)
+            os.makedirs(temp_dir, exist_ok=True)
+            spool = MarkerSpool(os.path.join(temp_dir, f"markers_{uuid.uuid4().hex}.jsonl"))
+            markup_writer = self._markup_writer(styles, removal_prompts, workspace, markup_reader)
             
-            # Log detalhado do erro
-            import traceback
-            traceback.print_exc()
+            ai_processor = AIProcessor(api_key, shared=shared_ai)
+            removal_set = {marker for removal in removal_prompts
+                           for marker in (removal['startMarker'], removal['endMarker'])}
+            # Só os parágrafos com marcador de remoção ficam em memória (são poucos)
+            removal_marks = []
+            ai_stats = {'total_paragraphs': 0, 'processed': 0, 'marked': 0, 'unmarked': 0, 'api_calls': 0,
+                        'failed_batches': 0, 'windows': 0, 'context': 0, 'timings': {}, 'tokens': {}}
+            context = []
+            
+            for window in reader.iter_windows(Config.WINDOW_PARAGRAPHS):
+                if markup_reader:
+                    markup_reader.assign(window)
+                else:
+                    window_results = ai_processor.process_document(context + window, styles, removal_prompts)
+                    window_stats = window_results['stats']
+                    ai_stats['api_calls'] += window_stats['api_calls']
+                    ai_stats['failed_batches'] += window_stats['failed_batches']
+                    for name, seconds in window_stats.get('timings', {}).items():
+                        ai_stats['timings'][name] = ai_stats['timings'].get(name, 0) + seconds
+                    for name, count in window_stats.get('tokens', {}).items():
+                        ai_stats['tokens'][name] = ai_stats['tokens'].get(name, 0) + count
+                markup_writer.write(window)
+                
+                for para in window:
+                    markers = para.get('markers')
+                    ai_stats['total_paragraphs'] += 1
+                    if not markers:
+                        continue
+                    ai_stats['marked'] += 1
+                    if para['type'] == 'paragraph':
+                        spool.write(para['original_para_index'], markers)
+                        if removal_set.intersection(markers):
+                            removal_marks.append({'original_para_index': para['original_para_index'],
+                                                  'markers': markers, 'text': para['text'][:60]})
+                
+                ai_stats['windows'] += 1
+                ai_stats['context'] += len(context)
+                # Cópias: a IA as classifica de novo, mas a marcação que vale é a desta janela
+                context = [dict(para, markers=[]) for para in window[-WINDOW_CONTEXT:]]
+                progress.update(
+                    'ai_processing',
+                    AI_PROGRESS_START + int((AI_PROGRESS_END - AI_PROGRESS_START) * reader.progress),
+                    f"{ai_stats['total_paragraphs']} elementos ({ai_stats['windows']} janelas)"
+                )
+            
+            ai_stats['processed'] = ai_stats['total_paragraphs']
+            ai_stats['unmarked'] = ai_stats['total_paragraphs'] - ai_stats['marked']
+            for name, seconds in ai_stats['timings'].items():
+                tracer.record(name, seconds)
+            doc_info = reader.get_document_info()
+            markup_writer.close()
+            if markup_reader:
+                markup_reader.finish(doc_info['total_paragraphs'])
+                ai_stats['markup_entries'] = markup_reader.applied
+            
+            print(f"✓ Processamento com IA concluído em {ai_stats['windows']} janelas:")
+            print(f"  - Elementos: {ai_stats['total_paragraphs']} ({doc_info['total_tables']} tabelas)")
+            print(f"  - Elementos marcados: {ai_stats['marked']}")
+            print(f"  - Chamadas à API: {ai_stats['api_calls']}")
+            
+            if ai_stats['marked'] == 0:
+                raise Exception("ERRO CRÍTICO: Nenhum elemento foi marcado pela IA!")
+            
+            # 2. Estilos e remoções, gravados direto no .docx de saída
+            print("\n[2/3] Aplicando estilos e removendo conteúdo marcado...")
+            progress.update('styling', 65, 'Aplicando estilos (em janelas)')
+            style_applier = StyleApplier(file_path, output_mode='windowed')
+            style_applier.register_styles(styles)
+            ranges = []
+            if removal_prompts:
+                ranges = style_applier.plan_removal_ranges(removal_marks, removal_prompts,
+                                                           doc_info['total_paragraphs'])
+            with tracer.span('write_document'):
+                style_applier.write_windowed(reader.stream, output_path, spool, ranges)
+            
+            # 3. Salva arquivos
+            print("\n[3/3] Salvando arquivos...")
+            progress.update('saving', 92, 'Salvando arquivos')
+            file_manager = FileManager(book_name, workspace)
+            saved_files, zip_path = file_manager.write_zip_archive({'completo': DocxFile(output_path)},
+                                                                   keep_tree=Config.KEEP_OUTPUT_TREE,
+                                                                   attachments={MARKUP_SUFFIX: markup_writer.path})
+            
+            trace = tracer.finish()
+            profile_path = tracer.save_profile(os.path.dirname(zip_path), os.path.splitext(os.path.basename(zip_path))[0])
+            print(f"✓ Arquivo ZIP criado: {os.path.basename(zip_path)}")
+            
+            processing_time = time.time() - start_time
+            print("\n" + "="*60)
+            print("PROCESSAMENTO CONCLUÍDO COM SUCESSO!")
+            print("="*60)
+            print(f"Tempo total: {int(processing_time // 60)}m {int(processing_time % 60)}s")
+            
+            progress.complete()
+            PIPELINE_SECONDS.observe(processing_time, status='success')
             
             return {
-                'success': False,
-                'error': error_msg,
-                'processing_time': f"{int(processing_time)}s",
+                'success': True,
+                'processing_time': f"{int(processing_time // 60)}m {int(processing_time % 60)}s",
+                'stats': {
+                    'total_pages': doc_info['total_paragraphs'],
+                    'questions_processed': ai_stats['marked'],
+                    'api_calls': ai_stats['api_calls'],
+                    'removal_count': len(removal_prompts),
+                    'styles_applied': len(styles),
+                    'simulados': 0
+                },
+                'files': saved_files,
+                'output_directory': file_manager.output_dir,
+                'zip_file': os.path.relpath(zip_path, Config.OUTPUT_DIR),
+                'profile_file': os.path.relpath(profile_path, Config.OUTPUT_DIR) if profile_path else None,
                 'details': {
-                    'stage': self._identify_error_stage(error_msg),
-                    'suggestion': self._get_error_suggestion(error_msg)
+                    'document_info': doc_info,
+                    'ai_stats': ai_stats,
+                    'split_timings': {},
+                    'pipeline': 'windowed_apply_only' if markup_reader else 'windowed',
+                    'trace': trace
+                }
+            }
+        
+        except Exception as e:
+            return self._failure_result(e, start_time, progress, tracer)
+        
+        finally:
+            if spool is not None:
+                spool.discard()
+            if markup_writer is not None:
+                markup_writer.discard()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+    
+    def _markup_config(self, markup_reader: MarkupReader, styles: List[Dict],
+                       removal_prompts: List[Dict]) -> tuple:
+        """Estilos e remoções do modo só aplicação: os enviados, ou os do arquivo se não houver"""
+        if not styles:
+            return markup_reader.styles, markup_reader.removal_prompts
+        
+        missing = [style['name'] for style in styles if style['marker'] not in markup_reader.markers]
+        if missing:
+            print(f"⚠️ Estilos sem marcações no arquivo (não serão aplicados): {', '.join(missing)}")
+        return styles, removal_prompts
+    
+    def _markup_stats(self, paragraphs: List[Dict], markup_reader: MarkupReader) -> Dict:
+        """Estatísticas no formato das da IA para as marcações reaplicadas"""
+        marked = sum(1 for para in paragraphs if para.get('markers'))
+        return {
+            'total_paragraphs': len(paragraphs),
+            'processed': len(paragraphs),
+            'marked': marked,
+            'unmarked': len(paragraphs) - marked,
+            'api_calls': 0,
+            'failed_batches': 0,
+            'markup_entries': markup_reader.applied,
+        }
+    
+    def _markup_writer(self, styles: List[Dict], removal_prompts: List[Dict], workspace: JobWorkspace,
+                       markup_reader: MarkupReader = None) -> MarkupWriter:
+        """Arquivo de marcações do job, no diretório temporário até entrar no ZIP"""
+        temp_dir = workspace.temp_dir if workspace else Config.TEMP_DIR
+        os.makedirs(temp_dir, exist_ok=True)
+        # Reaplicando, os marcadores do arquivo de origem continuam válidos mesmo sem estilo atual
+        return MarkupWriter(os.path.join(temp_dir, f"markup_{uuid.uuid4().hex}.jsonl"), styles, removal_prompts,
+                            source_sha256=workspace.upload_sha256 if workspace else None,
+                            extra_markers=markup_reader.markers if markup_reader else ())
+    
+    def _use_windowed(self, file_path: str) -> bool:
+        """Decide o modo do pipeline (PIPELINE_MODE) para o documento"""
+        if Config.PIPELINE_MODE == 'windowed':
+            return True
+        if Config.PIPELINE_MODE != 'auto':
+            return False
+        
+        try:
+            with zipfile.ZipFile(file_path) as zf:
+                document_part = DocxPackage.find_document_part(zf)
+                size = zf.getinfo(document_part).file_size
+        except (KeyError, ValueError, zipfile.BadZipFile):
+            return False
+        return size > Config.WINDOWED_AUTO_MB * 1024 * 1024
+    
+    def _failure_result(self, error: Exception, start_time: float, progress: 'ProgressMonitor',
+                        tracer: PipelineTracer) -> Dict:
+        """Resposta de erro do processamento (registra métricas e o traceback)"""
+        processing_time = time.time() - start_time
+        error_msg = str(error)
+        PIPELINE_SECONDS.observe(processing_time, status='error')
+        PIPELINE_FAILURES.inc(stage=progress.current_step or 'starting')
+        
+        print("\n" + "="*60)
+        print("ERRO NO PROCESSAMENTO!")
+        print("="*60)
+        print(f"Erro: {error_msg}")
+        print(f"Tempo decorrido: {int(processing_time)}s")
+        
+        # Log detalhado do erro
+        import traceback
+        traceback.print_exc()
+        
+        return {
+            'success': False,
+            'error': error_msg,
+            'processing_time': f"{int(processing_time)}s",
+            'details': {
+                'stage': self._identify_error_stage(error_msg),
+                'suggestion': self._get_error_suggestion(error_msg),
+                'trace': tracer.finish()
+            }
+        }
+    
+    def preview_document(self, file_path: str, api_key: str, styles: List[Dict], removal_prompts: List[Dict],
+                         sample_size: int = None) -> Dict:
+        """Pré-visualização: classifica uma amostra do documento em uma única chamada.
+        
+        Retorna as marcações previstas para a amostra, a cobertura por estilo
+        (extrapolada para o documento) e a estimativa de chamadas, tokens, custo e
+        tempo do processamento completo. Nada é gravado.
+        """
+        start_time = time.time()
+        sample_size = max(1, min(sample_size or Config.PREVIEW_SAMPLE_SIZE, BATCH_SIZE))
+        
+        try:
+            print(f"\n[Pré-visualização] Lendo documento...")
+            reader = DocumentReader(file_path)
+            paragraphs = reader.read_paragraphs()
+            reading_seconds = time.time() - start_time
+            
+            # Sem elementos não há amostra a classificar nem o que estimar
+            if not paragraphs:
+                print("⚠️ Pré-visualização: documento vazio")
+                return {
+                    'success': False,
+                    'error': 'Documento vazio: nenhum parágrafo ou tabela para pré-visualizar',
+                    'processing_time': f"{time.time() - start_time:.1f}s",
+                    'details': {'suggestion': 'Verifique se o arquivo enviado é o documento correto.'}
                 }
+            
+            sections = DocumentSplitter().find_sections(paragraphs)
+            positions = select_preview_sample(paragraphs, sections, sample_size)
+            sample = [dict(paragraphs[pos]) for pos in positions]
+            print(f"  - Amostra: {len(sample)} de {len(paragraphs)} elementos, {len(sections)} seções")
+            
+            call = AIProcessor(api_key).classify_sample(sample, styles, removal_prompts)
+            if call['marked_content'] is None:
+                raise Exception("A API não retornou marcações válidas para a amostra")
+            
+            marked_sample = call['marked_content']
+            coverage = summarize_coverage(marked_sample, styles, removal_prompts, len(paragraphs))
+            estimate = estimate_full_run(len(paragraphs), len(sample), call, coverage['marked_fraction'], sections)
+            estimate['reading_seconds'] = round(reading_seconds, 1)
+            
+            section_by_position = {}
+            for section in sections:
+                for pos in range(section['start'], section['end']):
+                    section_by_position[pos] = section['title']
+            
+            print(f"✓ Pré-visualização: {coverage['marked_fraction']:.0%} da amostra marcada, "
+                  f"~{estimate['api_calls']} chamadas, ~US$ {estimate['cost_usd']:.2f}")
+            
+            return {
+                'success': True,
+                'processing_time': f"{time.time() - start_time:.1f}s",
+                'coverage': coverage,
+                'estimate': estimate,
+                'sections': [{'title': s['title'], 'elements': s['end'] - s['start']} for s in sections],
+                'sample': [
+                    {
+                        'index': para['index'],
+                        'section': section_by_position.get(pos),
+                        'type': para.get('type'),
+                        'text': (para.get('text') or '')[:200],
+                        'markers': para.get('markers') or []
+                    }
+                    for pos, para in zip(positions, marked_sample)
+                ]
+            }
+        
+        except Exception as e:
+            print(f"✗ Erro na pré-visualização: {e}")
+            return {
+                'success': False,
+                'error': str(e),
+                'processing_time': f"{time.time() - start_time:.1f}s",
+                'details': {'suggestion': self._get_error_suggestion(str(e))}
             }
     
     def _identify_error_stage(self, error_msg: str) -> str:
@@ -182,7 +626,7 @@ class WordStylerProcessor:
             return 'Verifique os logs detalhados e tente novamente.'
 
 
-# Classe auxiliar para monitorar progresso (opcional)
+# Classe auxiliar para monitorar progresso (usada pelos jobs assíncronos)
 class ProgressMonitor:
     """Monitor de progresso para feedback em tempo real"""
     
@@ -191,9 +635,20 @@ class ProgressMonitor:
         self.current_step = ''
         self.current_progress = 0
         self.start_time = time.time()
+        self._last_logged_step = None
+        self._stage_started = time.perf_counter()
+        self.tracer = None  # PipelineTracer do processamento, ligado por process_document
     
     def update(self, step: str, progress: int, details: str = ''):
-        """Atualiza o progresso"""
+        """Atualiza o progresso (e registra a duração da etapa anterior nas métricas)"""
+        if step != self.current_step:
+            now = time.perf_counter()
+            if self.current_step:
+                STAGE_SECONDS.observe(now - self._stage_started, stage=self.current_step)
+            self._stage_started = now
+            if self.tracer is not None:
+                self.tracer.enter_stage(step)
+        
         self.current_step = step
         self.current_progress = progress
         
@@ -205,9 +660,11 @@ class ProgressMonitor:
                 'elapsed_time': time.time() - self.start_time
             })
         
-        # Log no console
-        print(f"[{progress:3d}%] {step}: {details}")
+        # Log no console só na troca de etapa (os lotes da IA atualizam a mesma etapa)
+        if step != self._last_logged_step:
+            print(f"[{progress:3d}%] {step}: {details}")
+            self._last_logged_step = step
     
     def complete(self):
         """Marca como completo"""
-        self.update('Processamento concluído!', 100)
\ No newline at end of file
+        self.update('done', 100, 'Processamento concluído!')
\ No newline at end of file
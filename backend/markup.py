@@ -0,0 +1,176 @@
+import json
+import os
+import time
+from typing import Dict, Iterable, List
+from backend.revisions import paragraph_hash
+
+MARKUP_FORMAT = 'wordstyler-markup'
+# Incrementar quando o formato do arquivo de marcações mudar
+MARKUP_VERSION = 1
+MARKUP_SUFFIX = '.markup.jsonl'
+
+
+def markup_markers(styles: List[Dict], removal_prompts: List[Dict], extra: Iterable[str] = ()) -> List[str]:
+    """Tabela de marcadores do arquivo: o id de um marcador é a sua posição na lista"""
+    markers = []
+    candidates = [style['marker'] for style in styles]
+    candidates += [marker for removal in removal_prompts for marker in (removal['startMarker'], removal['endMarker'])]
+    for marker in candidates + list(extra):
+        if marker and marker not in markers:
+            markers.append(marker)
+    return markers
+
+
+class MarkupWriter:
+    """Grava as marcações de um job (``<livro>.markup.jsonl``) à medida que são produzidas.
+
+    A primeira linha é o cabeçalho (formato, versão, tabela de marcadores e a
+    configuração usada); depois vem uma linha ``[parágrafo, hash, [ids]]`` por
+    parágrafo marcado, na ordem do documento, e por fim o rodapé com o total de
+    parágrafos. Os parágrafos são identificados pelo índice no corpo
+    (``original_para_index``), o mesmo nos dois pipelines, e o hash é o de
+    ``paragraph_hash``. Marcadores fora da tabela (que nenhum estilo usa) não são gravados.
+    """
+
+    def __init__(self, path: str, styles: List[Dict], removal_prompts: List[Dict],
+                 source_sha256: str = None, extra_markers: Iterable[str] = ()):
+        self.path = path
+        self.markers = markup_markers(styles, removal_prompts, extra_markers)
+        self._ids = {marker: i for i, marker in enumerate(self.markers)}
+        self.entries = 0
+        self.total_paragraphs = 0
+        self._file = open(path, 'w', encoding='utf-8')
+        self._write({
+            'format': MARKUP_FORMAT,
+            'version': MARKUP_VERSION,
+            'created_at': time.time(),
+            'source_sha256': source_sha256,
+            'markers': self.markers,
+            'styles': styles,
+            'removal_prompts': removal_prompts,
+        })
+
+    def write(self, elements: List[Dict]):
+        """Acrescenta os parágrafos de ``elements`` (em ordem, com ``markers`` definidos)"""
+        for para in elements:
+            if para['type'] != 'paragraph':
+                continue
+            ids = [self._ids[marker] for marker in para.get('markers') or [] if marker in self._ids]
+            if ids:
+                self._write([para['original_para_index'], paragraph_hash(para), ids])
+                self.entries += 1
+            self.total_paragraphs += 1
+
+    def close(self) -> str:
+        """Grava o rodapé (sem ele o arquivo é rejeitado na leitura) e retorna o caminho"""
+        if not self._file.closed:
+            self._write({'total_paragraphs': self.total_paragraphs, 'entries': self.entries})
+            self._file.close()
+        return self.path
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+
+class MarkupReader:
+    """Lê um arquivo de marcações e o aplica aos parágrafos do documento, sem IA.
+
+    ``assign`` pode ser chamado uma vez com todos os elementos ou janela a janela
+    (na ordem do documento): o arquivo é lido em streaming. Cada parágrafo marcado
+    tem o hash conferido, então um arquivo de outro documento (ou de uma revisão
+    editada) é rejeitado com ``ValueError`` em vez de gerar uma saída errada.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'r', encoding='utf-8')
+        try:
+            header = self._read_record()
+        except ValueError:
+            self._file.close()
+            raise
+        if not isinstance(header, dict) or header.get('format') != MARKUP_FORMAT:
+            self._file.close()
+            raise ValueError("Arquivo de marcações inválido")
+        if header.get('version') != MARKUP_VERSION:
+            self._file.close()
+            raise ValueError(f"Versão do arquivo de marcações não suportada: {header.get('version')}")
+
+        self.markers = header.get('markers') or []
+        self.styles = header.get('styles') or []
+        self.removal_prompts = header.get('removal_prompts') or []
+        self.source_sha256 = header.get('source_sha256')
+        self.applied = 0
+        self._footer = None
+        self._next = self._next_entry()
+
+    def assign(self, elements: List[Dict]):
+        """Define ``markers`` dos parágrafos de ``elements`` a partir do arquivo"""
+        for para in elements:
+            if para['type'] != 'paragraph':
+                continue
+            para_index = para['original_para_index']
+            if self._next is None or self._next[0] != para_index:
+                para['markers'] = []
+                continue
+
+            _, expected_hash, ids = self._next
+            if paragraph_hash(para) != expected_hash:
+                raise ValueError(
+                    f"Marcações não correspondem ao documento: parágrafo {para_index} foi alterado "
+                    f"('{para['text'][:40]}')"
+                )
+            para['markers'] = [self.markers[marker_id] for marker_id in ids]
+            self.applied += 1
+            self._next = self._next_entry()
+
+    def finish(self, total_paragraphs: int):
+        """Confere se o arquivo foi todo aplicado e se o documento tem o mesmo tamanho"""
+        try:
+            if self._next is not None:
+                raise ValueError(
+                    f"Marcações não correspondem ao documento: parágrafo {self._next[0]} não encontrado"
+                )
+            if self._footer is None:
+                raise ValueError("Arquivo de marcações incompleto (sem rodapé)")
+            if self._footer.get('total_paragraphs') != total_paragraphs:
+                raise ValueError(
+                    f"Marcações não correspondem ao documento: {self._footer.get('total_paragraphs')} "
+                    f"parágrafos no arquivo, {total_paragraphs} no documento"
+                )
+        finally:
+            self.close()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def _next_entry(self):
+        if self._footer is not None:
+            return None
+        record = self._read_record()
+        if record is None or isinstance(record, dict):
+            self._footer = record
+            return None
+        if not (isinstance(record, list) and len(record) == 3
+                and all(isinstance(marker_id, int) and 0 <= marker_id < len(self.markers) for marker_id in record[2])):
+            raise ValueError("Arquivo de marcações inválido: entrada malformada")
+        return record
+
+    def _read_record(self):
+        line = self._file.readline()
+        if not line:
+            return None
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise ValueError("Arquivo de marcações inválido: linha não é JSON")
+
@@ -0,0 +1,208 @@
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Buckets padrão (segundos) para durações de etapas e chamadas à IA
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class _Metric:
+    """Base das métricas: valores por combinação de labels, protegidos por um lock"""
+
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+    def remove(self, **labels):
+        """Apaga a série de uma combinação de labels (ex.: de um inquilino que saiu)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values.pop(key, None)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {_format_number(value)}"]
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {_format_number(value)}"]
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        # Contagem por bucket não cumulativa; o acúmulo é feito só na exposição
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, value):
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == math.inf else _format_number(bound)
+            lines.append(f"{self.name}_bucket{self._format_labels(key, (('le', le),))} {cumulative}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {_format_number(total)}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registro das métricas do processo, exposto em /api/metrics (formato texto do Prometheus).
+
+    Cada atualização é só um acesso a dicionário sob lock, barato o bastante para
+    ficar sempre ligado.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+registry = MetricsRegistry()
+
+# Pipeline
+STAGE_SECONDS = registry.histogram(
+    'wordstyler_stage_duration_seconds', 'Duração de cada etapa do processamento', ['stage'])
+PIPELINE_SECONDS = registry.histogram(
+    'wordstyler_pipeline_duration_seconds', 'Duração total do processamento de um documento', ['status'])
+PIPELINE_FAILURES = registry.counter(
+    'wordstyler_pipeline_failures_total', 'Processamentos que falharam, por etapa', ['stage'])
+BYTES_PROCESSED = registry.counter(
+    'wordstyler_bytes_processed_total', 'Bytes de documentos lidos (in) e gerados (out)', ['direction'])
+
+# IA
+LLM_REQUEST_SECONDS = registry.histogram(
+    'wordstyler_llm_request_duration_seconds', 'Latência das chamadas à API de IA', ['kind', 'status'])
+LLM_TOKENS = registry.counter(
+    'wordstyler_llm_tokens_total', 'Tokens consumidos na API de IA', ['type'])
+LLM_ERRORS = registry.counter(
+    'wordstyler_llm_errors_total', 'Chamadas à API de IA sem resultado utilizável', ['reason'])
+BATCH_RETRIES = registry.counter(
+    'wordstyler_batch_retries_total', 'Novas tentativas de lotes da IA')
+BATCH_FAILURES = registry.counter(
+    'wordstyler_batch_failures_total', 'Lotes da IA que falharam após todas as tentativas')
+
+# Caches
+CACHE_REQUESTS = registry.counter(
+    'wordstyler_cache_requests_total', 'Consultas aos caches, por resultado', ['cache', 'outcome'])
+
+# Jobs
+JOBS_IN_FLIGHT = registry.gauge(
+    'wordstyler_jobs_in_flight', 'Jobs na fila ou em execução', ['state'])
+JOBS_FINISHED = registry.counter(
+    'wordstyler_jobs_finished_total', 'Jobs terminados, por status', ['status'])
+
+# Escalonamento (fila justa por chave de API)
+SCHEDULER_QUEUED = registry.gauge(
+    'wordstyler_scheduler_queued', 'Pedidos aguardando vaga, por fila e inquilino', ['scheduler', 'tenant'])
+SCHEDULER_RUNNING = registry.gauge(
+    'wordstyler_scheduler_running', 'Pedidos em execução, por fila e inquilino', ['scheduler', 'tenant'])
+SCHEDULER_WAIT_SECONDS = registry.histogram(
+    'wordstyler_scheduler_wait_seconds', 'Espera na fila até receber a vaga', ['scheduler', 'tenant'])
@@ -0,0 +1,134 @@
+import math
+import random
+from typing import Dict, List
+from backend.config import Config
+from backend.ai_processor import BATCH_PAUSE, BATCH_SIZE, FOCUSED_BATCH_SIZE
+
+# Elementos por "página" na amostragem (trechos contíguos mantêm questão e alternativas juntas)
+PAGE_SIZE = 25
+# Menor trecho sorteado por seção quando há muitas seções para a amostra
+MIN_WINDOW = 8
+# A segunda passada manda o parágrafo com o anterior e o próximo: prompt ~3x maior por parágrafo
+FOCUSED_PROMPT_FACTOR = 3
+# Mesma regra do AIProcessor: só há segunda passada acima disso de não marcados
+FOCUSED_MIN_UNMARKED = 10
+CHARS_PER_TOKEN = 4
+
+
+def select_preview_sample(paragraphs: List[Dict], sections: List[Dict], sample_size: int,
+                          page_size: int = PAGE_SIZE, seed: int = 0) -> List[int]:
+    """Amostra estratificada de posições: a primeira página e páginas sorteadas de cada seção.
+
+    As seções são percorridas em rodízio (um trecho sorteado de cada por vez) até
+    completar ``sample_size``, então todas as seções entram na amostra antes de
+    qualquer uma receber um segundo trecho; com muitas seções os trechos encolhem
+    (até MIN_WINDOW) para caber uma de cada. Retorna as posições em ordem.
+    """
+    total = len(paragraphs)
+    if total <= sample_size:
+        return list(range(total))
+
+    rng = random.Random(seed)
+    selected = set(range(min(page_size, sample_size)))
+
+    window = max(MIN_WINDOW, min(page_size, (sample_size - len(selected)) // max(len(sections), 1)))
+    candidates = []
+    for section in sections:
+        pages = list(range(section['start'], section['end'], window))
+        rng.shuffle(pages)
+        candidates.append((section, pages))
+
+    while len(selected) < sample_size and any(pages for _, pages in candidates):
+        for section, pages in candidates:
+            if not pages or len(selected) >= sample_size:
+                continue
+            start = pages.pop()
+            for position in range(start, min(start + window, section['end'])):
+                if len(selected) >= sample_size:
+                    break
+                selected.add(position)
+
+    return sorted(selected)
+
+
+def summarize_coverage(sample: List[Dict], styles: List[Dict], removal_prompts: List[Dict],
+                       total_paragraphs: int) -> Dict:
+    """Marcações previstas na amostra, extrapoladas para o documento inteiro"""
+    by_marker = {}
+    for para in sample:
+        for marker in para.get('markers') or []:
+            by_marker[marker] = by_marker.get(marker, 0) + 1
+
+    marked = sum(1 for para in sample if para.get('markers'))
+    scale = total_paragraphs / len(sample) if sample else 0
+
+    return {
+        'sample_size': len(sample),
+        'total_paragraphs': total_paragraphs,
+        'marked': marked,
+        'marked_fraction': round(marked / len(sample), 3) if sample else 0,
+        'by_marker': by_marker,
+        'estimated_by_marker': {marker: round(count * scale) for marker, count in by_marker.items()},
+        # Estilos que a IA não usou na amostra: prompt possivelmente errado (ou estilo raro)
+        'styles_not_found': [style['name'] for style in styles if style['marker'] not in by_marker],
+        'removals_not_found': [removal['name'] for removal in removal_prompts
+                               if removal['startMarker'] not in by_marker],
+    }
+
+
+def estimate_full_run(total_paragraphs: int, sample_size: int, call: Dict, marked_fraction: float,
+                      sections: List[Dict]) -> Dict:
+    """Estimativa de chamadas, tokens, custo e tempo da IA no documento inteiro.
+
+    Extrapolação linear a partir da chamada da amostra: tokens de prompt por
+    parágrafo (descontado o prompt de sistema, repetido em cada chamada), tokens de
+    resposta e segundos por parágrafo. A segunda passada é estimada pela fração de
+    não marcados da amostra.
+    """
+    prompt_chars = call['system_prompt_chars'] + call['user_prompt_chars']
+    prompt_tokens = call['tokens']['prompt']
+    completion_tokens = call['tokens']['completion']
+    # Sem "usage" na resposta, estima pelos caracteres
+    tokens_per_char = prompt_tokens / prompt_chars if prompt_tokens and prompt_chars else 1 / CHARS_PER_TOKEN
+    if not completion_tokens:
+        completion_tokens = sample_size * 8
+
+    system_tokens = call['system_prompt_chars'] * tokens_per_char
+    prompt_per_paragraph = max(0.0, (prompt_tokens or prompt_chars * tokens_per_char) - system_tokens) / sample_size
+    completion_per_paragraph = completion_tokens / sample_size
+    seconds_per_paragraph = call['seconds'] / sample_size
+
+    # Lotes como o AIProcessor monta: por seção se SECTION_AWARE_BATCHING, senão sequenciais
+    section_aware = Config.SECTION_AWARE_BATCHING and len(sections) > 1
+    if section_aware:
+        batches = sum(math.ceil((s['end'] - s['start']) / BATCH_SIZE) for s in sections)
+    else:
+        batches = math.ceil(total_paragraphs / BATCH_SIZE)
+
+    unmarked = round(total_paragraphs * (1 - marked_fraction))
+    focused_calls = math.ceil(unmarked / FOCUSED_BATCH_SIZE) if unmarked > FOCUSED_MIN_UNMARKED else 0
+    focused_paragraphs = unmarked if focused_calls else 0
+
+    estimated_prompt = ((batches + focused_calls) * system_tokens
+                        + total_paragraphs * prompt_per_paragraph
+                        + focused_paragraphs * prompt_per_paragraph * FOCUSED_PROMPT_FACTOR)
+    estimated_completion = (total_paragraphs + focused_paragraphs) * completion_per_paragraph
+    cost = (estimated_prompt * Config.AI_PRICE_INPUT_PER_MTOK
+            + estimated_completion * Config.AI_PRICE_OUTPUT_PER_MTOK) / 1_000_000
+
+    seconds = ((total_paragraphs + focused_paragraphs) * seconds_per_paragraph
+               + (batches + focused_calls) * BATCH_PAUSE)
+    parallelism = min(Config.AI_SECTION_WORKERS, len(sections)) if section_aware else 1
+    seconds /= max(parallelism, 1)
+
+    return {
+        'api_calls': batches + focused_calls,
+        'first_pass_calls': batches,
+        'second_pass_calls': focused_calls,
+        'prompt_tokens': round(estimated_prompt),
+        'completion_tokens': round(estimated_completion),
+        'cost_usd': round(cost, 4),
+        'ai_seconds': round(seconds, 1),
+        'parallel_sections': parallelism,
+        'sample_call_seconds': round(call['seconds'], 3),
+    }
@@ -0,0 +1,140 @@
+import json
+import os
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+from backend.config import Config
+from backend.metrics import CACHE_REQUESTS
+from backend.scheduler import tenant_of
+from backend.style_registry import StyleTemplateRegistry
+
+# Incrementar quando o formato do resultado ou do pipeline mudar (invalida o cache)
+RESULT_CACHE_VERSION = 2
+
+# Origem do resultado devolvido por get_or_run
+RESULT_COMPUTED = 'computed'
+RESULT_CACHED = 'cached'
+RESULT_COALESCED = 'coalesced'
+
+
+class ResultCache:
+    """Cache de resultados endereçado pelo conteúdo da requisição.
+
+    A chave combina o SHA-256 do .docx enviado com o hash canônico dos estilos,
+    dos prompts de remoção e das opções que mudam a saída, separada por inquilino
+    (chave de API): um usuário nunca recebe a saída de outro. Um resultado concluído
+    com sucesso é reaproveitado enquanto o ZIP dele ainda existir em OUTPUT_DIR
+    (a retenção pode apagá-lo). Requisições iguais que chegam enquanto o pipeline
+    ainda roda esperam e recebem o mesmo resultado, em vez de rodar de novo.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or Config.RESULT_CACHE_DIR
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(upload_sha256: str, book_name: str, styles: List[Dict], removal_prompts: List[Dict],
+                 api_key: str, project: str = None) -> str:
+        return StyleTemplateRegistry.make_key({
+            'cache_version': RESULT_CACHE_VERSION,
+            'tenant': tenant_of(api_key),
+            'upload': upload_sha256,
+            # O nome do livro entra nos nomes dos arquivos gerados
+            'book_name': book_name,
+            'styles': styles,
+            'removal_prompts': removal_prompts,
+            # Com projeto, o job também salva a revisão: um acerto de outro projeto a pularia
+            'project': project,
+            'options': {
+                'style_output_mode': Config.STYLE_OUTPUT_MODE,
+                'split_simulados': Config.SPLIT_SIMULADOS,
+                'keep_output_tree': Config.KEEP_OUTPUT_TREE,
+                'pipeline_mode': Config.PIPELINE_MODE,
+            },
+        })
+
+    def get_or_run(self, key: str, run_fn: Callable[[], Dict]) -> Tuple[Dict, str]:
+        """Retorna (resultado, origem): do cache, de uma execução em andamento ou de run_fn"""
+        # Leitura do disco fora do lock: só o registro de execuções em andamento é protegido
+        cached = self.get(key)
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache='result', outcome='hit')
+            return cached, RESULT_CACHED
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+
+        CACHE_REQUESTS.inc(cache='result', outcome='miss' if owner else 'coalesced')
+        if not owner:
+            print(f"  ✓ Mesma requisição já em processamento ({key[:12]}), aguardando resultado...")
+            return future.result(), RESULT_COALESCED
+
+        try:
+            # Outra execução pode ter gravado o resultado entre a leitura acima e o lock
+            cached = self.get(key)
+            if cached is not None:
+                future.set_result(cached)
+                return cached, RESULT_CACHED
+
+            result = run_fn()
+            if result.get('success'):
+                self.put(key, result)
+            future.set_result(result)
+            return result, RESULT_COMPUTED
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def get(self, key: str) -> Dict:
+        """Resultado salvo para a chave, se a saída ainda existir"""
+        path = self._entry_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️ Resultado corrompido no cache ({key[:12]}): {e}")
+            self._discard(path)
+            return None
+
+        # A retenção pode ter apagado a saída: a entrada deixa de valer
+        if not os.path.exists(os.path.join(Config.OUTPUT_DIR, result.get('zip_file', ''))):
+            self._discard(path)
+            return None
+
+        print(f"  ✓ Resultado reaproveitado do cache ({key[:12]})")
+        return result
+
+    def put(self, key: str, result: Dict):
+        path = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"  ⚠️ Não foi possível gravar o resultado no cache: {e}")
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _discard(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Cache compartilhado pelo processo
+result_cache = ResultCache()
@@ -0,0 +1,184 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, List
+from backend.config import Config
+from backend.style_registry import style_registry
+
+
+class OutputRetention:
+    """Índice persistente das saídas dos jobs, com expiração e despejo LRU.
+
+    Cada job concluído é registrado (pasta, bytes, criação e último acesso) em um
+    SQLite. O varredor remove as saídas mais antigas que ``max_age`` e, enquanto o
+    total passar de ``max_bytes``, as menos acessadas recentemente. Os downloads
+    atualizam o último acesso via ``touch``. A mesma varredura limpa os modelos de
+    estilo em disco (``StyleTemplateRegistry.sweep``).
+    """
+
+    def __init__(self, index_path: str = None, max_bytes: int = None, max_age: float = None):
+        self.index_path = index_path or Config.RETENTION_INDEX
+        self.max_bytes = Config.RETENTION_MAX_BYTES if max_bytes is None else max_bytes
+        self.max_age = Config.RETENTION_MAX_AGE if max_age is None else max_age
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Abre uma conexão por operação (seguro entre threads e processos)"""
+        if not self._initialized:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS outputs ('
+                ' job_id TEXT PRIMARY KEY,'
+                ' path TEXT NOT NULL,'
+                ' bytes INTEGER NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' last_access REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS outputs_last_access ON outputs (last_access)')
+            conn.commit()
+            self._initialized = True
+        return conn
+
+    def register(self, job_id: str, output_dir: str) -> int:
+        """Registra a saída de um job concluído e retorna seu tamanho em bytes"""
+        size = _directory_size(output_dir)
+        now = time.time()
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    'INSERT OR REPLACE INTO outputs (job_id, path, bytes, created_at, last_access)'
+                    ' VALUES (?, ?, ?, ?, ?)',
+                    (job_id, os.path.relpath(output_dir, Config.OUTPUT_DIR), size, now, now)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+        return size
+
+    def touch(self, relative_path: str):
+        """Marca como acessada a saída que contém relative_path (relativo a OUTPUT_DIR)"""
+        job_id = job_id_from_path(relative_path)
+        if not job_id:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('UPDATE outputs SET last_access = ? WHERE job_id = ?', (time.time(), job_id))
+                conn.commit()
+            finally:
+                conn.close()
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            try:
+                return conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM outputs').fetchone()[0]
+            finally:
+                conn.close()
+
+    def sweep(self) -> Dict:
+        """Remove saídas expiradas e, se preciso, as menos usadas até caber no limite"""
+        evicted: List[tuple] = []
+
+        with self._lock:
+            conn = self._connect()
+            try:
+                if self.max_age:
+                    evicted.extend(conn.execute(
+                        'SELECT job_id, path, bytes FROM outputs WHERE created_at < ?',
+                        (time.time() - self.max_age,)
+                    ).fetchall())
+
+                if self.max_bytes:
+                    expired = {job_id for job_id, _, _ in evicted}
+                    total = conn.execute('SELECT COALESCE(SUM(bytes), 0) FROM outputs').fetchone()[0]
+                    total -= sum(size for _, _, size in evicted)
+
+                    for job_id, path, size in conn.execute(
+                            'SELECT job_id, path, bytes FROM outputs ORDER BY last_access'):
+                        if total <= self.max_bytes:
+                            break
+                        if job_id in expired:
+                            continue
+                        evicted.append((job_id, path, size))
+                        total -= size
+
+                conn.executemany('DELETE FROM outputs WHERE job_id = ?', [(job_id,) for job_id, _, _ in evicted])
+                conn.commit()
+            finally:
+                conn.close()
+
+        # Remove do disco fora do lock (o índice já não aponta mais para essas pastas).
+        # As pastas de shard ficam: são no máximo 256 e podem estar em uso por um job novo
+        for _, path, _ in evicted:
+            shutil.rmtree(os.path.join(Config.OUTPUT_DIR, path), ignore_errors=True)
+
+        freed = sum(size for _, _, size in evicted)
+        if evicted:
+            print(f"  ✓ Retenção: {len(evicted)} saídas removidas ({freed / 1024 / 1024:.1f} MB liberados)")
+
+        style_templates = style_registry.sweep()
+        if style_templates:
+            print(f"  ✓ Retenção: {style_templates} modelos de estilo removidos do disco")
+
+        return {'evicted': len(evicted), 'freed_bytes': freed, 'style_templates_evicted': style_templates}
+
+    def start_sweeper(self, interval: float = None):
+        """Inicia o varredor em segundo plano (uma vez por processo)"""
+        interval = interval or Config.RETENTION_SWEEP_INTERVAL
+        limits = (self.max_bytes, self.max_age, style_registry.max_files, style_registry.max_age)
+        if self._sweeper is not None or not interval or not any(limits):
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"  ⚠️ Erro no varredor de retenção: {e}")
+
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=run, name='output-retention', daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+
+def job_id_from_path(relative_path: str) -> str:
+    """Extrai o id do job de um caminho '<shard>/<job_id>/...' relativo a OUTPUT_DIR"""
+    parts = relative_path.replace('\\', '/').split('/')
+    if len(parts) >= 2 and parts[1].startswith(parts[0]):
+        return parts[1]
+    return None
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+# Índice compartilhado pelo processo
+output_retention = OutputRetention()
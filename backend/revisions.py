@@ -0,0 +1,139 @@
+import difflib
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+from backend.config import Config
+from backend.metrics import CACHE_REQUESTS
+from backend.style_registry import StyleTemplateRegistry
+
+# Incrementar quando o formato da revisão salva ou a forma de classificar mudar
+REVISION_VERSION = 1
+# Vizinhos (de cada lado) de um trecho alterado enviados à IA como contexto
+REVISION_CONTEXT = 2
+
+
+def paragraph_hash(para: Dict) -> str:
+    """Hash do que a IA vê de um elemento (tipo, estilo, imagem e texto)"""
+    material = '\x1f'.join([
+        para['type'], para.get('style') or '', '1' if para.get('has_image') else '0', para.get('text') or ''
+    ])
+    return hashlib.sha1(material.encode('utf-8')).hexdigest()[:16]
+
+
+class RevisionStore:
+    """Última revisão classificada de cada projeto (livro), para reprocessamento incremental.
+
+    Uma revisão guarda, na ordem do documento, o hash de cada elemento e os marcadores
+    que ele recebeu. A nova revisão é alinhada à anterior pela sequência de hashes
+    (``difflib.SequenceMatcher``): elementos em blocos iguais reaproveitam os
+    marcadores e só os inseridos ou modificados (com ``REVISION_CONTEXT`` vizinhos de
+    contexto) vão para a IA. Marcadores só valem para a mesma configuração de estilos
+    e remoções; com outra configuração o documento é classificado inteiro.
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or Config.REVISION_CACHE_DIR
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def config_key(styles: List[Dict], removal_prompts: List[Dict]) -> str:
+        return StyleTemplateRegistry.make_key({
+            'revision_version': REVISION_VERSION,
+            'styles': styles,
+            'removal_prompts': removal_prompts,
+        })
+
+    def plan(self, project: str, styles: List[Dict], removal_prompts: List[Dict],
+             paragraphs: List[Dict]) -> Dict:
+        """Alinha ``paragraphs`` à revisão anterior do projeto.
+
+        Retorna ``None`` se não há revisão utilizável, senão um dicionário com
+        ``reused`` (posição -> marcadores da revisão anterior), ``context`` (posições
+        reaproveitadas que vão à IA só como contexto), ``changed`` (posições a
+        classificar) e o número da revisão anterior.
+        """
+        previous = self._load(project)
+        if previous is None or previous.get('config') != self.config_key(styles, removal_prompts):
+            CACHE_REQUESTS.inc(cache='revision', outcome='miss')
+            return None
+
+        old_hashes = [entry[0] for entry in previous['paragraphs']]
+        old_markers = [entry[1] for entry in previous['paragraphs']]
+        new_hashes = [paragraph_hash(para) for para in paragraphs]
+
+        # Sem autojunk: em provas, linhas repetidas ("Gabarito", alternativas curtas) são comuns
+        matcher = difflib.SequenceMatcher(None, old_hashes, new_hashes, autojunk=False)
+        reused = {}
+        for tag, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if tag == 'equal':
+                for offset in range(new_end - new_start):
+                    reused[new_start + offset] = old_markers[old_start + offset]
+
+        changed = [pos for pos in range(len(paragraphs)) if pos not in reused]
+        context = set()
+        for pos in changed:
+            for neighbour in range(max(0, pos - REVISION_CONTEXT), min(len(paragraphs), pos + REVISION_CONTEXT + 1)):
+                if neighbour in reused:
+                    context.add(neighbour)
+
+        CACHE_REQUESTS.inc(cache='revision', outcome='hit')
+        return {
+            'revision': previous['revision'],
+            'previous_paragraphs': len(old_hashes),
+            'reused': reused,
+            'context': sorted(context),
+            'changed': changed,
+        }
+
+    def save(self, project: str, styles: List[Dict], removal_prompts: List[Dict], marked_content: List[Dict]):
+        """Grava a classificação do documento como a revisão mais recente do projeto"""
+        with self._lock:
+            previous = self._load(project)
+            entry = {
+                'version': REVISION_VERSION,
+                'project': project,
+                'config': self.config_key(styles, removal_prompts),
+                'revision': (previous['revision'] + 1) if previous else 1,
+                'saved_at': time.time(),
+                'paragraphs': [[paragraph_hash(para), para.get('markers') or []] for para in marked_content],
+            }
+
+            path = self._entry_path(project)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entry, f, ensure_ascii=False, separators=(',', ':'))
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"  ⚠️ Não foi possível gravar a revisão de '{project}': {e}")
+                return None
+
+        return entry['revision']
+
+    def _load(self, project: str) -> Dict:
+        path = self._entry_path(project)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️ Revisão corrompida de '{project}': {e}")
+            return None
+
+        if entry.get('version') != REVISION_VERSION:
+            return None
+        return entry
+
+    def _entry_path(self, project: str) -> str:
+        key = hashlib.sha256(project.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+
+# Revisões compartilhadas pelo processo
+revision_store = RevisionStore()
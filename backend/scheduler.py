@@ -0,0 +1,212 @@
+import hashlib
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Set
+from backend.config import Config
+from backend.metrics import SCHEDULER_QUEUED, SCHEDULER_RUNNING, SCHEDULER_WAIT_SECONDS
+
+ANONYMOUS_TENANT = 'anonymous'
+# Label das métricas que soma os inquilinos além de SCHEDULER_METRIC_TENANTS
+OTHER_TENANTS_LABEL = 'other'
+# Custo mínimo de um job (o restante é proporcional ao tamanho do upload, em MB)
+MIN_JOB_COST = 1.0
+
+
+def tenant_of(api_key: str) -> str:
+    """Inquilino de uma chave de API: hash curto (a chave nunca aparece em métricas ou respostas)"""
+    if not api_key:
+        return ANONYMOUS_TENANT
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]
+
+
+class SchedulerTimeout(Exception):
+    """Pedido não foi atendido dentro do tempo de espera"""
+
+
+def job_cost(size_bytes: int) -> float:
+    """Custo de um job para a fila justa: quanto menor o upload, mais cedo ele é atendido"""
+    return MIN_JOB_COST + size_bytes / (1024 * 1024)
+
+
+class _Ticket:
+    __slots__ = ('tenant', 'label', 'cost', 'weight', 'start_tag', 'finish_tag', 'seq', 'enqueued_at', 'granted_at')
+
+    def __init__(self, tenant: str, label: str, cost: float, weight: float, seq: int):
+        self.tenant = tenant
+        self.label = label
+        self.cost = cost
+        self.weight = weight
+        self.seq = seq
+        self.start_tag = 0.0
+        self.finish_tag = 0.0
+        self.enqueued_at = time.time()
+        self.granted_at = None
+
+
+class FairScheduler:
+    """Fila justa ponderada (WFQ) entre inquilinos, com limite de concorrência por inquilino.
+
+    Cada pedido recebe uma etiqueta de término virtual: o maior entre o tempo virtual
+    da fila e o término do último pedido do mesmo inquilino, mais ``custo / peso``.
+    Quando há vaga, é atendido o pedido de menor etiqueta entre os inquilinos abaixo
+    de ``tenant_limit``: pedidos baratos (jobs pequenos) passam à frente dos caros,
+    inquilinos de peso maior (interativos) recebem uma fatia maior e um inquilino com
+    muitos pedidos não bloqueia os demais. Se o inquilino da vez está no limite, a vaga
+    vai para o próximo, então a capacidade ociosa é sempre usada.
+
+    Inquilinos sem pedidos na fila nem em execução, cujo término virtual já passou,
+    são esquecidos (estado, estatísticas e séries das métricas): memória e labels
+    acompanham os inquilinos ativos, não todos os que já passaram pelo processo.
+    """
+
+    def __init__(self, name: str, capacity: int, tenant_limit: int = 0):
+        self.name = name
+        self.capacity = max(capacity, 1)
+        self.tenant_limit = tenant_limit  # 0 = sem limite por inquilino
+        self._changed = threading.Condition()
+        self._waiting: List[_Ticket] = []
+        self._running: Dict[str, int] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict] = {}
+        self.metric_tenants = Config.SCHEDULER_METRIC_TENANTS
+        self._labelled: Set[str] = set()  # inquilinos com série própria nas métricas
+
+    def acquire(self, tenant: str, cost: float = 1.0, weight: float = 1.0, timeout: float = None) -> _Ticket:
+        """Bloqueia até o pedido ser atendido; devolva a vaga com ``release``.
+
+        Com ``timeout`` (segundos), desiste e levanta ``SchedulerTimeout`` se a vaga não vier a tempo.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        # Métricas atualizadas sob o lock: a remoção das séries de um inquilino esquecido
+        # não pode ser seguida de um inc/dec atrasado que as recriaria
+        with self._changed:
+            ticket = _Ticket(tenant, self._metric_label(tenant), max(cost, 0.0), max(weight, 1e-6), next(self._seq))
+            previous_finish = self._last_finish.get(tenant)
+            ticket.start_tag = max(self._virtual_time, previous_finish or 0.0)
+            ticket.finish_tag = ticket.start_tag + ticket.cost / ticket.weight
+            self._last_finish[tenant] = ticket.finish_tag
+            self._waiting.append(ticket)
+            SCHEDULER_QUEUED.inc(scheduler=self.name, tenant=ticket.label)
+
+            while self._next_eligible() is not ticket:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self._waiting.remove(ticket)
+                    # Sem pedidos posteriores do inquilino, o pedido desistente não conta na justiça
+                    if self._last_finish.get(tenant) == ticket.finish_tag:
+                        self._last_finish[tenant] = previous_finish if previous_finish is not None else 0.0
+                    SCHEDULER_QUEUED.dec(scheduler=self.name, tenant=ticket.label)
+                    self._evict_idle()
+                    self._changed.notify_all()
+                    raise SchedulerTimeout(
+                        f"Servidor ocupado: nenhuma vaga em {timeout:g}s. Tente novamente em instantes."
+                    )
+                self._changed.wait(remaining)
+
+            self._waiting.remove(ticket)
+            self._running[tenant] = self._running.get(tenant, 0) + 1
+            self._virtual_time = max(self._virtual_time, ticket.start_tag)
+            ticket.granted_at = time.time()
+            self._record_wait(ticket)
+            SCHEDULER_QUEUED.dec(scheduler=self.name, tenant=ticket.label)
+            SCHEDULER_RUNNING.inc(scheduler=self.name, tenant=ticket.label)
+            SCHEDULER_WAIT_SECONDS.observe(ticket.granted_at - ticket.enqueued_at,
+                                           scheduler=self.name, tenant=ticket.label)
+            # Pode haver outra vaga livre para o próximo da fila
+            self._changed.notify_all()
+
+        return ticket
+
+    def release(self, ticket: _Ticket):
+        with self._changed:
+            remaining = self._running.get(ticket.tenant, 0) - 1
+            if remaining > 0:
+                self._running[ticket.tenant] = remaining
+            else:
+                self._running.pop(ticket.tenant, None)
+            SCHEDULER_RUNNING.dec(scheduler=self.name, tenant=ticket.label)
+            self._evict_idle()
+            self._changed.notify_all()
+
+    @contextmanager
+    def slot(self, tenant: str, cost: float = 1.0, weight: float = 1.0, timeout: float = None):
+        ticket = self.acquire(tenant, cost, weight, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def snapshot(self) -> Dict:
+        """Profundidade da fila, execuções e espera por inquilino"""
+        now = time.time()
+        with self._changed:
+            tenants = set(self._stats) | set(self._running) | {t.tenant for t in self._waiting}
+            by_tenant = {}
+            for tenant in sorted(tenants):
+                waiting = [t for t in self._waiting if t.tenant == tenant]
+                stats = self._stats.get(tenant, {'served': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+                by_tenant[tenant] = {
+                    'queued': len(waiting),
+                    'running': self._running.get(tenant, 0),
+                    'served': stats['served'],
+                    'avg_wait_seconds': round(stats['wait_total'] / stats['served'], 3) if stats['served'] else 0,
+                    'max_wait_seconds': round(stats['wait_max'], 3),
+                    'oldest_waiting_seconds': round(now - min(t.enqueued_at for t in waiting), 3) if waiting else 0,
+                }
+            return {
+                'capacity': self.capacity,
+                'tenant_limit': self.tenant_limit,
+                'queued': len(self._waiting),
+                'running': sum(self._running.values()),
+                'tenants': by_tenant,
+            }
+
+    def _next_eligible(self) -> _Ticket:
+        """Pedido de menor etiqueta cujo inquilino está abaixo do limite (``None`` se não há vaga)"""
+        if sum(self._running.values()) >= self.capacity:
+            return None
+        best = None
+        for ticket in self._waiting:
+            if self.tenant_limit and self._running.get(ticket.tenant, 0) >= self.tenant_limit:
+                continue
+            if best is None or (ticket.finish_tag, ticket.seq) < (best.finish_tag, best.seq):
+                best = ticket
+        return best
+
+    def _metric_label(self, tenant: str) -> str:
+        """Label do inquilino nas métricas: próprio para os primeiros ativos, 'other' para os demais"""
+        if tenant not in self._labelled and len(self._labelled) < self.metric_tenants:
+            self._labelled.add(tenant)
+        return tenant if tenant in self._labelled else OTHER_TENANTS_LABEL
+
+    def _evict_idle(self):
+        """Esquece inquilinos sem pedidos cujo término virtual não está à frente da fila"""
+        busy = set(self._running) | {ticket.tenant for ticket in self._waiting}
+        if not busy:
+            # Fila vazia: ninguém tem crédito a receber, o histórico de justiça não importa mais
+            self._virtual_time = max([self._virtual_time, *self._last_finish.values()])
+
+        idle = [tenant for tenant, finish in self._last_finish.items()
+                if tenant not in busy and finish <= self._virtual_time]
+        for tenant in idle:
+            del self._last_finish[tenant]
+            self._stats.pop(tenant, None)
+            if tenant in self._labelled:
+                self._labelled.discard(tenant)
+                for metric in (SCHEDULER_QUEUED, SCHEDULER_RUNNING, SCHEDULER_WAIT_SECONDS):
+                    metric.remove(scheduler=self.name, tenant=tenant)
+
+    def _record_wait(self, ticket: _Ticket):
+        wait = ticket.granted_at - ticket.enqueued_at
+        stats = self._stats.setdefault(ticket.tenant, {'served': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+        stats['served'] += 1
+        stats['wait_total'] += wait
+        stats['wait_max'] = max(stats['wait_max'], wait)
+
+
+# Chamadas à IA de todo o processo (servidor e CLI), com limite por chave de API
+llm_scheduler = FairScheduler('llm', Config.LLM_CONCURRENCY, Config.LLM_TENANT_LIMIT)
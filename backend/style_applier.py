@@ -1,13 +1,54 @@
 from docx import Document
 from docx.shared import Pt, RGBColor
 from docx.enum.style import WD_STYLE_TYPE
-from typing import List, Dict
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.styles import BabelFish
+from types import SimpleNamespace
+from typing import Iterable, List, Dict, Tuple
+from backend.docx_package import BodyStream, DocxPackage
+from backend.style_registry import style_registry
+
+# Tags pré-calculadas para a escrita direta no corpo do documento
+W_P = qn('w:p')
+W_PPR = qn('w:pPr')
+W_PSTYLE = qn('w:pStyle')
+W_VAL = qn('w:val')
+W_SECTPR = qn('w:sectPr')
+
+
+def set_paragraph_style_id(p, style_id):
+    """Define <w:pStyle> de um <w:p> em tempo constante.
+
+    Equivale a ``CT_P.style = style_id``, mas sem a busca genérica de sucessores do
+    python-docx: pPr é sempre o primeiro filho de w:p e pStyle o primeiro de pPr.
+    """
+    pPr = p[0] if len(p) and p[0].tag == W_PPR else None
+    if pPr is None:
+        if style_id is None:
+            return
+        pPr = OxmlElement('w:pPr')
+        p.insert(0, pPr)
+    
+    pStyle = pPr[0] if len(pPr) and pPr[0].tag == W_PSTYLE else None
+    if style_id is None:
+        if pStyle is not None:
+            pPr.remove(pStyle)
+        return
+    
+    if pStyle is None:
+        pStyle = OxmlElement('w:pStyle')
+        pPr.insert(0, pStyle)
+    pStyle.set(W_VAL, style_id)
+
 
 class StyleApplier:
-    def __init__(self, document_path: str):
+    def __init__(self, document_path: str, output_mode: str = 'document'):
         self.document_path = document_path
+        self.output_mode = output_mode
         self.styles_map = {}
-        print(f"StyleApplier inicializado com documento: {document_path}")
+        self.removed_ranges = []
+        print(f"StyleApplier inicializado com documento: {document_path} (modo: {output_mode})")
         
     def register_styles(self, styles: List[Dict]):
         """Registra os estilos a serem aplicados"""
@@ -17,31 +58,22 @@ class StyleApplier:
             print(f"  - Estilo registrado: {style['name']} -> {style['wordStyle']} (marker: {style['marker']})")
     
     def apply_styles(self, marked_content: List[Dict]) -> Document:
-        """Aplica estilos baseados nas marcações"""
-        print(f"\nCriando novo documento com estilos...")
-        
-        # Carrega o documento original
-        original_doc = Document(self.document_path)
-        
-        # IMPORTANTE: Salva o documento original temporariamente para preservar relações
-        import tempfile
-        import shutil
-        
-        with tempfile.NamedTemporaryFile(suffix='.docx', delete=False) as tmp:
-            original_doc.save(tmp.name)
-            temp_path = tmp.name
+        """Aplica estilos baseados nas marcações.
         
-        # Abre como novo documento (preserva todas as relações)
-        new_doc = Document(temp_path)
+        No modo 'package' retorna um DocxPackage, que só reescreve document.xml e
+        styles.xml ao salvar; no modo 'document' retorna um Document do python-docx.
+        """
+        print(f"\nCriando novo documento com estilos...")
         
-        # Remove o arquivo temporário
-        import os
-        os.unlink(temp_path)
+        # Abre o documento original (todas as relações e imagens são preservadas)
+        new_doc = self._open_document()
         
-        # Primeiro, cria TODOS os estilos definidos pelo usuário
+        # Primeiro, cria TODOS os estilos definidos pelo usuário (via modelo compilado)
         print("\nCriando estilos personalizados no documento:")
-        for marker, style_config in self.styles_map.items():
-            self._ensure_style_exists(new_doc, style_config)
+        self._apply_style_template(new_doc)
+        
+        # Resolve cada wordStyle uma única vez por job
+        resolved_styles = self._resolve_styles(new_doc)
         
         # Estatísticas
         stats = {
@@ -52,36 +84,31 @@ class StyleApplier:
         
         print(f"\nProcessando {len(marked_content)} parágrafos...")
         
-        # Carrega o documento original para copiar imagens
-        original_doc = Document(self.document_path)
-        
-        # NOVA ABORDAGEM: Modifica estilos no documento existente
-        print(f"\n  Aplicando estilos em {len(new_doc.paragraphs)} parágrafos...")
-        
-        # Aplica estilos diretamente nos parágrafos existentes
-        for i, para in enumerate(new_doc.paragraphs):
-            # Encontra o marked_content correspondente
-            marked_para = None
-            for m in marked_content:
-                if m.get('original_para_index') == i:
-                    marked_para = m
-                    break
-            
-            # Se tem marcação, aplica estilo
-            if marked_para and marked_para.get('markers') and len(marked_para['markers']) > 0:
-                for marker in marked_para['markers']:
-                    if marker in self.styles_map:
-                        style_info = self.styles_map[marker]
-                        try:
-                            para.style = new_doc.styles[style_info['wordStyle']]
-                            stats['styled'] += 1
-                            stats['by_style'][style_info['name']] = stats['by_style'].get(style_info['name'], 0) + 1
-                            
-                            if i < 30:
-                                print(f"  ✓ Parágrafo {i}: Estilo '{style_info['wordStyle']}' aplicado")
-                            break
-                        except Exception as e:
-                            print(f"  ✗ ERRO ao aplicar estilo no parágrafo {i}: {e}")
+        # Trabalha direto nos elementos <w:p> do corpo (mesma ordem de new_doc.paragraphs)
+        body_paragraphs = new_doc.element.body.p_lst
+        markers_by_para = self._index_markers(marked_content, len(body_paragraphs))
+        
+        print(f"\n  Aplicando estilos em {len(body_paragraphs)} parágrafos...")
+        
+        # Aplica estilos diretamente nos parágrafos existentes (uma única passada)
+        for i, p in enumerate(body_paragraphs):
+            markers = markers_by_para[i]
+            if not markers:
+                continue
+            
+            for marker in markers:
+                resolved = resolved_styles.get(marker)
+                if resolved is None:
+                    continue
+                
+                style_info, style_id = resolved
+                set_paragraph_style_id(p, style_id)
+                stats['styled'] += 1
+                stats['by_style'][style_info['name']] = stats['by_style'].get(style_info['name'], 0) + 1
+                
+                if i < 30:
+                    print(f"  ✓ Parágrafo {i}: Estilo '{style_info['wordStyle']}' aplicado")
+                break
         
         # Mostra estatísticas
         print(f"\n=== ESTATÍSTICAS DE APLICAÇÃO ===")
@@ -94,19 +121,93 @@ class StyleApplier:
         
         # Lista todos os estilos no documento
         print(f"\n=== ESTILOS NO DOCUMENTO ===")
+        word_styles = {s['wordStyle'] for s in self.styles_map.values()}
         for style in new_doc.styles:
-            if style.name in [s['wordStyle'] for s in self.styles_map.values()]:
+            if style.name in word_styles:
                 print(f"  ✓ {style.name} (quick_style: {style.quick_style}, hidden: {style.hidden})")
         
         return new_doc
     
-    def _ensure_style_exists(self, document: Document, style_config: Dict):
-        """Garante que um estilo existe no documento com todas as configurações"""
+    def _open_document(self):
+        """Abre o documento de saída conforme o modo configurado"""
+        if self.output_mode == 'package':
+            return DocxPackage(self.document_path)
+        return Document(self.document_path)
+    
+    def _index_markers(self, marked_content: List[Dict], total_paragraphs: int) -> List:
+        """Monta o índice parágrafo -> marcadores em uma única passada pelo marked_content"""
+        markers_by_para = [None] * total_paragraphs
+        
+        for m in marked_content:
+            para_index = m.get('original_para_index')
+            if para_index is None or not 0 <= para_index < total_paragraphs:
+                continue
+            # Mantém a primeira marcação encontrada para cada parágrafo
+            if markers_by_para[para_index] is None:
+                markers_by_para[para_index] = m.get('markers') or []
+        
+        return markers_by_para
+    
+    def _resolve_styles(self, document: Document) -> Dict[str, tuple]:
+        """Resolve marker -> (configuração, style_id) uma única vez por documento"""
+        resolved = {}
+        
+        for marker, style_info in self.styles_map.items():
+            try:
+                style = document.styles[style_info['wordStyle']]
+                style_id = document.styles.get_style_id(style, WD_STYLE_TYPE.PARAGRAPH)
+                resolved[marker] = (style_info, style_id)
+            except Exception as e:
+                print(f"  ✗ ERRO ao resolver estilo '{style_info['wordStyle']}': {e}")
+        
+        return resolved
+    
+    def _apply_style_template(self, document: Document):
+        """Insere no documento o modelo compilado para a configuração de estilos do job"""
+        try:
+            normal_style_id = document.styles['Normal'].style_id
+        except KeyError:
+            normal_style_id = 'Normal'
+        style_configs = list(self.styles_map.values())
+        key = style_registry.make_key({
+            'normal_style_id': normal_style_id,
+            'styles': [
+                {'wordStyle': config['wordStyle'], 'color': config.get('color')}
+                for config in style_configs
+            ]
+        })
+        
+        template = style_registry.get_or_compile(
+            key, lambda: self._compile_style_template(style_configs, normal_style_id)
+        )
+        skipped = style_registry.splice(document.styles.element, template)
+        
+        # Estilos que já existiam no documento são apenas atualizados
+        compiled_names = {style.name_val for style in template}
+        for style_config in style_configs:
+            style_name = BabelFish.ui2internal(style_config['wordStyle'])
+            if style_name in skipped or style_name not in compiled_names:
+                self._ensure_style_exists(document.styles, style_config)
+    
+    def _compile_style_template(self, style_configs: List[Dict], normal_style_id: str) -> List:
+        """Cria os estilos em um styles.xml vazio e retorna os elementos <w:style> gerados"""
+        scratch = style_registry.new_scratch_styles(
+            '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:style w:type="paragraph" w:default="1" w:styleId="{normal_style_id}">'
+            '<w:name w:val="Normal"/></w:style></w:styles>'
+        )
+        for style_config in style_configs:
+            self._ensure_style_exists(scratch, style_config)
+        
+        return [style for style in scratch.element.style_lst if style.name_val != 'Normal']
+    
+    def _ensure_style_exists(self, styles, style_config: Dict):
+        """Garante que um estilo existe nos estilos do documento com todas as configurações"""
         style_name = style_config['wordStyle']
         
         try:
             # Tenta criar o estilo
-            style = document.styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
+            style = styles.add_style(style_name, WD_STYLE_TYPE.PARAGRAPH)
             print(f"  ✓ Criado estilo: '{style_name}'")
             
             # Configurações essenciais para aparecer na galeria
@@ -115,7 +216,7 @@ class StyleApplier:
             style.priority = 1  # Alta prioridade
             
             # Baseado no estilo Normal
-            style.base_style = document.styles['Normal']
+            style.base_style = styles['Normal']
             
             # Aplica cor se definida
             if 'color' in style_config:
@@ -140,7 +241,7 @@ class StyleApplier:
         except ValueError as e:
             if "already in use" in str(e):
                 # Estilo já existe, vamos atualizá-lo
-                style = document.styles[style_name]
+                style = styles[style_name]
                 print(f"  ! Atualizando estilo existente: '{style_name}'")
                 
                 style.hidden = False
@@ -162,47 +263,177 @@ class StyleApplier:
             print(f"  ✗ ERRO inesperado ao criar estilo '{style_name}': {e}")
     
     def remove_marked_content(self, document: Document, marked_content: List[Dict], removal_markers: List[Dict]) -> Document:
-        """NÃO remove conteúdo - apenas retorna o documento original"""
-        print(f"\nRemoção DESABILITADA - mantendo todo o conteúdo...")
+        """Remove do corpo os intervalos marcados para remoção (capas, cartões resposta...)"""
+        print(f"\nRemovendo conteúdo marcado...")
         
-        # SIMPLESMENTE RETORNA O DOCUMENTO ORIGINAL SEM REMOVER NADA
+        if not removal_markers:
+            print("  Nenhuma regra de remoção definida - mantendo todo o conteúdo")
+            return document
+        
+        body = document.element.body
+        ranges = self.plan_removal_ranges(marked_content, removal_markers, len(body.p_lst))
+        
+        if not ranges:
+            print("  Nenhum intervalo válido para remoção - mantendo todo o conteúdo")
+            return document
+        
+        removed = self._remove_body_ranges(body, ranges)
+        self.removed_ranges = ranges
+        
+        print(f"\n  ✓ {len(ranges)} intervalo(s) removido(s): {removed} elementos do corpo")
         return document
     
+    def plan_removal_ranges(self, marked_content: List[Dict], removal_markers: List[Dict],
+                            total_paragraphs: int) -> List[tuple]:
+        """Intervalos de parágrafos a remover, já mesclados e validados"""
+        ranges = self._identify_removal_ranges(marked_content, removal_markers)
+        return self._validate_removal_ranges(ranges, total_paragraphs)
+    
+    def write_windowed(self, stream: BodyStream, target: str, markers: Iterable[Tuple[int, List[str]]],
+                       ranges: List[tuple]) -> Dict:
+        """Segunda passada do modo em janelas: grava a saída elemento a elemento.
+        
+        ``markers`` gera (parágrafo, marcadores) em ordem crescente de parágrafo e
+        ``ranges`` são os intervalos de remoção já validados (plan_removal_ranges).
+        Só styles.xml e um elemento do corpo por vez ficam em memória.
+        """
+        styles = stream.read_styles()
+        styles_doc = SimpleNamespace(styles=styles)
+        self._apply_style_template(styles_doc)
+        resolved_styles = self._resolve_styles(styles_doc)
+        
+        stats = {'total': 0, 'styled': 0, 'removed': 0, 'by_style': {}}
+        pending = iter(markers)
+        next_marked = next(pending, None)
+        para_index = -1
+        range_pos = 0
+        removing = False
+        
+        def transform(element):
+            nonlocal next_marked, para_index, range_pos, removing
+            if element.tag == W_P:
+                para_index += 1
+                stats['total'] += 1
+                if not removing and range_pos < len(ranges) and para_index == ranges[range_pos][0]:
+                    removing = True
+            elif element.tag == W_SECTPR:
+                return True
+            
+            # Mesma regra de _remove_body_ranges: tudo entre o parágrafo inicial e o final
+            if removing:
+                stats['removed'] += 1
+                if element.tag == W_P and para_index == ranges[range_pos][1]:
+                    removing = False
+                    range_pos += 1
+                return False
+            
+            if element.tag != W_P:
+                return True
+            
+            while next_marked is not None and next_marked[0] < para_index:
+                next_marked = next(pending, None)
+            if next_marked is None or next_marked[0] != para_index:
+                return True
+            
+            for marker in next_marked[1]:
+                resolved = resolved_styles.get(marker)
+                if resolved is None:
+                    continue
+                style_info, style_id = resolved
+                set_paragraph_style_id(element, style_id)
+                stats['styled'] += 1
+                stats['by_style'][style_info['name']] = stats['by_style'].get(style_info['name'], 0) + 1
+                break
+            return True
+        
+        stream.rewrite(target, transform, styles.element)
+        self.removed_ranges = ranges
+        
+        print(f"\n=== ESTATÍSTICAS DE APLICAÇÃO (em janelas) ===")
+        print(f"Total de parágrafos: {stats['total']}")
+        print(f"Parágrafos com estilo: {stats['styled']}")
+        print(f"Elementos removidos: {stats['removed']} ({len(ranges)} intervalo(s))")
+        for style_name, count in stats['by_style'].items():
+            print(f"  - {style_name}: {count}")
+        
+        return stats
+    
+    def align_marked_content(self, marked_content: List[Dict]) -> List[Dict]:
+        """Realinha as marcações aos parágrafos que sobraram após a remoção.
+        
+        A posição i da lista retornada corresponde ao parágrafo i do documento limpo;
+        parágrafos sem marcação recebem uma entrada vazia.
+        """
+        aligned = []
+        range_pos = 0
+        removed_before = 0
+        
+        for m in marked_content:
+            para_index = m.get('original_para_index')
+            if para_index is None:
+                continue
+            
+            # Avança pelos intervalos removidos que terminam antes deste parágrafo
+            while range_pos < len(self.removed_ranges) and self.removed_ranges[range_pos][1] < para_index:
+                start, end = self.removed_ranges[range_pos]
+                removed_before += end - start + 1
+                range_pos += 1
+            
+            if range_pos < len(self.removed_ranges) and self.removed_ranges[range_pos][0] <= para_index:
+                continue
+            
+            new_index = para_index - removed_before
+            while len(aligned) < new_index:
+                aligned.append({'markers': []})
+            if len(aligned) == new_index:
+                aligned.append(m)
+        
+        return aligned
+    
     def _identify_removal_ranges(self, marked_content: List[Dict], removal_markers: List[Dict]) -> List[tuple]:
-        """Identifica intervalos de parágrafos a serem removidos"""
+        """Identifica intervalos de parágrafos a serem removidos em uma única varredura.
+        
+        Cada regra pode gerar vários intervalos (ex.: um cartão resposta por simulado).
+        Os intervalos usam o índice do parágrafo no corpo (original_para_index).
+        """
         ranges = []
         
+        # marcador -> regras que ele abre/fecha
+        rules_by_start = {}
+        rules_by_end = {}
+        for rule_idx, removal in enumerate(removal_markers):
+            rules_by_start.setdefault(removal['startMarker'], []).append(rule_idx)
+            rules_by_end.setdefault(removal['endMarker'], []).append(rule_idx)
+        
+        open_starts = [None] * len(removal_markers)
+        
         print("\n  Procurando marcadores de remoção:")
         
-        for removal in removal_markers:
-            start_marker = removal['startMarker']
-            end_marker = removal['endMarker']
-            
-            print(f"    Procurando por '{removal['name']}' ({start_marker} / {end_marker})...")
+        for para in marked_content:
+            markers = para.get('markers')
+            para_index = para.get('original_para_index')
+            if not markers or para_index is None:
+                continue
             
-            start_idx = None
+            for marker in markers:
+                for rule_idx in rules_by_start.get(marker, ()):
+                    if open_starts[rule_idx] is None:
+                        open_starts[rule_idx] = para_index
+                        print(f"      ✓ Início de '{removal_markers[rule_idx]['name']}' no parágrafo {para_index}: {para.get('text', '')[:50]}...")
             
-            for i, para in enumerate(marked_content):
-                markers = para.get('markers', [])
-                
-                # Debug: mostra quando encontra marcadores
-                if markers and (start_marker in markers or end_marker in markers):
-                    print(f"      Parágrafo {i} tem marcadores: {markers}")
-                
-                if start_marker in markers and start_idx is None:
-                    start_idx = i
-                    print(f"      ✓ Início encontrado no parágrafo {i}: {para.get('text', '')[:50]}...")
-                
-                if end_marker in markers and start_idx is not None:
-                    ranges.append((start_idx, i))
-                    print(f"      ✓ Fim encontrado no parágrafo {i}: {para.get('text', '')[:50]}...")
-                    print(f"      → Intervalo adicionado: {start_idx} até {i} ({i - start_idx + 1} parágrafos)")
-                    start_idx = None
-                    break  # Para após encontrar o fim
-            
-            # Se encontrou início mas não fim
+            for marker in markers:
+                for rule_idx in rules_by_end.get(marker, ()):
+                    start_idx = open_starts[rule_idx]
+                    if start_idx is not None:
+                        ranges.append((start_idx, para_index))
+                        open_starts[rule_idx] = None
+                        print(f"      ✓ Fim de '{removal_markers[rule_idx]['name']}' no parágrafo {para_index}: {para.get('text', '')[:50]}...")
+                        print(f"      → Intervalo adicionado: {start_idx} até {para_index} ({para_index - start_idx + 1} parágrafos)")
+        
+        # Se encontrou início mas não fim
+        for rule_idx, start_idx in enumerate(open_starts):
             if start_idx is not None:
-                print(f"      ⚠️ AVISO: Início encontrado no parágrafo {start_idx} mas sem marcador de fim!")
+                print(f"      ⚠️ AVISO: Início de '{removal_markers[rule_idx]['name']}' no parágrafo {start_idx} mas sem marcador de fim!")
         
         return ranges
     
@@ -215,18 +446,20 @@ class StyleApplier:
             print(f"  ⚠️ Aviso ao preparar cópia de mídia: {e}")
     
     def _validate_removal_ranges(self, ranges: List[tuple], total_elements: int) -> List[tuple]:
-        """Valida e ajusta os intervalos de remoção para evitar remoção excessiva"""
+        """Valida, limita e mescla os intervalos de remoção para evitar remoção excessiva.
+        
+        O limite de tamanho vale para cada intervalo encontrado, antes da mesclagem:
+        vários intervalos válidos vizinhos não são descartados por somarem mais que o limite.
+        """
         if not ranges:
             return ranges
         
         print("\n  Validando intervalos de remoção:")
         
-        # Remove sobreposições e intervalos inválidos
-        validated = []
-        
+        valid = []
         for start, end in sorted(ranges):
             # Valida intervalo
-            if start < 0 or end >= total_elements:
+            if start < 0 or end >= total_elements or start > end:
                 print(f"    ⚠️ Intervalo inválido ignorado: {start}-{end} (total de elementos: {total_elements})")
                 continue
             
@@ -235,19 +468,54 @@ class StyleApplier:
             if interval_size > total_elements * 0.5:
                 print(f"    ⚠️ Intervalo muito grande ({interval_size} de {total_elements} elementos)!")
                 print(f"       Limitando remoção para proteger o conteúdo...")
-                # Você pode ajustar ou pular este intervalo
                 continue
             
-            # Verifica sobreposição com intervalos já validados
-            overlap = False
-            for v_start, v_end in validated:
-                if not (end < v_start or start > v_end):
-                    overlap = True
-                    print(f"    ⚠️ Intervalo {start}-{end} sobrepõe com {v_start}-{v_end}")
-                    break
+            valid.append((start, end))
+        
+        # Mescla intervalos sobrepostos ou adjacentes em uma passada sobre a lista ordenada
+        merged = []
+        for start, end in valid:
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        
+        validated = []
+        for start, end in merged:
+            validated.append((start, end))
+            print(f"    ✓ Intervalo validado: {start}-{end} ({end - start + 1} parágrafos)")
+        
+        return validated
+    
+    def _remove_body_ranges(self, body, ranges: List[tuple]) -> int:
+        """Remove os elementos do corpo cobertos pelos intervalos em uma única passada.
+        
+        Os intervalos são de parágrafos; tabelas e outros elementos entre o parágrafo
+        inicial e o final também são removidos. O <w:sectPr> final nunca é removido.
+        """
+        to_remove = []
+        range_pos = 0
+        para_index = -1
+        removing = False
+        
+        for element in body.iterchildren():
+            if range_pos >= len(ranges):
+                break
             
-            if not overlap:
-                validated.append((start, end))
-                print(f"    ✓ Intervalo validado: {start}-{end} ({interval_size} parágrafos)")
+            if element.tag == W_P:
+                para_index += 1
+                if not removing and para_index == ranges[range_pos][0]:
+                    removing = True
+            elif element.tag == W_SECTPR:
+                continue
+            
+            if removing:
+                to_remove.append(element)
+                if element.tag == W_P and para_index == ranges[range_pos][1]:
+                    removing = False
+                    range_pos += 1
+        
+        for element in to_remove:
+            body.remove(element)
         
-        return validated
\ No newline at end of file
+        return len(to_remove)
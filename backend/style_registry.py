@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from copy import deepcopy
+from typing import Callable, List, Set
+from docx.oxml import parse_xml
+from docx.opc.oxml import serialize_part_xml
+from docx.styles.styles import Styles
+from backend.config import Config
+from backend.metrics import CACHE_REQUESTS
+
+# Incrementar quando a forma de compilar os estilos mudar (invalida o cache em disco)
+TEMPLATE_VERSION = 1
+
+EMPTY_STYLES_XML = (
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"/>'
+)
+
+
+class StyleTemplateRegistry:
+    """Registro de modelos de estilo compilados.
+
+    Um modelo é a lista de elementos <w:style> gerada uma vez para uma configuração
+    de estilos e guardada em memória e em disco, indexada pelo hash da configuração.
+    Jobs seguintes com a mesma configuração só inserem cópias desses elementos no
+    styles.xml de saída, sem recriar estilo nenhum. Os arquivos em disco são apagados
+    por ``sweep`` (chamado pelo varredor de retenção).
+    """
+
+    def __init__(self, cache_dir: str = None, max_files: int = None, max_age: float = None):
+        self.cache_dir = cache_dir or Config.STYLE_CACHE_DIR
+        self.max_files = Config.STYLE_CACHE_MAX_FILES if max_files is None else max_files
+        self.max_age = Config.STYLE_CACHE_MAX_AGE if max_age is None else max_age
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(material) -> str:
+        """Hash canônico (JSON ordenado) do que define o modelo"""
+        canonical = json.dumps(
+            {'version': TEMPLATE_VERSION, 'material': material},
+            sort_keys=True, ensure_ascii=False, separators=(',', ':')
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def new_scratch_styles(base_xml: str = EMPTY_STYLES_XML) -> Styles:
+        """Cria um styles.xml vazio (ou a partir de base_xml) para compilar um modelo"""
+        return Styles(parse_xml(base_xml))
+
+    def get_or_compile(self, key: str, compile_fn: Callable[[], List]) -> List:
+        """Retorna os elementos <w:style> do modelo, compilando apenas na primeira vez"""
+        with self._lock:
+            template = self._templates.get(key)
+        if template is not None:
+            CACHE_REQUESTS.inc(cache='style_template', outcome='hit')
+            return template
+
+        template = self._load_from_disk(key)
+        if template is None:
+            template = compile_fn()
+            self._save_to_disk(key, template)
+            CACHE_REQUESTS.inc(cache='style_template', outcome='miss')
+            print(f"  ✓ Modelo de estilos compilado ({key[:12]})")
+        else:
+            CACHE_REQUESTS.inc(cache='style_template', outcome='disk')
+            print(f"  ✓ Modelo de estilos carregado do disco ({key[:12]})")
+
+        with self._lock:
+            self._templates.setdefault(key, template)
+        return template
+
+    def splice(self, styles_element, template: List) -> Set[str]:
+        """Insere cópias do modelo no styles.xml de destino.
+
+        Estilos cujo nome já existe no destino não são tocados; seus nomes (internos)
+        são retornados para que o chamador decida como atualizá-los. Se o ``w:styleId``
+        da cópia já é usado por outro estilo do destino, a cópia recebe um id livre
+        (os parágrafos referenciam o estilo pelo id resolvido a partir do nome).
+        """
+        existing_names = {style.name_val for style in styles_element.style_lst}
+        existing_ids = {style.styleId for style in styles_element.style_lst}
+        skipped = set()
+
+        for style in template:
+            if style.name_val in existing_names:
+                skipped.add(style.name_val)
+                continue
+            style_copy = deepcopy(style)
+            if style_copy.styleId in existing_ids:
+                style_copy.styleId = self._free_style_id(style_copy.styleId, existing_ids)
+            styles_element.append(style_copy)
+            existing_names.add(style_copy.name_val)
+            existing_ids.add(style_copy.styleId)
+
+        return skipped
+
+    @staticmethod
+    def _free_style_id(style_id: str, existing_ids: Set[str]) -> str:
+        suffix = 2
+        while f"{style_id}{suffix}" in existing_ids:
+            suffix += 1
+        return f"{style_id}{suffix}"
+
+    def _template_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.xml")
+
+    def _load_from_disk(self, key: str):
+        path = self._template_path(key)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, 'rb') as f:
+                template = list(parse_xml(f.read()).style_lst)
+            # A data de modificação marca o último uso (ver sweep)
+            os.utime(path)
+            return template
+        except Exception as e:
+            print(f"  ⚠️ Modelo de estilos corrompido no cache ({key[:12]}): {e}")
+            return None
+
+    def _save_to_disk(self, key: str, template: List):
+        container = parse_xml(EMPTY_STYLES_XML)
+        for style in template:
+            container.append(deepcopy(style))
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = self._template_path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(serialize_part_xml(container))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"  ⚠️ Não foi possível gravar o modelo de estilos em disco: {e}")
+
+    def sweep(self) -> int:
+        """Apaga do disco os modelos sem uso há mais de ``max_age`` e, acima de ``max_files``, os menos usados.
+
+        O último uso é a data de modificação do arquivo (gravação ou carga do disco).
+        Modelos já em memória continuam valendo; os apagados são recompilados quando
+        pedidos de novo. Retorna quantos arquivos foram apagados.
+        """
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return 0
+
+        entries = []
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        entries.sort()
+
+        cutoff = time.time() - self.max_age if self.max_age else None
+        excess = len(entries) - self.max_files if self.max_files else 0
+        removed = 0
+        # Do mais antigo ao mais novo: expirados e, depois, o excesso sobre max_files
+        for position, (mtime, path) in enumerate(entries):
+            if position >= excess and (cutoff is None or mtime >= cutoff):
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+
+        return removed
+
+
+# Registro compartilhado pelo processo (servidor, CLI e workers)
+style_registry = StyleTemplateRegistry()
@@ -0,0 +1,165 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List
+
+# tracemalloc é global do processo: liga no primeiro job que pede e desliga no último
+_tracemalloc_users = 0
+_tracemalloc_lock = threading.Lock()
+
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc():
+    global _tracemalloc_users
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class _Span:
+    __slots__ = ('name', 'start', 'seconds', 'peak', 'children')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.seconds = None
+        self.peak = 0
+        self.children: List['_Span'] = []
+
+    def to_dict(self) -> Dict:
+        span = {'name': self.name, 'seconds': round(self.seconds or 0, 4)}
+        if self.peak:
+            span['peak_memory_mb'] = round(self.peak / 1024 / 1024, 2)
+        if self.children:
+            span['children'] = [child.to_dict() for child in self.children]
+        return span
+
+
+class PipelineTracer:
+    """Spans das etapas de um processamento, com memória e profiling opcionais.
+
+    As etapas são sequenciais: ``enter_stage`` fecha a etapa atual e abre a próxima
+    (o ProgressMonitor chama isso a cada troca de etapa). ``span`` mede trechos
+    dentro da etapa atual. Sem ``memory``/``profile`` o custo é um perf_counter por
+    span. Com ``memory``, cada span registra o pico do tracemalloc (que é global do
+    processo: com jobs simultâneos o pico inclui a memória dos outros). Com
+    ``profile``, um cProfile cobre a thread do job.
+    """
+
+    def __init__(self, memory: bool = False, profile: bool = False):
+        self.memory = memory
+        self.profile = profile
+        self.stages: List[_Span] = []
+        self._stack: List[_Span] = []
+        self._profiler = None
+        self._started = False
+        self._finished = False
+
+    def start(self):
+        if self._started:
+            return
+        self._started = True
+        if self.memory:
+            _acquire_tracemalloc()
+            tracemalloc.reset_peak()
+        if self.profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def enter_stage(self, name: str):
+        """Fecha a etapa atual (e spans abertos) e inicia a próxima"""
+        if self._finished:
+            return
+        self.start()
+        while self._stack:
+            self._close(self._stack.pop())
+        stage = self._open(name)
+        self.stages.append(stage)
+        self._stack.append(stage)
+
+    @contextmanager
+    def span(self, name: str):
+        """Mede um trecho dentro da etapa (ou span) atual"""
+        span = self._open(name)
+        if self._stack:
+            self._stack[-1].children.append(span)
+        else:
+            self.stages.append(span)
+        self._stack.append(span)
+        try:
+            yield span
+        finally:
+            if self._stack and self._stack[-1] is span:
+                self._stack.pop()
+                self._close(span)
+
+    def record(self, name: str, seconds: float):
+        """Anexa à etapa atual um tempo medido em outro lugar (ex.: soma de várias threads)"""
+        span = _Span(name)
+        span.seconds = seconds
+        (self._stack[-1].children if self._stack else self.stages).append(span)
+
+    def finish(self) -> Dict:
+        """Encerra spans, memória e profiler; retorna o relatório para ``details``"""
+        if not self._finished:
+            self._finished = True
+            while self._stack:
+                self._close(self._stack.pop())
+            if self._profiler is not None:
+                self._profiler.disable()
+            if self.memory and self._started:
+                _release_tracemalloc()
+
+        return {
+            'spans': [stage.to_dict() for stage in self.stages],
+            'memory_traced': self.memory,
+            'profiled': self.profile,
+        }
+
+    def save_profile(self, directory: str, basename: str) -> str:
+        """Grava o perfil (.prof do pstats + resumo .txt); retorna o caminho do .prof"""
+        if self._profiler is None:
+            return None
+
+        os.makedirs(directory, exist_ok=True)
+        prof_path = os.path.join(directory, f"{basename}_profile.prof")
+        self._profiler.dump_stats(prof_path)
+
+        summary = io.StringIO()
+        pstats.Stats(self._profiler, stream=summary).sort_stats('cumulative').print_stats(60)
+        with open(os.path.join(directory, f"{basename}_profile.txt"), 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+
+        return prof_path
+
+    def _open(self, name: str) -> _Span:
+        span = _Span(name)
+        if self.memory and tracemalloc.is_tracing():
+            # O pico até aqui pertence ao span pai; o filho mede a partir de agora
+            if self._stack:
+                parent = self._stack[-1]
+                parent.peak = max(parent.peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        return span
+
+    def _close(self, span: _Span):
+        span.seconds = time.perf_counter() - span.start
+        if self.memory and tracemalloc.is_tracing():
+            span.peak = max(span.peak, tracemalloc.get_traced_memory()[1],
+                            *(child.peak for child in span.children))
+            if self._stack:
+                parent = self._stack[-1]
+                parent.peak = max(parent.peak, span.peak)
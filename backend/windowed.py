@@ -0,0 +1,128 @@
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+from backend.document_reader import DocumentReader
+from backend.docx_package import BodyStream
+
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+W_SECTPR = qn('w:sectPr')
+
+CORE_PROPERTIES_PART = 'docProps/core.xml'
+
+
+class WindowedReader:
+    """Lê o corpo do documento em janelas de elementos, sem abrir o Document inteiro.
+
+    Produz os mesmos elementos do DocumentReader (via ``describe_paragraph`` e
+    ``describe_table``), mas com as tabelas na posição em que aparecem e só uma
+    janela por vez em memória. As contagens de ``get_document_info`` ficam
+    completas depois que todas as janelas forem lidas.
+    """
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.stream = BodyStream(file_path)
+
+        # styleId -> nome, como o python-docx resolve para.style.name
+        self.style_names, self.default_style = DocumentReader.paragraph_style_names(self.stream.read_styles())
+
+        self.counts = {'paragraphs': 0, 'images': 0, 'tables': 0, 'sections': 1}
+
+    @property
+    def progress(self) -> float:
+        """Fração de document.xml já lida"""
+        return self.stream.bytes_read / max(self.stream.xml_size, 1)
+
+    def iter_windows(self, window: int) -> Iterator[List[Dict]]:
+        """Gera listas de até ``window`` elementos do corpo, na ordem do documento"""
+        elements = []
+        para_index = 0
+        element_index = 0
+
+        for element in self.stream.iter_elements():
+            if element.tag == W_P:
+                style_id = element.style
+                described = DocumentReader.describe_paragraph(
+                    Paragraph(element, None), para_index, element_index,
+                    self.style_names.get(style_id, self.default_style) if style_id else self.default_style
+                )
+                para_index += 1
+                self.counts['paragraphs'] += 1
+                self.counts['images'] += described['has_image']
+                # Quebras de seção no meio do corpo ficam no pPr do último parágrafo da seção
+                if element.pPr is not None and element.pPr.find(W_SECTPR) is not None:
+                    self.counts['sections'] += 1
+            elif element.tag == W_TBL:
+                self.counts['tables'] += 1
+                described = DocumentReader.describe_table(Table(element, None), element_index)
+                if described is None:
+                    continue
+                # O elemento é descartado ao fim da leitura: não guardar referência
+                described.pop('original_element', None)
+            else:
+                continue
+
+            elements.append(described)
+            element_index += 1
+            if len(elements) >= window:
+                yield elements
+                elements = []
+
+        if elements:
+            yield elements
+
+    def get_document_info(self) -> Dict:
+        """Mesmo formato de DocumentReader.get_document_info (após a leitura)"""
+        core = self.stream.read_part(CORE_PROPERTIES_PART)
+        return {
+            'total_paragraphs': self.counts['paragraphs'],
+            'total_images': self.counts['images'],
+            'total_tables': self.counts['tables'],
+            'total_sections': self.counts['sections'],
+            'core_properties': {
+                'author': core.author_text if core is not None else None,
+                'created': str(core.created_datetime) if core is not None and core.created_datetime else None,
+                'modified': str(core.modified_datetime) if core is not None and core.modified_datetime else None,
+                'title': core.title_text if core is not None else None,
+            }
+        }
+
+
+class MarkerSpool:
+    """Marcadores dos parágrafos gravados em disco entre a leitura e a escrita.
+
+    A primeira passada grava uma linha por parágrafo marcado; a segunda lê as linhas
+    na mesma ordem. Assim nenhuma das passadas guarda as marcações do documento
+    inteiro em memória.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def write(self, para_index: int, markers: List[str]):
+        self._file.write(json.dumps([para_index, markers], ensure_ascii=False) + '\n')
+        self.count += 1
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __iter__(self) -> Iterator[Tuple[int, List[str]]]:
+        self.close()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                para_index, markers = json.loads(line)
+                yield para_index, markers
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
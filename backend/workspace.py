@@ -0,0 +1,164 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from backend.config import Config
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Prefixo do id usado como pasta intermediária (<raiz>/<ab>/<abcd...>), até 256 pastas
+SHARD_PREFIX_LENGTH = 2
+
+
+class WorkspaceQuotaExceeded(Exception):
+    """Job ultrapassou a cota de disco do seu workspace"""
+
+
+class UploadTooLarge(Exception):
+    """Arquivo enviado maior que Config.MAX_FILE_SIZE"""
+
+
+class UploadStream:
+    """Destino de um upload gravado direto na pasta do job, à medida que chega.
+
+    Usado como stream de arquivo pelo parser multipart: cada bloco é contabilizado
+    na cota, entra no SHA-256 e é gravado em disco, sem cópia intermediária em
+    memória ou em arquivo temporário. Passar de ``max_bytes`` interrompe o upload.
+    """
+
+    def __init__(self, workspace: 'JobWorkspace', file_path: str, max_bytes: int):
+        self.workspace = workspace
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = open(file_path, 'w+b')
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise UploadTooLarge(
+                f"Arquivo maior que o limite de {self.max_bytes / 1024 / 1024:.0f} MB"
+            )
+        self.workspace.charge(len(data))
+        self._digest.update(data)
+        return self._file.write(data)
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def finish(self, record_hash: bool = True) -> str:
+        """Fecha o arquivo e (com ``record_hash``) registra o hash no workspace; retorna o caminho"""
+        self._file.close()
+        if record_hash:
+            self.workspace.upload_sha256 = self.sha256
+        return self.file_path
+
+    def __getattr__(self, name):
+        # seek/read/close/... vão para o arquivo (o parser chama seek(0) ao final)
+        return getattr(self._file, name)
+
+
+class JobWorkspace:
+    """Diretórios isolados de um job: upload, temporários e saída.
+
+    Cada job recebe um id único e pastas próprias dentro de UPLOAD_DIR, TEMP_DIR e
+    OUTPUT_DIR (``<raiz>/<2 primeiros caracteres do id>/<id>``), de modo que jobs
+    simultâneos (mesmo com arquivos de nome igual) não se sobrescrevem e a limpeza
+    de um job não apaga os arquivos de outro.
+
+    A cota é contabilizada pelos bytes que o próprio job grava através de
+    ``charge`` (upload e arquivos de saída), sem varrer o disco.
+    """
+
+    def __init__(self, job_id: str = None, quota_bytes: int = None):
+        self.job_id = job_id or uuid.uuid4().hex
+        self.quota_bytes = Config.JOB_DISK_QUOTA if quota_bytes is None else quota_bytes
+        self.used_bytes = 0
+        self.upload_sha256 = None
+        self._lock = threading.Lock()
+
+        self.upload_dir = self._sharded(Config.UPLOAD_DIR)
+        self.temp_dir = self._sharded(Config.TEMP_DIR)
+        self.output_dir = self._sharded(Config.OUTPUT_DIR)
+
+        for directory in [self.upload_dir, self.temp_dir, self.output_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+    def __enter__(self) -> 'JobWorkspace':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Em caso de erro nada do job é mantido; em caso de sucesso a saída fica para download
+        self.cleanup(keep_output=exc_type is None)
+        return False
+
+    def _sharded(self, root: str) -> str:
+        """Pasta do job sob um shard, para nenhum diretório crescer sem limite"""
+        return os.path.join(root, self.job_id[:SHARD_PREFIX_LENGTH], self.job_id)
+
+    def charge(self, nbytes: int):
+        """Contabiliza bytes gravados pelo job, falhando se a cota for excedida"""
+        with self._lock:
+            self.used_bytes += nbytes
+            used = self.used_bytes
+
+        if self.quota_bytes and used > self.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Cota de disco do job excedida: {used / 1024 / 1024:.1f} MB "
+                f"(limite {self.quota_bytes / 1024 / 1024:.1f} MB)"
+            )
+
+    def save_upload(self, file_storage, filename: str, record_hash: bool = True) -> str:
+        """Grava o upload na pasta do job em blocos, respeitando a cota.
+
+        O SHA-256 do conteúdo é calculado durante a gravação (``upload_sha256``,
+        com ``record_hash``; anexos como o arquivo de marcações não o alteram).
+        """
+        file_path = os.path.join(self.upload_dir, filename)
+        digest = hashlib.sha256()
+
+        with open(file_path, 'wb') as f:
+            while True:
+                chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.charge(len(chunk))
+                digest.update(chunk)
+                f.write(chunk)
+
+        if record_hash:
+            self.upload_sha256 = digest.hexdigest()
+        return file_path
+
+    def open_upload(self, filename: str, max_bytes: int = None) -> UploadStream:
+        """Abre o destino de um upload em streaming (ver UploadStream)"""
+        file_path = os.path.join(self.upload_dir, filename)
+        # Nomes repetidos na mesma requisição não se sobrescrevem
+        base, ext = os.path.splitext(file_path)
+        counter = 1
+        while os.path.exists(file_path):
+            file_path = f"{base}_{counter}{ext}"
+            counter += 1
+
+        return UploadStream(self, file_path, Config.MAX_FILE_SIZE if max_bytes is None else max_bytes)
+
+    def adopt_upload(self, stream: UploadStream) -> str:
+        """Move para este job um upload recebido no workspace de outro (ex.: lote)"""
+        source_path = stream.finish()
+        file_path = os.path.join(self.upload_dir, os.path.basename(source_path))
+        os.replace(source_path, file_path)
+
+        self.charge(stream.size)
+        self.upload_sha256 = stream.sha256
+        return file_path
+
+    def cleanup(self, keep_output: bool = True):
+        """Remove os diretórios do job (a saída só se keep_output=False)"""
+        directories = [self.upload_dir, self.temp_dir]
+        if not keep_output:
+            directories.append(self.output_dir)
+
+        for directory in directories:
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,7 @@
+"""
+Benchmarks do pipeline de documentos (sem a etapa de IA)
+
+    python -m benchmarks.corpus saida.docx --paragraphs 10000 --seed 1
+    python -m benchmarks.runner --sizes 100,1000,10000 --output base.json
+    python -m benchmarks.runner --sizes 100,1000,10000 --compare base.json
+"""
@@ -0,0 +1,164 @@
+import argparse
+import io
+import os
+import random
+import struct
+import zlib
+from copy import deepcopy
+from typing import Dict
+from docx import Document
+from docx.oxml.ns import qn
+from docx.shared import Inches
+
+# Incrementar quando o documento gerado mudar (invalida os corpora em cache)
+GENERATOR_VERSION = 1
+
+LETTERS = 'ABCDE'
+IMAGE_COLORS = [(220, 38, 38), (37, 99, 235), (22, 163, 74)]
+COVER_LINES = [
+    'CAPA',
+    'Livro de Simulados - Edição de Referência',
+    'Instruções: leia atentamente cada questão antes de responder.',
+    'Fim da capa',
+]
+# Elementos por questão: enunciado, alternativas e a linha do gabarito
+ELEMENTS_PER_QUESTION = 1 + len(LETTERS) + 1
+IMAGE_PROBABILITY = 1 / 12
+TABLE_PROBABILITY = 1 / 20
+
+WORDS = (
+    'análise texto autor afirma conforme trecho sentido frase período oração termo '
+    'função sintática semântica coesão coerência argumento tese conclusão premissa '
+    'gráfico tabela dados valor razão proporção equação função reta ponto área volume '
+    'processo histórico contexto social econômico político cultural território região '
+    'energia força movimento velocidade massa reação substância elemento célula tecido '
+    'considere assinale alternativa correta incorreta exceto apenas somente ambas todas'
+).split()
+
+W_T = qn('w:t')
+
+
+def generate_exam_document(path: str, paragraphs: int = 1000, seed: int = 0, simulados: int = None) -> Dict:
+    """Gera um .docx de prova sintético e determinístico (mesma semente, mesmo documento).
+
+    O documento tem uma capa, ``simulados`` títulos "Simulado N" (Heading 1), questões
+    numeradas com alternativas A) a E), imagens inline e tabelas esporádicas e, ao fim
+    de cada simulado, o gabarito. ``paragraphs`` é o total aproximado de elementos do
+    corpo. Retorna as contagens do que foi gerado.
+    """
+    rng = random.Random(seed)
+    simulados = simulados or max(1, min(50, paragraphs // 400))
+    fixed = len(COVER_LINES) + 2 * simulados  # capa, títulos e cabeçalhos de gabarito
+    extra_per_question = IMAGE_PROBABILITY + TABLE_PROBABILITY
+    questions = max(simulados, round((paragraphs - fixed) / (ELEMENTS_PER_QUESTION + extra_per_question)))
+
+    doc = Document()
+    body = doc.element.body
+    templates = _build_templates(doc)
+    sect_pr = body[-1]
+    stats = {'paragraphs': 0, 'tables': 0, 'images': 0, 'simulados': simulados, 'questions': questions,
+             'seed': seed, 'generator_version': GENERATOR_VERSION}
+
+    def emit(name: str, *texts: str):
+        element = deepcopy(templates[name])
+        for node, text in zip(element.iter(W_T), texts):
+            node.text = text
+        # Inserir antes do sectPr é O(1); doc.add_paragraph busca o sectPr a cada chamada
+        sect_pr.addprevious(element)
+        if name == 'table':
+            stats['tables'] += 1
+        else:
+            stats['paragraphs'] += 1
+            stats['images'] += name.startswith('image')
+
+    for line in COVER_LINES:
+        emit('plain', line)
+
+    for number in range(1, simulados + 1):
+        count = questions // simulados + (1 if number <= questions % simulados else 0)
+        emit('title', f'Simulado {number}')
+
+        answers = []
+        for question in range(1, count + 1):
+            emit('question', f'{question}. {_sentence(rng, 12, 30)}?')
+            if rng.random() < IMAGE_PROBABILITY:
+                emit(f'image{rng.randrange(len(IMAGE_COLORS))}')
+            if rng.random() < TABLE_PROBABILITY:
+                emit('table', *(_sentence(rng, 1, 3) for _ in range(9)))
+            for letter in LETTERS:
+                emit('plain', f'{letter}) {_sentence(rng, 4, 12)}')
+            answers.append(rng.choice(LETTERS))
+
+        emit('question', 'Gabarito')
+        for question, letter in enumerate(answers, 1):
+            emit('plain', f'Resposta: {question} - {letter}')
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    doc.save(path)
+    return stats
+
+
+def _build_templates(doc) -> Dict:
+    """Cria um exemplar de cada tipo de elemento e o tira do corpo (será copiado)"""
+    templates = {
+        'title': doc.add_paragraph('x', style='Heading 1')._p,
+        'plain': doc.add_paragraph('x')._p,
+    }
+
+    question = doc.add_paragraph()
+    question.add_run('x').bold = True
+    templates['question'] = question._p
+
+    # Poucas imagens distintas, repetidas pelo documento (como logotipos e figuras)
+    for i, color in enumerate(IMAGE_COLORS):
+        paragraph = doc.add_paragraph()
+        paragraph.add_run().add_picture(io.BytesIO(_solid_png(color)), width=Inches(1.5))
+        templates[f'image{i}'] = paragraph._p
+
+    table = doc.add_table(rows=3, cols=3)
+    for cell in table._cells:
+        cell.text = 'x'
+    templates['table'] = table._tbl
+
+    for element in templates.values():
+        element.getparent().remove(element)
+    return templates
+
+
+def _sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize()
+
+
+def _solid_png(color, size: int = 32) -> bytes:
+    """PNG RGB de cor sólida, sem depender de bibliotecas de imagem"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    row = b'\x00' + bytes(color) * size
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * size))
+            + chunk(b'IEND', b''))
+
+
+def corpus_path(directory: str, paragraphs: int, seed: int) -> str:
+    """Caminho do corpus em cache para o tamanho/semente (e versão do gerador)"""
+    return os.path.join(directory, f'exam_{paragraphs}_s{seed}_v{GENERATOR_VERSION}.docx')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera um .docx de prova sintético para benchmarks')
+    parser.add_argument('output', help='Arquivo .docx de saída')
+    parser.add_argument('--paragraphs', type=int, default=1000, help='Total aproximado de elementos do corpo')
+    parser.add_argument('--seed', type=int, default=0, help='Semente (mesma semente, mesmo documento)')
+    parser.add_argument('--simulados', type=int, help='Quantidade de simulados (padrão: 1 a cada 400 elementos)')
+    args = parser.parse_args()
+
+    stats = generate_exam_document(args.output, args.paragraphs, args.seed, args.simulados)
+    print(f"✓ {args.output}: {stats['paragraphs']} parágrafos, {stats['tables']} tabelas, "
+          f"{stats['images']} imagens, {stats['simulados']} simulados")
+
+
+if __name__ == '__main__':
+    main()
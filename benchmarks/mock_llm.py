@@ -0,0 +1,387 @@
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+CHARS_PER_TOKEN = 4
+
+# Prompts montados pelo AIProcessor (_build_system_prompt, _build_user_prompt e segunda passada)
+STYLE_PATTERN = re.compile(r'^- (?P<name>[^:\n]+): (?P<prompt>.*)\n\s+Marcador(?: a usar)?: (?P<marker>\[\[[^\]]+\]\])',
+                           re.MULTILINE)
+REMOVAL_PATTERN = re.compile(r'^- (?P<name>[^:\n]+): (?P<prompt>.*)\n\s+Marcadores: (?P<start>\[\[[^\]]+\]\]) \(início\) '
+                             r'e (?P<end>\[\[[^\]]+\]\]) \(fim\)', re.MULTILINE)
+PARAGRAPH_PATTERN = re.compile(r'^Parágrafo (?P<index>\d+):\n(?P<text>.*?)(?=\n\n)', re.MULTILINE | re.DOTALL)
+FOCUSED_PATTERN = re.compile(r'^--- CONTEXTO DO PARÁGRAFO (?P<index>\d+) ---\n.*?\n>>> ATUAL \[NÃO MARCADO\]: (?P<text>.*)$',
+                             re.MULTILINE)
+
+# Regras de texto -> palavras que identificam o estilo pelo nome ou pelo prompt
+TEXT_RULES = [
+    (re.compile(r'^(resposta|gabarito)\b', re.IGNORECASE), ('gabarito', 'resposta')),
+    (re.compile(r'^[a-e]\)\s', re.IGNORECASE), ('alternativa',)),
+    (re.compile(r'^\d+[.)]\s'), ('questão', 'questao', 'enunciado')),
+    (re.compile(r'^simulado\s+\d+', re.IGNORECASE), ('título', 'titulo', 'simulado')),
+]
+
+# Remoção (só em parágrafos sem estilo): a seção começa na linha que abre com o seu
+# nome (ex.: "CAPA") e termina na linha "Fim da <nome>"
+REMOVAL_END_PREFIX = r'fim\s+d[aoe]s?\s+'
+
+
+class MockBehavior:
+    """Comportamento do servidor falso: latência, limites e falhas injetadas.
+
+    Latência em ms: normal(``latency_ms``, ``jitter_ms``), com cauda de ``tail_ms``
+    em ``tail_rate`` das respostas. Limites por minuto de requisições (``rpm``) e
+    tokens estimados (``tpm``), 0 = sem limite; acima deles responde 429 com
+    ``Retry-After``. As taxas (0 a 1) sorteiam erros 500/503, conteúdo truncado
+    (``finish_reason: length``) e JSON malformado.
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, tail_rate: float = 0, tail_ms: float = 0,
+                 rpm: int = 0, tpm: int = 0, error_rate: float = 0, truncate_rate: float = 0,
+                 malformed_rate: float = 0, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_rate = tail_rate
+        self.tail_ms = tail_ms
+        self.rpm = rpm
+        self.tpm = tpm
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def to_dict(self) -> Dict:
+        return {name: value for name, value in vars(self).items() if not name.startswith('_') and name != 'rng'}
+
+    def draw(self) -> float:
+        with self._rng_lock:
+            return self.rng.random()
+
+    def latency(self) -> float:
+        """Atraso sorteado da resposta, em segundos"""
+        with self._rng_lock:
+            delay = self.rng.gauss(self.latency_ms, self.jitter_ms) if self.jitter_ms else self.latency_ms
+            if self.tail_rate and self.rng.random() < self.tail_rate:
+                delay += self.tail_ms
+        return max(0.0, delay) / 1000
+
+
+class RateLimiter:
+    """Janela deslizante de 60 s para requisições e tokens, como os limites da OpenAI"""
+
+    WINDOW = 60.0
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests: List[Tuple[float, int]] = []
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> Tuple[bool, Dict[str, str], float]:
+        """Tenta consumir uma requisição; retorna (aceita, headers x-ratelimit-*, espera em s)"""
+        now = time.monotonic()
+        with self._lock:
+            self._requests = [(t, n) for t, n in self._requests if now - t < self.WINDOW]
+            used_requests = len(self._requests)
+            used_tokens = sum(n for _, n in self._requests)
+
+            retry_after = 0.0
+            if self.rpm and used_requests + 1 > self.rpm:
+                retry_after = self._requests[0][0] + self.WINDOW - now
+            if self.tpm and used_tokens + tokens > self.tpm:
+                retry_after = max(retry_after, self._wait_for_tokens(used_tokens + tokens - self.tpm, now))
+
+            allowed = retry_after <= 0
+            if allowed:
+                self._requests.append((now, tokens))
+                used_requests += 1
+                used_tokens += tokens
+
+            oldest = self._requests[0][0] if self._requests else now
+            reset = max(0.0, oldest + self.WINDOW - now)
+
+        headers = {}
+        if self.rpm:
+            headers.update({
+                'x-ratelimit-limit-requests': str(self.rpm),
+                'x-ratelimit-remaining-requests': str(max(0, self.rpm - used_requests)),
+                'x-ratelimit-reset-requests': _format_reset(reset),
+            })
+        if self.tpm:
+            headers.update({
+                'x-ratelimit-limit-tokens': str(self.tpm),
+                'x-ratelimit-remaining-tokens': str(max(0, self.tpm - used_tokens)),
+                'x-ratelimit-reset-tokens': _format_reset(reset),
+            })
+        return allowed, headers, retry_after
+
+    def _wait_for_tokens(self, excess: int, now: float) -> float:
+        freed = 0
+        for started, tokens in self._requests:
+            freed += tokens
+            if freed >= excess:
+                return started + self.WINDOW - now
+        return self.WINDOW
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """Servidor de chat completions compatível com a API da OpenAI, para testes e benchmarks.
+
+    Responde ao ``POST /v1/chat/completions`` com marcações válidas para os prompts
+    do AIProcessor (regras de texto sobre os estilos e as remoções do prompt de sistema), com a
+    latência, os limites e as falhas de ``behavior``. ``GET /mock/stats`` devolve os
+    contadores de respostas por tipo.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], behavior: MockBehavior = None):
+        super().__init__(address, MockLLMHandler)
+        self.behavior = behavior or MockBehavior()
+        self.limiter = RateLimiter(self.behavior.rpm, self.behavior.tpm)
+        self.stats: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def count(self, outcome: str):
+        with self._stats_lock:
+            self.stats[outcome] = self.stats.get(outcome, 0) + 1
+
+    def start(self) -> 'MockLLMServer':
+        """Atende em uma thread de fundo (para uso dentro de benchmarks e testes)"""
+        self._thread = threading.Thread(target=self.serve_forever, name='mock-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server: MockLLMServer
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/mock/stats':
+            with self.server._stats_lock:
+                self._send_json(200, dict(self.server.stats))
+        else:
+            self._send_json(404, _error('Not found', 'invalid_request_error'))
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/chat/completions':
+            self._send_json(404, _error('Not found', 'invalid_request_error'))
+            return
+
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            messages = request['messages']
+        except (ValueError, KeyError, TypeError):
+            self.server.count('bad_request')
+            self._send_json(400, _error('Invalid request body', 'invalid_request_error'))
+            return
+
+        behavior = self.server.behavior
+        prompt_chars = sum(len(m.get('content') or '') for m in messages)
+        prompt_tokens = math.ceil(prompt_chars / CHARS_PER_TOKEN)
+        max_tokens = request.get('max_tokens') or 4096
+
+        allowed, headers, retry_after = self.server.limiter.acquire(prompt_tokens + max_tokens)
+        if not allowed:
+            self.server.count('rate_limited')
+            headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+            self._send_json(429, _error('Rate limit reached for requests', 'rate_limit_exceeded',
+                                        'requests'), headers)
+            return
+
+        time.sleep(behavior.latency())
+
+        if behavior.error_rate and behavior.draw() < behavior.error_rate:
+            self.server.count('server_error')
+            status = 500 if behavior.draw() < 0.5 else 503
+            self._send_json(status, _error('The server had an error while processing your request', 'server_error'),
+                            headers)
+            return
+
+        content = json.dumps({'paragraphs': classify_prompt(messages)}, ensure_ascii=False)
+        finish_reason = 'stop'
+        if behavior.truncate_rate and behavior.draw() < behavior.truncate_rate:
+            self.server.count('truncated')
+            content = content[:max(1, int(len(content) * (0.3 + 0.6 * behavior.draw())))]
+            finish_reason = 'length'
+        elif behavior.malformed_rate and behavior.draw() < behavior.malformed_rate:
+            self.server.count('malformed')
+            content = _malform(content, behavior.draw())
+        else:
+            self.server.count('ok')
+
+        completion_tokens = min(max_tokens, math.ceil(len(content) / CHARS_PER_TOKEN))
+        if request.get('stream'):
+            self._send_stream(request, content, finish_reason, headers)
+            return
+
+        self._send_json(200, {
+            'id': f"chatcmpl-mock-{int(time.time() * 1000)}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'mock'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': finish_reason,
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        }, headers)
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict[str, str] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, request: Dict, content: str, finish_reason: str, headers: Dict[str, str]):
+        """Resposta em Server-Sent Events (``stream: true``), em pedaços de ~4 tokens"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.close_connection = True
+
+        base = {'id': f"chatcmpl-mock-{int(time.time() * 1000)}", 'object': 'chat.completion.chunk',
+                'created': int(time.time()), 'model': request.get('model', 'mock')}
+        step = CHARS_PER_TOKEN * 4
+        deltas = [{'role': 'assistant', 'content': ''}]
+        deltas += [{'content': content[i:i + step]} for i in range(0, len(content), step)]
+
+        for delta in deltas:
+            chunk = dict(base, choices=[{'index': 0, 'delta': delta, 'finish_reason': None}])
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        chunk = dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': finish_reason}])
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+
+def classify_prompt(messages: List[Dict]) -> List[Dict]:
+    """Marcações para os parágrafos do prompt, pelas regras de texto, estilos e remoções do sistema"""
+    system = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+    user = '\n\n'.join(m.get('content') or '' for m in messages if m.get('role') == 'user')
+
+    styles = [(m.group('marker'), f"{m.group('name')} {m.group('prompt')}".lower())
+              for m in STYLE_PATTERN.finditer(system)]
+    removals = [(m.group('name').strip().lower(), m.group('start'), m.group('end'))
+                for m in REMOVAL_PATTERN.finditer(system)]
+
+    paragraphs = [(int(m.group('index')), m.group('text')) for m in PARAGRAPH_PATTERN.finditer(user)]
+    paragraphs += [(int(m.group('index')), m.group('text')) for m in FOCUSED_PATTERN.finditer(user)]
+
+    results = []
+    for index, text in paragraphs:
+        marker = _marker_for(text.strip(), styles) or _removal_marker_for(text.strip(), removals)
+        results.append({'index': index, 'markers': [marker] if marker else []})
+    return results
+
+
+def _marker_for(text: str, styles: List[Tuple[str, str]]) -> str:
+    for pattern, words in TEXT_RULES:
+        if not pattern.search(text):
+            continue
+        for marker, description in styles:
+            if any(word in description for word in words):
+                return marker
+    return None
+
+
+def _removal_marker_for(text: str, removals: List[Tuple[str, str, str]]) -> str:
+    lowered = text.lower()
+    for name, start_marker, end_marker in removals:
+        if re.match(rf'{REMOVAL_END_PREFIX}{re.escape(name)}\b', lowered):
+            return end_marker
+        if re.match(rf'{re.escape(name)}\b', lowered):
+            return start_marker
+    return None
+
+
+def _malform(content: str, draw: float) -> str:
+    """Estraga o JSON de uma das formas que o AIProcessor tenta corrigir"""
+    if draw < 0.25:
+        return f"Claro! Aqui estão as marcações:\n```json\n{content}\n```"
+    if draw < 0.5:
+        return content.replace('[[', '[').replace(']]', ']')
+    if draw < 0.75:
+        return content.replace('}]}', '},]}')
+    return content.replace('"markers"', 'markers', 1)
+
+
+def _error(message: str, error_type: str, code: str = None) -> Dict:
+    return {'error': {'message': message, 'type': error_type, 'param': None, 'code': code}}
+
+
+def _format_reset(seconds: float) -> str:
+    """Formato dos headers x-ratelimit-reset-* da OpenAI (ex.: '1s', '6m0s', '20ms')"""
+    if seconds < 1:
+        return f"{int(seconds * 1000)}ms"
+    minutes, secs = divmod(int(math.ceil(seconds)), 60)
+    return f"{minutes}m{secs}s" if minutes else f"{secs}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor local compatível com chat completions (OpenAI) para testes')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Latência média')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='Desvio padrão da latência')
+    parser.add_argument('--tail-rate', type=float, default=0, help='Fração de respostas lentas (0 a 1)')
+    parser.add_argument('--tail-ms', type=float, default=0, help='Atraso extra das respostas lentas')
+    parser.add_argument('--rpm', type=int, default=0, help='Limite de requisições por minuto (0 = sem limite)')
+    parser.add_argument('--tpm', type=int, default=0, help='Limite de tokens por minuto (0 = sem limite)')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fração de respostas 500/503')
+    parser.add_argument('--truncate-rate', type=float, default=0, help='Fração de respostas truncadas')
+    parser.add_argument('--malformed-rate', type=float, default=0, help='Fração de respostas com JSON malformado')
+    parser.add_argument('--seed', type=int, help='Semente dos sorteios')
+    args = parser.parse_args()
+
+    behavior = MockBehavior(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, tail_rate=args.tail_rate, tail_ms=args.tail_ms,
+        rpm=args.rpm, tpm=args.tpm, error_rate=args.error_rate, truncate_rate=args.truncate_rate,
+        malformed_rate=args.malformed_rate, seed=args.seed
+    )
+    server = MockLLMServer((args.host, args.port), behavior)
+    print(f"✓ Servidor de IA simulado em {server.url}")
+    print(f"  Use OPENAI_API_URL={server.url} para apontar o Word AI Styler para ele")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from datetime import datetime
+from typing import Dict, List
+from backend.config import Config
+from backend.ai_processor import AIProcessor
+from backend.document_reader import DocumentReader
+from backend.style_applier import StyleApplier
+from backend.document_splitter import DocumentSplitter
+from backend.file_manager import FileManager
+from backend.docx_package import DocxPackage
+from backend.workspace import JobWorkspace
+from backend.tracing import PipelineTracer
+from benchmarks.corpus import COVER_LINES, corpus_path, generate_exam_document
+from benchmarks.mock_llm import MockBehavior, MockLLMServer
+
+# Incrementar quando o formato do baseline mudar
+BASELINE_VERSION = 1
+
+DEFAULT_SIZES = '100,1000,10000'
+DEFAULT_CORPUS_DIR = os.path.join(Config.CACHE_DIR, 'benchmarks')
+
+STYLES = [
+    {'name': 'Enunciado', 'wordStyle': 'Questão', 'marker': '[[Q]]', 'color': '#dc2626',
+     'prompt': 'enunciado da questão'},
+    {'name': 'Alternativa', 'wordStyle': 'Alternativa', 'marker': '[[A]]', 'prompt': 'alternativa A) a E)'},
+    {'name': 'Gabarito', 'wordStyle': 'Gabarito', 'marker': '[[GAB]]', 'prompt': 'gabarito resposta'},
+]
+REMOVAL_PROMPTS = [
+    {'name': 'Capa', 'startMarker': '[[CAPA_INICIO]]', 'endMarker': '[[CAPA_FIM]]', 'prompt': 'capa do livro'},
+]
+
+QUESTION_PATTERN = re.compile(r'^\d+\.\s')
+ALTERNATIVE_PATTERN = re.compile(r'^[A-E]\)\s')
+
+
+def stub_classify(paragraphs: List[Dict]) -> List[Dict]:
+    """Substitui a IA: marca o corpus sintético pelas mesmas regras com que foi gerado"""
+    for para in paragraphs:
+        text = para.get('text', '')
+        if text == COVER_LINES[0]:
+            markers = ['[[CAPA_INICIO]]']
+        elif text == COVER_LINES[-1]:
+            markers = ['[[CAPA_FIM]]']
+        elif text.startswith('Resposta:') or text == 'Gabarito':
+            markers = ['[[GAB]]']
+        elif QUESTION_PATTERN.match(text):
+            markers = ['[[Q]]']
+        elif ALTERNATIVE_PATTERN.match(text):
+            markers = ['[[A]]']
+        else:
+            markers = []
+        para['markers'] = markers
+    return paragraphs
+
+
+def run_components(path: str, tracer: PipelineTracer, split_workers: int, mock_llm: bool = False):
+    """Executa leitura, estilos, divisão e gravação do ZIP, uma etapa do tracer cada.
+
+    Com ``mock_llm``, a etapa de IA roda de verdade (AIProcessor) contra o servidor
+    simulado apontado por ``Config.OPENAI_API_URL`` e também é medida.
+    """
+    tracer.enter_stage('reader.open')
+    reader = DocumentReader(path)
+    tracer.enter_stage('reader.read_paragraphs')
+    paragraphs = reader.read_paragraphs()
+    tracer.enter_stage('reader.document_info')
+    reader.get_document_info()
+
+    if mock_llm:
+        tracer.enter_stage('ai_processing')
+        marked_content = AIProcessor('mock-key').process_document(
+            paragraphs, STYLES, REMOVAL_PROMPTS)['marked_content']
+    else:
+        # Fora das medições: a etapa de IA é substituída por regras locais
+        tracer.enter_stage('llm_stub')
+        marked_content = stub_classify(paragraphs)
+
+    tracer.enter_stage('style_applier.apply')
+    style_applier = StyleApplier(path, output_mode=Config.STYLE_OUTPUT_MODE)
+    style_applier.register_styles(STYLES)
+    styled_doc = style_applier.apply_styles(marked_content)
+    tracer.enter_stage('style_applier.remove')
+    clean_doc = style_applier.remove_marked_content(styled_doc, marked_content, REMOVAL_PROMPTS)
+
+    tracer.enter_stage('splitter.split')
+    split_source = clean_doc.as_document() if isinstance(clean_doc, DocxPackage) else clean_doc
+    splitter = DocumentSplitter()
+    simulados = splitter.split_simulados(split_source)
+    tracer.enter_stage('splitter.documents')
+    documents = {'completo': clean_doc}
+    documents.update(splitter.create_split_documents_parallel(
+        simulados, split_source, style_applier.align_marked_content(marked_content), STYLES,
+        workers=split_workers
+    ))
+
+    tracer.enter_stage('file_manager.write_zip')
+    workspace = JobWorkspace(quota_bytes=0)
+    try:
+        FileManager('benchmark', workspace).write_zip_archive(documents, keep_tree=Config.KEEP_OUTPUT_TREE)
+    finally:
+        workspace.cleanup(keep_output=False)
+
+    return len(paragraphs)
+
+
+def measure(path: str, repeat: int, memory: bool, split_workers: int, mock_llm: bool = False) -> Dict:
+    """Tempo (menor de ``repeat`` rodadas) e, à parte, pico de memória de cada componente"""
+    seconds = {}
+    elements = 0
+    for _ in range(repeat):
+        tracer = PipelineTracer()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            elements = run_components(path, tracer, split_workers, mock_llm)
+        for span in tracer.finish()['spans']:
+            seconds[span['name']] = min(seconds.get(span['name'], float('inf')), span['seconds'])
+
+    # O tracemalloc deixa tudo mais lento: memória em uma rodada separada
+    peaks = {}
+    if memory:
+        tracer = PipelineTracer(memory=True)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            run_components(path, tracer, split_workers, mock_llm)
+        peaks = {span['name']: span.get('peak_memory_mb', 0) for span in tracer.finish()['spans']}
+
+    components = {}
+    for name, value in seconds.items():
+        if name == 'llm_stub':
+            continue
+        components[name] = {
+            'seconds': value,
+            'elements_per_second': round(elements / value, 1) if value else None,
+            'peak_memory_mb': peaks.get(name),
+        }
+
+    return {
+        'elements': elements,
+        'total_seconds': round(sum(c['seconds'] for c in components.values()), 4),
+        'components': components,
+    }
+
+
+def run_benchmarks(sizes: List[int], seed: int, repeat: int, memory: bool, split_workers: int,
+                   corpus_dir: str, mock_llm: MockBehavior = None) -> Dict:
+    Config.create_directories()
+    server = None
+    if mock_llm is not None:
+        server = MockLLMServer(('127.0.0.1', 0), mock_llm).start()
+        Config.OPENAI_API_URL = server.url
+    results = []
+    for size in sizes:
+        path = corpus_path(corpus_dir, size, seed)
+        stats_path = f"{path}.json"
+        if os.path.exists(path) and os.path.exists(stats_path):
+            with open(stats_path, 'r', encoding='utf-8') as f:
+                corpus = json.load(f)
+        else:
+            print(f"Gerando corpus de {size} elementos...")
+            corpus = generate_exam_document(path, size, seed)
+            with open(stats_path, 'w', encoding='utf-8') as f:
+                json.dump(corpus, f)
+
+        print(f"Medindo {os.path.basename(path)}...")
+        result = measure(path, repeat, memory, split_workers, server is not None)
+        result.update(size=size, corpus=os.path.basename(path), corpus_stats=corpus)
+        results.append(result)
+        _print_result(result)
+
+    if server is not None:
+        server.stop()
+        print(f"  Respostas do servidor simulado: {server.stats}")
+
+    return {
+        'baseline_version': BASELINE_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'seed': seed,
+            'repeat': repeat,
+            'memory': memory,
+            'split_workers': split_workers,
+            'style_output_mode': Config.STYLE_OUTPUT_MODE,
+            'keep_output_tree': Config.KEEP_OUTPUT_TREE,
+            'mock_llm': mock_llm.to_dict() if mock_llm is not None else None,
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict, previous: Dict, threshold: float, min_seconds: float) -> List[str]:
+    """Compara com um baseline anterior; retorna os componentes que ficaram mais lentos.
+
+    Componentes abaixo de ``min_seconds`` nas duas medições não contam como regressão
+    (nessa escala a variação é ruído).
+    """
+    regressions = []
+    previous_by_size = {result['size']: result for result in previous.get('results', [])}
+    print(f"\nComparação com {previous.get('commit') or 'baseline anterior'} (limite: +{threshold:.0%})")
+
+    for result in current['results']:
+        old = previous_by_size.get(result['size'])
+        if not old:
+            continue
+        for name, component in result['components'].items():
+            old_component = old['components'].get(name)
+            if not old_component or not old_component['seconds']:
+                continue
+            ratio = component['seconds'] / old_component['seconds']
+            flag = ''
+            if ratio > 1 + threshold and max(component['seconds'], old_component['seconds']) >= min_seconds:
+                flag = '  ✗ regressão'
+                regressions.append(f"{result['size']}:{name}")
+            print(f"  {result['size']:>7} {name:<26} {old_component['seconds']:>9.3f}s → "
+                  f"{component['seconds']:>9.3f}s  ({ratio:5.2f}x){flag}")
+
+    return regressions
+
+
+def _print_result(result: Dict):
+    print(f"  {result['elements']} elementos, {result['total_seconds']:.3f}s")
+    for name, component in result['components'].items():
+        memory = component['peak_memory_mb']
+        memory = f"{memory:8.1f} MB" if memory is not None else ''
+        rate = component['elements_per_second']
+        rate = f"{rate:>12,.0f} el/s" if rate else ''
+        print(f"    {name:<26} {component['seconds']:>9.3f}s {rate} {memory}")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline de documentos (IA substituída)')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Tamanhos do corpus, separados por vírgula')
+    parser.add_argument('--seed', type=int, default=0, help='Semente do gerador de corpus')
+    parser.add_argument('--repeat', type=int, default=1, help='Rodadas por tamanho (vale o menor tempo)')
+    parser.add_argument('--no-memory', action='store_true', help='Não mede o pico de memória')
+    parser.add_argument('--split-workers', type=int, default=1,
+                        help='Processos na geração dos documentos separados (padrão: 1, sequencial)')
+    parser.add_argument('--mock-llm', action='store_true',
+                        help='Mede também a etapa de IA, contra o servidor simulado (benchmarks/mock_llm.py)')
+    parser.add_argument('--mock-latency-ms', type=float, default=0, help='Latência do servidor simulado')
+    parser.add_argument('--mock-malformed-rate', type=float, default=0,
+                        help='Fração de respostas com JSON malformado no servidor simulado')
+    parser.add_argument('--corpus-dir', default=DEFAULT_CORPUS_DIR, help='Pasta dos corpora gerados')
+    parser.add_argument('--output', help='Grava o resultado (JSON) neste arquivo')
+    parser.add_argument('--compare', help='Baseline anterior (JSON) para comparar')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='Aumento de tempo considerado regressão (padrão: 0.2 = 20%%)')
+    parser.add_argument('--min-seconds', type=float, default=0.05,
+                        help='Tempos abaixo disso não contam como regressão (ruído)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    mock_llm = None
+    if args.mock_llm:
+        mock_llm = MockBehavior(latency_ms=args.mock_latency_ms, malformed_rate=args.mock_malformed_rate,
+                                seed=args.seed)
+    baseline = run_benchmarks(sizes, args.seed, max(1, args.repeat), not args.no_memory,
+                              args.split_workers, args.corpus_dir, mock_llm)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+        print(f"\n✓ Resultado salvo em {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+        regressions = compare(baseline, previous, args.threshold, args.min_seconds)
+        if regressions:
+            print(f"\n✗ {len(regressions)} componente(s) mais lento(s): {', '.join(regressions)}")
+            sys.exit(1)
+        print("\n✓ Sem regressões")
+
+
+if __name__ == '__main__':
+    main()
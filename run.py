@@ -1,25 +1,34 @@
 #!/usr/bin/env python
 """
 Arquivo principal para iniciar a aplicação Word AI Styler
+
+    python run.py                      # inicia o servidor
+    python run.py batch <entradas...>  # processa arquivos locais sem o servidor
 """
+import argparse
 import os
 import sys
-from api.routes import app
 from backend.config import Config
 
-def main():
+def serve():
     """Inicia a aplicação"""
+    from api.routes import app
+    from backend.retention import output_retention
+
     print("=== Word AI Styler ===")
     print("Iniciando servidor...")
-    
+
     # Verifica configurações
     if not Config.OPENAI_API_KEY:
         print("ERRO: OPENAI_API_KEY não configurada no arquivo .env")
         sys.exit(1)
-    
+
     # Cria diretórios necessários
     Config.create_directories()
-    
+
+    # Varredor de retenção das saídas (idade máxima e limite de espaço)
+    output_retention.start_sweeper()
+
     # Inicia servidor
     port = int(os.environ.get('FLASK_PORT', 5000))
     app.run(
@@ -28,5 +37,61 @@ def main():
         debug=os.environ.get('FLASK_ENV') == 'development'
     )
 
+def batch(args):
+    """Processa um diretório/glob de .docx com o mesmo pipeline do servidor"""
+    from backend.cli import BatchRunner, collect_inputs, load_style_config
+
+    api_key = args.api_key or Config.OPENAI_API_KEY
+    if not api_key:
+        print("ERRO: informe --api-key ou configure OPENAI_API_KEY no arquivo .env")
+        sys.exit(1)
+
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("ERRO: nenhum arquivo .docx encontrado nas entradas informadas")
+        sys.exit(1)
+
+    if not Config.RESULT_CACHE and not args.force:
+        print("⚠️ RESULT_CACHE desativado: execuções seguintes não conseguirão pular arquivos já processados")
+
+    Config.create_directories()
+    style_config = load_style_config(args.config)
+
+    runner = BatchRunner(
+        api_key, style_config['styles'], style_config['removal_prompts'],
+        workers=args.workers, force=args.force, summary_path=args.summary, project=args.project
+    )
+    records = runner.run(inputs)
+
+    failed = sum(1 for record in records if record['status'] == 'failed')
+    skipped = sum(1 for record in records if record['status'] == 'skipped')
+    print(f"\nConcluído: {len(records) - failed - skipped} processados, {skipped} pulados, {failed} com erro")
+    sys.exit(1 if failed else 0)
+
+def main():
+    parser = argparse.ArgumentParser(description='Word AI Styler')
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('serve', help='Inicia o servidor (padrão)')
+
+    batch_parser = subparsers.add_parser('batch', help='Processa arquivos locais sem o servidor')
+    batch_parser.add_argument('inputs', nargs='+', help='Diretórios (busca .docx recursivamente) ou globs')
+    batch_parser.add_argument('--config', required=True,
+                              help='JSON com "styles" e "removal_prompts" (mesmo formato do frontend)')
+    batch_parser.add_argument('--workers', type=int, default=Config.BATCH_FILE_WORKERS,
+                              help='Arquivos processados em paralelo')
+    batch_parser.add_argument('--summary', help='Arquivo JSONL do resumo (padrão: output/cli_summary_<data>.jsonl)')
+    batch_parser.add_argument('--force', action='store_true',
+                              help='Reprocessa mesmo arquivos com resultado atualizado')
+    batch_parser.add_argument('--api-key', help='Chave da OpenAI (padrão: OPENAI_API_KEY)')
+    batch_parser.add_argument('--project',
+                              help='Projeto das revisões: cada arquivo reaproveita a classificação da revisão anterior')
+
+    args = parser.parse_args()
+    if args.command == 'batch':
+        batch(args)
+    else:
+        serve()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
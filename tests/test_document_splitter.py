@@ -0,0 +1,43 @@
+import docx.document
+import pytest
+from docx import Document
+
+from backend.document_splitter import DocumentSplitter
+
+
+def _exam_document(simulados: int, paragraphs_per_simulado: int):
+    document = Document()
+    for number in range(1, simulados + 1):
+        document.add_heading(f'Simulado {number}', level=1)
+        for i in range(paragraphs_per_simulado):
+            document.add_paragraph(f'Questão {i + 1}: enunciado da prova {number}')
+    return document
+
+
+@pytest.fixture
+def paragraphs_reads(monkeypatch):
+    """Conta quantas vezes document.paragraphs (que varre o corpo inteiro) é lido"""
+    reads = []
+    original = docx.document.Document.paragraphs
+
+    def counting(self):
+        reads.append(1)
+        return original.fget(self)
+
+    monkeypatch.setattr(docx.document.Document, 'paragraphs', property(counting))
+    return reads
+
+
+@pytest.mark.parametrize('simulados, per_simulado', [(2, 10), (20, 100)])
+def test_split_simulados_scans_the_body_once(paragraphs_reads, simulados, per_simulado):
+    document = _exam_document(simulados, per_simulado)
+    paragraphs_reads.clear()
+
+    result = DocumentSplitter().split_simulados(document)
+
+    # Uma única leitura, qualquer que seja o tamanho: o custo cresce linearmente
+    assert len(paragraphs_reads) == 1
+    assert [s['number'] for s in result] == list(range(1, simulados + 1))
+    assert all(s['paragraph_count'] == per_simulado + 1 for s in result)
+    assert result[-1]['end_index'] == simulados * (per_simulado + 1) - 1
+    assert result[1]['content'][0].text == 'Simulado 2'
@@ -0,0 +1,69 @@
+import io
+import os
+import zipfile
+
+from backend.docx_package import copy_zip_entries
+
+TEXT = ('<w:p><w:r><w:t>Questão de múltipla escolha</w:t></w:r></w:p>' * 2000).encode('utf-8')
+
+
+def _source_zip(path):
+    with zipfile.ZipFile(path, 'w') as zf:
+        # Nível 1: recomprimir com o nível padrão daria outro tamanho
+        zf.writestr('word/document.xml', TEXT, zipfile.ZIP_DEFLATED, compresslevel=1)
+        zf.writestr('word/media/image1.png', os.urandom(300_000), zipfile.ZIP_STORED)
+        zf.writestr('word/média/ção.bin', b'dados', zipfile.ZIP_DEFLATED)
+
+
+def _raw_bytes(path, name):
+    """Bytes comprimidos da entrada, logo após o cabeçalho local"""
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        info = zf.getinfo(name)
+        f.seek(info.header_offset + 26)
+        name_len, extra_len = int.from_bytes(f.read(2), 'little'), int.from_bytes(f.read(2), 'little')
+        f.seek(info.header_offset + 30 + name_len + extra_len)
+        return f.read(info.compress_size)
+
+
+def test_copy_zip_entries_keeps_the_compressed_bytes(tmp_path):
+    source = str(tmp_path / 'source.docx')
+    combined = str(tmp_path / 'combined.zip')
+    _source_zip(source)
+
+    with zipfile.ZipFile(combined, 'w') as dst:
+        dst.writestr('leia-me.txt', 'antes')
+        copy_zip_entries(source, dst, 'livro/')
+        dst.writestr('depois.txt', 'depois')
+
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(combined) as out:
+        assert out.testzip() is None
+        assert out.namelist() == ['leia-me.txt'] + [f'livro/{n}' for n in src.namelist()] + ['depois.txt']
+        for info in src.infolist():
+            copied = out.getinfo(f'livro/{info.filename}')
+            assert (copied.compress_type, copied.CRC, copied.compress_size) == \
+                (info.compress_type, info.CRC, info.compress_size)
+            assert out.read(copied) == src.read(info)
+            assert _raw_bytes(combined, copied.filename) == _raw_bytes(source, info.filename)
+
+
+def test_copy_zip_entries_to_an_unseekable_stream(tmp_path):
+    source = str(tmp_path / 'source.docx')
+    _source_zip(source)
+
+    class Unseekable(io.RawIOBase):
+        def __init__(self):
+            self.buffer = io.BytesIO()
+
+        def writable(self):
+            return True
+
+        def write(self, data):
+            return self.buffer.write(data)
+
+    target = Unseekable()
+    with zipfile.ZipFile(target, 'w') as dst:
+        copy_zip_entries(source, dst)
+
+    with zipfile.ZipFile(source) as src, zipfile.ZipFile(io.BytesIO(target.buffer.getvalue())) as out:
+        assert out.testzip() is None
+        assert [(i.filename, i.CRC) for i in out.infolist()] == [(i.filename, i.CRC) for i in src.infolist()]
@@ -0,0 +1,82 @@
+import copy
+
+import pytest
+
+import backend.ai_processor as ai_processor
+from backend.ai_processor import AIProcessor
+from backend.config import Config
+from backend.document_reader import DocumentReader
+from benchmarks.corpus import generate_exam_document
+from benchmarks.mock_llm import MockBehavior, MockLLMServer, classify_prompt
+from benchmarks.runner import REMOVAL_PROMPTS, STYLES, stub_classify
+
+
+@pytest.fixture(scope='module')
+def exam_paragraphs(tmp_path_factory):
+    """Elementos de uma prova sintética pequena (capa, simulados, questões e gabaritos)"""
+    path = str(tmp_path_factory.mktemp('corpus') / 'exam.docx')
+    generate_exam_document(path, 300, seed=3)
+    return DocumentReader(path).read_paragraphs()
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    """Inicia o servidor simulado com o comportamento pedido e aponta o AIProcessor para ele"""
+    servers = []
+
+    def start(**behavior) -> MockLLMServer:
+        server = MockLLMServer(('127.0.0.1', 0), MockBehavior(**behavior)).start()
+        servers.append(server)
+        monkeypatch.setattr(Config, 'OPENAI_API_URL', server.url)
+        return server
+
+    monkeypatch.setattr(ai_processor, 'BATCH_PAUSE', 0)
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def _expected_markers(paragraphs):
+    return {para['index']: para['markers'] for para in stub_classify(copy.deepcopy(paragraphs))}
+
+
+def test_classify_prompt_emits_removal_markers():
+    system = AIProcessor('test-key')._build_system_prompt(STYLES, REMOVAL_PROMPTS)
+    user = 'Parágrafo 0:\nCAPA\n\nParágrafo 1:\nInstruções gerais\n\nParágrafo 2:\nFim da capa\n\n'
+
+    results = classify_prompt([{'role': 'system', 'content': system}, {'role': 'user', 'content': user}])
+
+    assert results == [
+        {'index': 0, 'markers': ['[[CAPA_INICIO]]']},
+        {'index': 1, 'markers': []},
+        {'index': 2, 'markers': ['[[CAPA_FIM]]']},
+    ]
+
+
+def test_ai_processor_marks_like_the_corpus_rules(mock_llm, exam_paragraphs):
+    server = mock_llm(seed=1)
+
+    result = AIProcessor('test-key').process_document(copy.deepcopy(exam_paragraphs), STYLES, REMOVAL_PROMPTS)
+
+    marked = {para['index']: para['markers'] for para in result['marked_content']}
+    assert marked == _expected_markers(exam_paragraphs)
+    assert result['stats']['failed_batches'] == 0
+    assert server.stats == {'ok': result['stats']['api_calls']}
+
+
+def test_ai_processor_survives_malformed_and_truncated_responses(mock_llm, exam_paragraphs):
+    server = mock_llm(malformed_rate=0.5, truncate_rate=0.3, seed=1)
+
+    result = AIProcessor('test-key').process_document(copy.deepcopy(exam_paragraphs), STYLES, REMOVAL_PROMPTS)
+
+    assert server.stats.get('malformed', 0) > 0
+    assert server.stats.get('truncated', 0) > 0
+    assert result['stats']['failed_batches'] == 0
+
+    # Falhas podem deixar parágrafos sem marcação, mas nunca com a marcação errada
+    expected = _expected_markers(exam_paragraphs)
+    assert sorted(para['index'] for para in result['marked_content']) == sorted(expected)
+    wrong = [para['index'] for para in result['marked_content']
+             if para['markers'] and para['markers'] != expected[para['index']]]
+    assert wrong == []
+    assert result['stats']['marked'] > len(expected) // 2
@@ -0,0 +1,67 @@
+import pytest
+
+import backend.ai_processor as ai_processor
+from backend.ai_processor import AIProcessor, SharedAIResources
+from benchmarks.runner import REMOVAL_PROMPTS, STYLES
+
+# Abre a capa no início do livro, mas é citado no meio de outro
+BOUNDARY = 'Capa do livro: material de apoio ao estudante, edição revisada'
+QUESTION = '1. Segundo o texto, qual é a principal causa da erosão do solo?'
+
+
+def _paragraphs(texts):
+    return [{'index': i, 'type': 'paragraph', 'text': text, 'style': 'Normal'} for i, text in enumerate(texts)]
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """IA falsa que decide pelo contexto: guarda os textos de cada chamada e marca pelas regras dadas"""
+    calls = []
+    rules = {}
+
+    def process_batch(self, batch, styles, removal_prompts):
+        calls.append([para['text'] for para in batch])
+        for para in batch:
+            para['markers'] = list(rules.get((para['text'], para['index']), []))
+        return batch
+
+    monkeypatch.setattr(AIProcessor, '_process_batch', process_batch)
+    monkeypatch.setattr(ai_processor, 'BATCH_PAUSE', 0)
+    return calls, rules
+
+
+def _process(shared, texts):
+    result = AIProcessor('test-key', shared).process_document(_paragraphs(texts), STYLES, REMOVAL_PROMPTS)
+    return [para['markers'] for para in result['marked_content']]
+
+
+def test_removal_markers_are_not_reused_across_files(model):
+    calls, rules = model
+    shared = SharedAIResources()
+    rules[(BOUNDARY, 0)] = ['[[CAPA_INICIO]]']
+    rules[('Fim da capa', 1)] = ['[[CAPA_FIM]]']
+
+    first = _process(shared, [BOUNDARY, 'Fim da capa', 'Introdução'])
+    second = _process(shared, ['Introdução', 'Texto de apoio', 'Fim da capa', BOUNDARY])
+
+    assert first == [['[[CAPA_INICIO]]'], ['[[CAPA_FIM]]'], []]
+    # No segundo arquivo, os mesmos textos estão fora da capa: nada de trecho removido
+    assert second == [[], [], [], []]
+    # O lote vai inteiro para a IA, que vê o contexto de cada arquivo
+    assert calls[-1] == ['Introdução', 'Texto de apoio', 'Fim da capa', BOUNDARY]
+    assert shared.classification_hits == 0
+
+
+def test_style_markers_of_long_texts_fill_unmarked_paragraphs(model):
+    calls, rules = model
+    shared = SharedAIResources()
+    rules[(QUESTION, 0)] = ['[[Q]]']
+    rules[('Gabarito', 1)] = ['[[GAB]]']
+
+    _process(shared, [QUESTION, 'Gabarito'])
+    second = _process(shared, ['Gabarito', QUESTION])
+
+    # O texto longo reaproveita o estilo do outro arquivo; o curto depende do contexto
+    assert second == [[], ['[[Q]]']]
+    assert calls[-1] == ['Gabarito', QUESTION]
+    assert shared.classification_hits == 1
@@ -0,0 +1,47 @@
+import os
+import time
+
+from backend.style_registry import StyleTemplateRegistry
+
+DAY = 86400
+
+
+def _compile():
+    styles = StyleTemplateRegistry.new_scratch_styles()
+    styles.add_style('Questão', 1)
+    return list(styles.element.style_lst)
+
+
+def _registry(tmp_path, **limits):
+    return StyleTemplateRegistry(str(tmp_path), **limits)
+
+
+def _age(registry, key, days):
+    when = time.time() - days * DAY
+    os.utime(registry._template_path(key), (when, when))
+
+
+def test_sweep_removes_expired_and_least_recently_used_templates(tmp_path):
+    registry = _registry(tmp_path, max_files=2, max_age=30 * DAY)
+    for key, days in [('expirado', 40), ('antigo', 10), ('medio', 5), ('novo', 1)]:
+        registry.get_or_compile(key, _compile)
+        _age(registry, key, days)
+
+    assert registry.sweep() == 2
+    assert sorted(os.listdir(tmp_path)) == ['medio.xml', 'novo.xml']
+    assert registry.sweep() == 0
+
+
+def test_loading_from_disk_counts_as_use(tmp_path):
+    _registry(tmp_path).get_or_compile('usado', _compile)
+    _registry(tmp_path).get_or_compile('parado', _compile)
+    registry = _registry(tmp_path, max_files=1, max_age=0)
+    _age(registry, 'usado', 20)
+    _age(registry, 'parado', 10)
+
+    # Um processo novo carrega o modelo do disco: ele passa a ser o mais recente
+    template = registry.get_or_compile('usado', lambda: None)
+
+    assert [style.name_val for style in template] == ['Questão']
+    assert registry.sweep() == 1
+    assert os.listdir(tmp_path) == ['usado.xml']